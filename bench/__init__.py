@@ -0,0 +1 @@
+"""Offline performance benchmarks. See bench/run_bench.py."""
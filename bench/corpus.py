@@ -0,0 +1,162 @@
+"""
+Deterministic synthetic travel-journal corpus for benchmarks.
+
+  python -m bench.corpus --documents 20000 --out bench/corpus.jsonl
+
+Documents look like the real thing where it matters for performance: a few hundred to a few
+thousand characters of prose (so chunking yields 1-6 chunks each), a location/country pair
+from a fixed gazetteer, a handful of tags, an entry date and a source. The JSONL output is
+one IngestDocumentRequest per line, so it can be fed to src.ingestion.bulk. The same seed
+always produces the same corpus.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import uuid
+from collections.abc import Iterator
+from datetime import date, timedelta
+from pathlib import Path
+
+PLACES = [
+    ("Lisbon", "Portugal"), ("Porto", "Portugal"), ("Madrid", "Spain"), ("Seville", "Spain"),
+    ("Barcelona", "Spain"), ("Paris", "France"), ("Lyon", "France"), ("Rome", "Italy"),
+    ("Florence", "Italy"), ("Naples", "Italy"), ("Berlin", "Germany"), ("Munich", "Germany"),
+    ("Vienna", "Austria"), ("Prague", "Czechia"), ("Budapest", "Hungary"), ("Krakow", "Poland"),
+    ("Athens", "Greece"), ("Istanbul", "Turkey"), ("Marrakech", "Morocco"), ("Cairo", "Egypt"),
+    ("Cape Town", "South Africa"), ("Nairobi", "Kenya"), ("Tokyo", "Japan"), ("Kyoto", "Japan"),
+    ("Osaka", "Japan"), ("Seoul", "South Korea"), ("Taipei", "Taiwan"), ("Hanoi", "Vietnam"),
+    ("Hoi An", "Vietnam"), ("Bangkok", "Thailand"), ("Chiang Mai", "Thailand"), ("Bali", "Indonesia"),
+    ("Singapore", "Singapore"), ("Sydney", "Australia"), ("Melbourne", "Australia"),
+    ("Queenstown", "New Zealand"), ("Mexico City", "Mexico"), ("Oaxaca", "Mexico"),
+    ("Havana", "Cuba"), ("Cusco", "Peru"), ("Lima", "Peru"), ("Buenos Aires", "Argentina"),
+    ("Rio de Janeiro", "Brazil"), ("New York", "United States"), ("San Francisco", "United States"),
+    ("Vancouver", "Canada"), ("Reykjavik", "Iceland"), ("Edinburgh", "United Kingdom"),
+]
+TAGS = [
+    "food", "hiking", "museums", "beach", "nightlife", "architecture", "markets", "trains",
+    "hostel", "hotel", "coffee", "temples", "street-art", "wine", "festival", "rain", "budget",
+]
+SOURCES = ["journal", "blog", "notes", "email"]
+
+_SUBJECTS = ["We", "I", "My sister and I", "The group", "Everyone"]
+_VERBS = [
+    "wandered through", "got lost in", "spent the morning at", "queued for an hour at",
+    "took the slow train to", "finally found", "walked back from", "had dinner near",
+]
+_PLACES_IN_TOWN = [
+    "the old market", "a tiny bakery", "the harbour", "the cathedral", "a hillside temple",
+    "the night bazaar", "a rooftop bar", "the botanical garden", "the central station",
+    "a family-run guesthouse", "the modern art museum", "the riverside promenade",
+]
+_DETAILS = [
+    "The light was incredible in the late afternoon.",
+    "It rained on and off, so we ducked into cafes between showers.",
+    "Prices were higher than the guidebook said but still reasonable.",
+    "The owner recommended a dish I would never have ordered myself.",
+    "Our feet were aching by the time we got back to the room.",
+    "There was a street festival with drums and paper lanterns.",
+    "We met a couple from Melbourne who had been travelling for a year.",
+    "The hostel dorm was noisy, but the breakfast made up for it.",
+    "I wrote half of this entry on the train with terrible handwriting.",
+    "Everything closed early because of a public holiday.",
+]
+
+QUESTION_TEMPLATES = [
+    "Where did I stay in {location}?",
+    "What did I eat in {location}?",
+    "What was the weather like in {country}?",
+    "list my {location} entries",
+    "Which markets did I visit in {location}?",
+    "What went wrong on the trip to {country}?",
+    "What were the best {tag} experiences?",
+    "How did I get around in {location}?",
+    "What do I remember about the people I met travelling?",
+]
+
+
+def _paragraph(rng: random.Random, location: str) -> str:
+    sentences = []
+    for _ in range(rng.randint(3, 7)):
+        if rng.random() < 0.6:
+            sentences.append(f"{rng.choice(_SUBJECTS)} {rng.choice(_VERBS)} {rng.choice(_PLACES_IN_TOWN)} in {location}.")
+        else:
+            sentences.append(rng.choice(_DETAILS))
+    return " ".join(sentences)
+
+
+def generate_documents(count: int, seed: int = 0) -> Iterator[dict]:
+    """Yield count IngestDocumentRequest-shaped dicts (plus external_id), deterministically from seed."""
+    rng = random.Random(seed)
+    start = date(2015, 1, 1)
+    for i in range(count):
+        location, country = rng.choice(PLACES)
+        content = "\n\n".join(_paragraph(rng, location) for _ in range(rng.randint(1, 8)))
+        yield {
+            "external_id": f"bench-{seed}-{i}",
+            "content": content,
+            "source": rng.choice(SOURCES),
+            "location": location,
+            "country": country,
+            "tags": rng.sample(TAGS, rng.randint(1, 4)),
+            "entry_date": (start + timedelta(days=rng.randrange(365 * 10))).isoformat(),
+        }
+
+
+def generate_chunks(count: int, seed: int = 0) -> Iterator[dict]:
+    """Yield count chunk dicts in the BM25 index / retriever shape without running the chunker.
+
+    Cheap enough for million-chunk corpora; each document contributes 1-6 consecutive chunks.
+    """
+    rng = random.Random(seed)
+    start = date(2015, 1, 1)
+    produced = 0
+    while produced < count:
+        location, country = rng.choice(PLACES)
+        document_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        metadata = {
+            "source": rng.choice(SOURCES),
+            "location": location,
+            "country": country,
+            "tags": rng.sample(TAGS, rng.randint(1, 4)),
+            "entry_date": (start + timedelta(days=rng.randrange(365 * 10))).isoformat(),
+        }
+        for chunk_index in range(min(rng.randint(1, 6), count - produced)):
+            yield {
+                "chunk_id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "content": _paragraph(rng, location),
+                "document_id": document_id,
+                "chunk_index": chunk_index,
+                "metadata": metadata,
+            }
+            produced += 1
+
+
+def generate_questions(count: int, seed: int = 0) -> list[str]:
+    """Questions shaped like real traffic: place lookups, listings, and open-ended ones."""
+    rng = random.Random(seed)
+    questions = []
+    for _ in range(count):
+        location, country = rng.choice(PLACES)
+        template = rng.choice(QUESTION_TEMPLATES)
+        questions.append(template.format(location=location, country=country, tag=rng.choice(TAGS)))
+    return questions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Write a synthetic DriftLog corpus as JSONL")
+    parser.add_argument("--documents", type=int, default=10_000, help="Number of documents")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, default=Path("bench/corpus.jsonl"))
+    args = parser.parse_args()
+
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    with args.out.open("w", encoding="utf-8") as f:
+        for doc in generate_documents(args.documents, args.seed):
+            f.write(json.dumps(doc) + "\n")
+    print(f"Wrote {args.documents} documents to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
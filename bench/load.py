@@ -0,0 +1,257 @@
+"""
+Load generator for the query and ingest APIs.
+
+  python -m bench.load --concurrency 16 --duration 60
+  python -m bench.load --rate 20 --duration 60 --ingest-ratio 0.1
+  python -m bench.load --questions synthetic --concurrency 64 --url http://localhost:8000
+
+Closed loop (--concurrency N): N clients each send their next request as soon as the last one
+returns, which finds the throughput ceiling. Open loop (--rate R): requests start on a Poisson
+schedule at R per second however fast the server answers (at most --max-in-flight outstanding;
+arrivals beyond that are counted as shed), which shows queueing once the server saturates.
+
+Questions come from eval/golden_dataset.json or synthetic templates; ingest requests send one
+synthetic document to /api/v1/ingest. The report has throughput, latency percentiles and errors
+per endpoint, plus a per-stage breakdown from the Server-Timing header (serve with bench.serve
+or SERVER_TIMING_ENABLED=true). "(outside spans)" is client latency minus the outermost span:
+time spent queued in the event loop, in middleware and on the wire. It grows first when the
+loop saturates.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+from bench.corpus import generate_documents, generate_questions
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+GOLDEN_PATH = PROJECT_ROOT / "eval" / "golden_dataset.json"
+RESULTS_DIR = PROJECT_ROOT / "bench" / "results"
+
+OUTSIDE_SPANS = "(outside spans)"
+
+
+@dataclass
+class Sample:
+    kind: str
+    started: float
+    latency: float
+    status: int | None
+    error: str | None
+    stages: dict[str, float] = field(default_factory=dict)
+
+
+def parse_server_timing(value: str) -> dict[str, float]:
+    """'a;dur=1.5, b;dur=2' -> {'a': 1.5, 'b': 2.0}; entries without a dur are skipped."""
+    stages: dict[str, float] = {}
+    for entry in value.split(","):
+        name, _, params = entry.strip().partition(";")
+        for param in params.split(";"):
+            key, _, raw = param.partition("=")
+            if key.strip() == "dur":
+                try:
+                    stages[name] = float(raw)
+                except ValueError:
+                    pass
+    return stages
+
+
+class Workload:
+    """Picks the next request: a question from the mix, or (ingest_ratio of the time) a synthetic document."""
+
+    def __init__(self, questions: list[dict], ingest_ratio: float, seed: int) -> None:
+        self._questions = questions
+        self._ingest_ratio = ingest_ratio
+        self._rng = random.Random(seed)
+        self._documents = generate_documents(2**31, seed + 1)
+
+    def next(self) -> tuple[str, str, dict]:
+        if self._rng.random() < self._ingest_ratio:
+            document = next(self._documents)
+            document.pop("external_id")
+            return "ingest", "/api/v1/ingest", {"documents": [document]}
+        return "query", "/api/v1/query", self._rng.choice(self._questions)
+
+
+def load_questions(source: str, count: int, seed: int) -> list[dict]:
+    if source == "golden":
+        if not GOLDEN_PATH.exists():
+            raise SystemExit(f"{GOLDEN_PATH} not found; use --questions synthetic")
+        golden = json.loads(GOLDEN_PATH.read_text())
+        return [{"question": item["question"], "filters": item.get("filters")} for item in golden]
+    return [{"question": q} for q in generate_questions(count, seed)]
+
+
+async def _send(client: httpx.AsyncClient, workload: Workload, samples: list[Sample], origin: float) -> None:
+    kind, path, payload = workload.next()
+    start = time.perf_counter()
+    try:
+        response = await client.post(path, json=payload)
+        status = response.status_code
+        error = None if response.is_success else f"HTTP {status}"
+        stages = parse_server_timing(response.headers.get("server-timing", ""))
+    except httpx.HTTPError as e:
+        status, error, stages = None, type(e).__name__, {}
+    samples.append(Sample(kind, start - origin, time.perf_counter() - start, status, error, stages))
+
+
+async def closed_loop(client, workload, samples, origin: float, until: float, concurrency: int) -> int:
+    async def user() -> None:
+        while time.perf_counter() < until:
+            await _send(client, workload, samples, origin)
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return 0
+
+
+async def open_loop(client, workload, samples, origin: float, until: float, rate: float, max_in_flight: int, seed: int) -> int:
+    """Start requests at Poisson arrivals; returns how many arrivals were shed at the in-flight cap."""
+    rng = random.Random(seed)
+    in_flight: set[asyncio.Task] = set()
+    shed = 0
+    next_at = time.perf_counter()
+    while next_at < until:
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        if len(in_flight) >= max_in_flight:
+            shed += 1
+        else:
+            task = asyncio.create_task(_send(client, workload, samples, origin))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        next_at += rng.expovariate(rate)
+    await asyncio.gather(*in_flight)
+    return shed
+
+
+def _percentiles(values_ms: list[float]) -> dict:
+    if not values_ms:
+        return {}
+    ms = np.array(values_ms)
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "mean_ms": round(float(ms.mean()), 2),
+        "max_ms": round(float(ms.max()), 2),
+    }
+
+
+def _stage_breakdown(samples: list[Sample]) -> dict:
+    """Per-stage latency and share of total client latency across successful requests (spans nest, so shares overlap)."""
+    per_stage: dict[str, list[float]] = defaultdict(list)
+    total_ms = sum(s.latency for s in samples) * 1000
+    for s in samples:
+        for name, ms in s.stages.items():
+            per_stage[name].append(ms)
+        if s.stages:
+            per_stage[OUTSIDE_SPANS].append(max(0.0, s.latency * 1000 - max(s.stages.values())))
+    return {
+        name: {**_percentiles(values), "share": round(sum(values) / total_ms, 4) if total_ms else 0.0}
+        for name, values in sorted(per_stage.items(), key=lambda kv: -sum(kv[1]))
+    }
+
+
+def summarize(samples: list[Sample], window: tuple[float, float], shed: int) -> dict:
+    start, end = window
+    measured = [s for s in samples if start <= s.started < end]
+    seconds = end - start
+    report = {"requests": len(measured), "throughput_rps": round(len(measured) / seconds, 2), "shed": shed, "endpoints": {}}
+    for kind in sorted({s.kind for s in measured}):
+        of_kind = [s for s in measured if s.kind == kind]
+        ok = [s for s in of_kind if s.error is None]
+        report["endpoints"][kind] = {
+            "requests": len(of_kind),
+            "throughput_rps": round(len(ok) / seconds, 2),
+            "error_rate": round(1 - len(ok) / len(of_kind), 4),
+            "errors": dict(Counter(s.error for s in of_kind if s.error)),
+            "latency": _percentiles([s.latency * 1000 for s in ok]),
+            "stages": _stage_breakdown(ok),
+        }
+    return report
+
+
+def _print_report(report: dict) -> None:
+    print(f"\n{report['requests']} requests, {report['throughput_rps']} req/s" + (f", {report['shed']} shed" if report["shed"] else ""))
+    for kind, r in report["endpoints"].items():
+        lat = r["latency"]
+        print(f"\n[{kind}] {r['requests']} requests, {r['throughput_rps']} ok/s, error rate {r['error_rate']:.2%}")
+        if lat:
+            print(f"  latency ms  p50 {lat['p50_ms']}  p95 {lat['p95_ms']}  p99 {lat['p99_ms']}  max {lat['max_ms']}")
+        for error, count in r["errors"].items():
+            print(f"  error {error}: {count}")
+        if r["stages"]:
+            print(f"  {'stage':<34} {'p50 ms':>9} {'p95 ms':>9} {'share':>7}")
+            for name, st in r["stages"].items():
+                print(f"  {name:<34} {st['p50_ms']:>9.1f} {st['p95_ms']:>9.1f} {st['share']:>7.1%}")
+        elif lat:
+            print("  (no Server-Timing header; run the server with SERVER_TIMING_ENABLED=true for a stage breakdown)")
+
+
+async def run(args) -> dict:
+    questions = load_questions(args.questions, args.synthetic_questions, args.seed)
+    workload = Workload(questions, args.ingest_ratio, args.seed)
+    samples: list[Sample] = []
+    connections = args.concurrency or args.max_in_flight
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        origin = time.perf_counter()
+        until = origin + args.duration
+        if args.rate:
+            shed = await open_loop(client, workload, samples, origin, until, args.rate, args.max_in_flight, args.seed)
+        else:
+            shed = await closed_loop(client, workload, samples, origin, until, args.concurrency)
+    return summarize(samples, (args.warmup, args.duration), shed)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load-test the DriftLog query and ingest APIs")
+    parser.add_argument("--url", default="http://localhost:8000")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--concurrency", type=int, help="Closed loop: number of concurrent clients (default 8)")
+    mode.add_argument("--rate", type=float, help="Open loop: target requests per second")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="Open loop: cap on outstanding requests")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to generate load")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Leading seconds excluded from the report")
+    parser.add_argument("--questions", choices=("golden", "synthetic"), default="golden" if GOLDEN_PATH.exists() else "synthetic")
+    parser.add_argument("--synthetic-questions", type=int, default=500, help="Size of the synthetic question mix")
+    parser.add_argument("--ingest-ratio", type=float, default=0.0, help="Fraction of requests that ingest a document")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Result file (default: bench/results/load_<timestamp>.json)")
+    args = parser.parse_args()
+    if not args.rate and not args.concurrency:
+        args.concurrency = 8
+    if args.warmup >= args.duration:
+        raise SystemExit("--warmup must be shorter than --duration")
+
+    report = asyncio.run(run(args))
+    _print_report(report)
+
+    commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True)
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": commit.stdout.strip() or None,
+        "platform": platform.platform(),
+        "params": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        **report,
+    }
+    output = args.output or RESULTS_DIR / f"load_{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
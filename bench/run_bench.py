@@ -0,0 +1,349 @@
+"""
+Per-stage performance benchmarks on a synthetic corpus with stubbed providers. No API keys needed.
+
+  python -m bench.run_bench --chunks 100000
+  python -m bench.run_bench --chunks 10000 --db            # + persistence and dense search
+  python -m bench.run_bench --compare bench/results/<earlier>.json
+
+Each stage reports p50/p95/p99 latency per operation and peak Python memory (tracemalloc,
+measured on one extra run so it doesn't skew the timings). Results are written as JSON to
+bench/results/; --compare prints the change against an earlier run.
+
+--db writes synthetic documents to the database in DATABASE_URL and searches them there.
+Point it at a throwaway local pgvector database, never a real one.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from bench import stubs
+from bench.corpus import generate_chunks, generate_documents, generate_questions
+from src.tracing import timed_span
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = PROJECT_ROOT / "bench" / "results"
+
+CPU_STAGES = ("chunking", "bm25_build", "bm25_search", "fusion", "mmr", "prompt", "tracing")
+DB_STAGES = ("persistence", "dense_search")
+
+
+def _summary(samples: list[float], peak_bytes: int, **extra) -> dict:
+    ms = np.array(samples) * 1000
+    return {
+        "iterations": len(samples),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "mean_ms": round(float(ms.mean()), 4),
+        "max_ms": round(float(ms.max()), 4),
+        "peak_memory_mb": round(peak_bytes / 2**20, 3),
+        **extra,
+    }
+
+
+def measure(op: Callable[[], object], repeats: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        op()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        op()
+        samples.append(time.perf_counter() - start)
+    tracemalloc.start()
+    op()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return _summary(samples, peak)
+
+
+async def ameasure(op: Callable[[], Awaitable[object]], repeats: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        await op()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        await op()
+        samples.append(time.perf_counter() - start)
+    tracemalloc.start()
+    await op()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return _summary(samples, peak)
+
+
+def _cycle(items: list) -> Callable[[], object]:
+    it = itertools.cycle(items)
+    return lambda: next(it)
+
+
+def run_cpu_stages(stages: set[str], chunks: list[dict], questions: list[str], args) -> dict:
+    from src.generation.packer import pack_context
+    from src.generation.prompts import build_prompt
+    from src.ingestion.chunker import chunk_text
+    from src.retrieval.fusion import fuse
+    from src.retrieval.mmr import _select
+    from src.retrieval.sparse import BM25Index, _tokenize
+
+    results: dict[str, dict] = {}
+    rng = random.Random(args.seed)
+
+    if "chunking" in stages:
+        documents = [d["content"] for d in generate_documents(min(2000, args.chunks), args.seed)]
+        next_doc = _cycle(documents)
+        results["chunking"] = measure(lambda: chunk_text(next_doc()), args.repeats)
+
+    index = BM25Index()
+    if "bm25_build" in stages:
+        results["bm25_build"] = measure(
+            lambda: index._swap(chunks, [_tokenize(c["content"]) for c in chunks]),
+            args.build_repeats,
+            warmup=0,
+        )
+        results["bm25_build"]["chunks"] = len(chunks)
+    elif stages & {"bm25_search", "fusion", "mmr", "prompt"}:
+        index._swap(chunks, [_tokenize(c["content"]) for c in chunks])
+
+    if "bm25_search" in stages:
+        next_question = _cycle(questions)
+        results["bm25_search"] = measure(lambda: index.search(next_question(), 20), args.repeats)
+
+    # Retriever outputs for the downstream stages: BM25 for real, dense as a random top-20 over the same corpus.
+    sparse_lists = [index.search(q, 20) for q in questions[:50]] if stages & {"fusion", "mmr", "prompt"} else []
+    dense_lists = [
+        [{**c, "similarity_score": 0.9 - i * 0.01} for i, c in enumerate(rng.sample(chunks, min(20, len(chunks))))]
+        for _ in sparse_lists
+    ]
+    fused_lists = [fuse({"dense": d, "sparse": s}) for d, s in zip(dense_lists, sparse_lists)]
+
+    if "fusion" in stages:
+        next_pair = _cycle(list(zip(dense_lists, sparse_lists)))
+
+        def fusion_op():
+            dense, sparse = next_pair()
+            return fuse({"dense": dense, "sparse": sparse})
+
+        results["fusion"] = measure(fusion_op, args.repeats)
+
+    if "mmr" in stages:
+        provider = stubs.StubEmbeddingProvider(1536, stubs.Latency())
+        mmr_inputs = [
+            (np.array([c["fusion_score"] for c in f], dtype=np.float32), provider.encode([c["content"] for c in f]))
+            for f in fused_lists
+        ]
+        next_input = _cycle(mmr_inputs)
+
+        def mmr_op():
+            relevance, vectors = next_input()
+            return _select(relevance / relevance.max(), vectors, 0.7, 10)
+
+        results["mmr"] = measure(mmr_op, args.repeats)
+
+    if "prompt" in stages:
+        next_case = _cycle(list(zip(questions, fused_lists)))
+
+        def prompt_op():
+            question, fused = next_case()
+            context = pack_context([{**c, "rerank_score": c["fusion_score"]} for c in fused[:5]])
+            return build_prompt(question, context)
+
+        results["prompt"] = measure(prompt_op, args.repeats)
+
+    if "tracing" in stages:
+        results.update(run_tracing_stages(args))
+    return results
+
+
+def _request_spans(tracer) -> None:
+    """A /query-shaped span tree: the root plus one span per pipeline stage, with attributes."""
+    with timed_span(tracer, "api.query", lambda: {"query.question_length": 42, "query.has_filters": False}) as root:
+        for name in (
+            "retrieval.route", "retrieval.embed_query", "retrieval.dense_search", "retrieval.sparse_search",
+            "retrieval.fusion", "retrieval.mmr", "retrieval.rerank", "generation.answer",
+        ):
+            with timed_span(tracer, name, lambda: {"search.top_k": 20, "search.has_location_filter": False}) as span:
+                span.set_attribute("search.results_count", 20)
+        root.set_attribute("query.confidence", 0.8)
+
+
+def run_tracing_stages(args) -> dict:
+    """Per-request tracing overhead: off, head-sampled out, tail-sampled out, and exported (to a null exporter)."""
+    from opentelemetry import trace
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+    from opentelemetry.sdk.trace.sampling import ALWAYS_OFF, ALWAYS_ON, ParentBased
+
+    from src import tracing
+
+    class NullExporter(SpanExporter):
+        def export(self, spans):
+            return SpanExportResult.SUCCESS
+
+    results: dict[str, dict] = {}
+    tracing._enabled = False
+    tracer = trace.get_tracer("bench")
+    results["tracing_off"] = measure(lambda: _request_spans(tracer), args.repeats)
+
+    tracing._enabled = True
+    modes = (
+        ("tracing_head_sampled_out", ParentBased(ALWAYS_OFF), None),
+        ("tracing_tail_sampled_out", ALWAYS_ON, 0.0),
+        ("tracing_exported", ALWAYS_ON, 1.0),
+    )
+    try:
+        for stage, sampler, ratio in modes:
+            batch = tracing.BoundedBatchSpanProcessor(NullExporter(), interval_seconds=0.05)
+            provider = TracerProvider(sampler=sampler, shutdown_on_exit=False)
+            provider.add_span_processor(
+                batch if ratio is None else tracing.TailSamplingProcessor(batch, ratio=ratio, slow_ms=1e9)
+            )
+            tracer = provider.get_tracer("bench")
+            results[stage] = measure(lambda: _request_spans(tracer), args.repeats)
+            results[stage]["dropped_spans"] = batch.dropped
+            provider.shutdown()
+    finally:
+        tracing._enabled = False
+    return results
+
+
+async def run_db_stages(stages: set[str], questions: list[str], args) -> dict:
+    from src.database import async_session_factory, engine, init_db
+    from src.ingestion.bulk import BulkDocument, _copy_batch
+    from src.ingestion.chunker import chunk_text
+    from src.ingestion.embedder import get_embedding_provider
+    from src.retrieval.dense import dense_search
+
+    await init_db()
+    provider = get_embedding_provider()
+    results: dict[str, dict] = {}
+
+    if "persistence" in stages:
+        # external_id is unique; leave it unset so repeated runs can write the same synthetic documents.
+        documents = [
+            BulkDocument(**{**d, "external_id": None})
+            for d in generate_documents(args.persist_batches * args.persist_batch_size, args.seed)
+        ]
+        batches = [
+            documents[i:i + args.persist_batch_size] for i in range(0, len(documents), args.persist_batch_size)
+        ]
+        prepared = []
+        for batch in batches:
+            chunks = [chunk_text(d.content) for d in batch]
+            embeddings = provider.encode([c for doc_chunks in chunks for c in doc_chunks]).tolist()
+            prepared.append((batch, chunks, embeddings))
+        next_batch = _cycle(prepared)
+        written = []
+
+        async def persist_op():
+            written.append(await _copy_batch(*next_batch()))
+
+        results["persistence"] = await ameasure(persist_op, len(prepared) - 1, warmup=0)
+        seconds = results["persistence"]["mean_ms"] / 1000
+        results["persistence"]["chunks_per_batch"] = round(sum(written) / len(written), 1)
+        results["persistence"]["chunks_per_second"] = round(sum(written) / len(written) / seconds, 1) if seconds else None
+
+    if "dense_search" in stages:
+        embedded = list(zip(questions, provider.encode(questions).tolist()))
+        next_query = _cycle(embedded)
+
+        async def dense_op():
+            question, vector = next_query()
+            async with async_session_factory() as session:
+                return await dense_search(session, question, query_embedding=vector)
+
+        results["dense_search"] = await ameasure(dense_op, args.repeats)
+    await engine.dispose()
+    return results
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(previous: dict, current: dict) -> None:
+    print(f"\n--- vs {previous.get('git_commit')} ({previous.get('created_at')}) ---")
+    print(f"{'stage':<24} {'p50 ms':>22} {'p95 ms':>22} {'p99 ms':>22}")
+    for stage, now in current["stages"].items():
+        before = previous.get("stages", {}).get(stage)
+        if before is None:
+            continue
+        cells = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            change = (now[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            cells.append(f"{before[key]:.3f} -> {now[key]:.3f} {change:+.0f}%")
+        print(f"{stage:<24} " + " ".join(f"{c:>22}" for c in cells))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run DriftLog per-stage benchmarks with stubbed providers")
+    parser.add_argument("--chunks", type=int, default=10_000, help="Synthetic corpus size for BM25 stages")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=200, help="Timed operations per per-query stage")
+    parser.add_argument("--build-repeats", type=int, default=3, help="Timed BM25 index builds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stages", help=f"Comma-separated subset of {', '.join(CPU_STAGES + DB_STAGES)}")
+    parser.add_argument("--db", action="store_true", help="Also run persistence and dense search against DATABASE_URL")
+    parser.add_argument("--persist-batches", type=int, default=11, help="COPY batches written (first is warm-up)")
+    parser.add_argument("--persist-batch-size", type=int, default=100, help="Documents per COPY batch")
+    parser.add_argument("--output", type=Path, help="Result file (default: bench/results/<timestamp>.json)")
+    parser.add_argument("--compare", type=Path, help="Earlier result file to compare against")
+    args = parser.parse_args()
+
+    stages = set(args.stages.split(",")) if args.stages else set(CPU_STAGES) | (set(DB_STAGES) if args.db else set())
+    unknown = stages - set(CPU_STAGES) - set(DB_STAGES)
+    if unknown:
+        raise SystemExit(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+    stubs.install()
+    started = time.perf_counter()
+    chunks = list(generate_chunks(args.chunks, args.seed))
+    questions = generate_questions(args.questions, args.seed)
+    print(f"Generated {len(chunks)} chunks in {time.perf_counter() - started:.1f}s")
+
+    results = run_cpu_stages(stages, chunks, questions, args)
+    if stages & set(DB_STAGES):
+        results.update(asyncio.run(run_db_stages(stages, questions, args)))
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        "stages": results,
+    }
+
+    print(f"\n{'stage':<24} {'iters':>6} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'peak MB':>9}")
+    for stage, r in report["stages"].items():
+        print(f"{stage:<24} {r['iterations']:>6} {r['p50_ms']:>10.3f} {r['p95_ms']:>10.3f} {r['p99_ms']:>10.3f} {r['peak_memory_mb']:>9.2f}")
+
+    output = args.output or RESULTS_DIR / f"bench_{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(json.loads(args.compare.read_text()), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Run the API with the provider stubs from bench/stubs.py, for load tests without keys or provider bills.
+
+  python -m bench.serve --embedding 0.05 --rerank 0.08 --llm-first-token 0.4 --llm-per-token 0.01 --jitter 0.2
+
+Latencies are in seconds. Retrieval and persistence are real, so DATABASE_URL must point at a
+database (ideally a throwaway one loaded with python -m bench.corpus + src.ingestion.bulk).
+Server-Timing headers are switched on so bench/load.py can break latency down by stage.
+Runs a single process: the stubs are installed in-process.
+"""
+from __future__ import annotations
+
+import argparse
+
+import uvicorn
+
+from bench import stubs
+from src.config import settings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve DriftLog with stubbed providers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--embedding", type=float, default=0.0, help="Embedding call latency (s)")
+    parser.add_argument("--rerank", type=float, default=0.0, help="Rerank call latency (s)")
+    parser.add_argument("--llm-first-token", type=float, default=0.0, help="Claude time to first token (s)")
+    parser.add_argument("--llm-per-token", type=float, default=0.0, help="Claude time per further word (s)")
+    parser.add_argument("--textract", type=float, default=0.0, help="Textract call latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- fraction applied to every delay")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-answer-cache", action="store_true", help="Disable the answer cache so repeats do real work")
+    args = parser.parse_args()
+
+    stubs.install(stubs.Latency(
+        embedding=args.embedding,
+        rerank=args.rerank,
+        llm_first_token=args.llm_first_token,
+        llm_per_token=args.llm_per_token,
+        textract=args.textract,
+        jitter=args.jitter,
+        seed=args.seed,
+    ))
+    settings.server_timing_enabled = True
+    if args.no_answer_cache:
+        settings.answer_cache_enabled = False
+
+    from src.main import app
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
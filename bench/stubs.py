@@ -0,0 +1,230 @@
+"""
+Deterministic local stand-ins for the external providers: OpenAI embeddings, Cohere rerank,
+Anthropic messages (answers, streaming and journal transcription) and AWS Textract.
+
+install() swaps them into the module-level client slots the app already uses, so the real
+code paths run unchanged and no keys or network are needed. Outputs depend only on the
+input text. Optional injected latency (fixed plus seeded jitter) makes the stubs stand in
+for a remote round-trip in load tests.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import re
+import time
+import zlib
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.config import settings
+from src.ingestion.embedder import EmbeddingProvider
+
+_TOKEN = re.compile(r"\b\w+\b")
+
+
+def _tokens(text: str) -> list[str]:
+    return _TOKEN.findall(text.lower())
+
+
+@dataclass
+class Latency:
+    """Injected delays in seconds. jitter is a +/- fraction applied from a seeded RNG."""
+
+    embedding: float = 0.0
+    rerank: float = 0.0
+    llm_first_token: float = 0.0
+    llm_per_token: float = 0.0
+    textract: float = 0.0
+    jitter: float = 0.0
+    seed: int = 0
+
+    def __post_init__(self) -> None:
+        self._rng = random.Random(self.seed)
+
+    def delay(self, seconds: float) -> float:
+        if seconds <= 0 or self.jitter <= 0:
+            return max(0.0, seconds)
+        return max(0.0, seconds * (1 + self._rng.uniform(-self.jitter, self.jitter)))
+
+    async def sleep(self, seconds: float) -> None:
+        seconds = self.delay(seconds)
+        if seconds:
+            await asyncio.sleep(seconds)
+
+
+class StubEmbeddingProvider(EmbeddingProvider):
+    """Feature-hashed bag of words: texts sharing words get nearby vectors, so dense search still ranks."""
+
+    name = "stub"
+    model = "hash"
+
+    def __init__(self, dimensions: int, latency: Latency) -> None:
+        self.dimensions = dimensions
+        self._latency = latency
+
+    @property
+    def model_tag(self) -> str:
+        return f"stub/hash-{self.dimensions}"
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in _tokens(text):
+                h = zlib.crc32(token.encode("utf-8"))
+                vectors[row, h % self.dimensions] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.divide(vectors, norms, out=vectors, where=norms > 0)
+
+    async def embed(self, texts: list[str]) -> tuple[list[list[float]], int | None]:
+        await self._latency.sleep(self._latency.embedding)
+        return self.encode(texts).tolist(), sum(len(_tokens(t)) for t in texts)
+
+
+class StubRerankClient:
+    """Cohere AsyncClientV2.rerank look-alike scoring by query-term coverage."""
+
+    def __init__(self, latency: Latency) -> None:
+        self._latency = latency
+
+    async def rerank(self, *, model: str, query: str, documents: list[str], top_n: int | None = None):
+        await self._latency.sleep(self._latency.rerank)
+        terms = set(_tokens(query))
+        results = []
+        for index, doc in enumerate(documents):
+            words = set(_tokens(doc))
+            coverage = len(terms & words) / len(terms) if terms else 0.0
+            # Small content-derived offset breaks ties deterministically.
+            tiebreak = (zlib.crc32(doc.encode("utf-8")) % 1000) / 100_000
+            results.append(SimpleNamespace(index=index, relevance_score=min(1.0, coverage * 0.95 + tiebreak)))
+        results.sort(key=lambda r: r.relevance_score, reverse=True)
+        return SimpleNamespace(results=results[:top_n] if top_n else results)
+
+
+def _usage(system, messages, output: str) -> SimpleNamespace:
+    chars = len(json.dumps(system, default=str)) + len(json.dumps(messages, default=str))
+    return SimpleNamespace(
+        input_tokens=chars // 4 + 1,
+        output_tokens=len(output) // 4 + 1,
+        cache_read_input_tokens=0,
+        cache_creation_input_tokens=0,
+    )
+
+
+def _has_images(messages: list[dict]) -> bool:
+    return any(
+        isinstance(block, dict) and block.get("type") == "image"
+        for message in messages
+        for block in (message["content"] if isinstance(message["content"], list) else [])
+    )
+
+
+def _answer_text(messages: list[dict]) -> str:
+    """Cite the first two passages, like a well-behaved answer would."""
+    user = json.dumps(messages, default=str)
+    passages = len(re.findall(r"\[(\d+)\]\\n", user))
+    if not passages:
+        return "I don't have enough information to answer that."
+    cited = " ".join(f"[{i}]" for i in range(1, min(passages, 2) + 1))
+    return f"Based on your entries, here is what happened on that trip {cited}. The details are in the cited passages."
+
+
+def _transcription_text(messages: list[dict]) -> str:
+    images = sum(
+        1 for message in messages for block in message["content"]
+        if isinstance(block, dict) and block.get("type") == "image"
+    )
+    entries = [
+        {"transcription": f"Stub transcription of page {i + 1}. We walked along the harbour.", "metadata": {}}
+        for i in range(images)
+    ]
+    return json.dumps(entries)
+
+
+class _Stream:
+    def __init__(self, text: str, message, latency: Latency) -> None:
+        self._text = text
+        self._message = message
+        self._latency = latency
+
+    @property
+    def text_stream(self):
+        async def tokens():
+            await self._latency.sleep(self._latency.llm_first_token)
+            for i, word in enumerate(self._text.split(" ")):
+                if i:
+                    await self._latency.sleep(self._latency.llm_per_token)
+                yield word if i == 0 else " " + word
+        return tokens()
+
+    async def get_final_message(self):
+        return self._message
+
+
+class _StubMessages:
+    def __init__(self, latency: Latency) -> None:
+        self._latency = latency
+
+    def _message(self, system, messages: list[dict]):
+        text = _transcription_text(messages) if _has_images(messages) else _answer_text(messages)
+        return SimpleNamespace(
+            content=[SimpleNamespace(type="text", text=text)],
+            usage=_usage(system, messages, text),
+            stop_reason="end_turn",
+        )
+
+    async def create(self, *, model: str, max_tokens: int, messages: list[dict], system=None, **kwargs):
+        message = self._message(system, messages)
+        words = len(message.content[0].text.split(" "))
+        await self._latency.sleep(self._latency.llm_first_token + self._latency.llm_per_token * (words - 1))
+        return message
+
+    @asynccontextmanager
+    async def _stream(self, system, messages):
+        message = self._message(system, messages)
+        yield _Stream(message.content[0].text, message, self._latency)
+
+    def stream(self, *, model: str, max_tokens: int, messages: list[dict], system=None, **kwargs):
+        return self._stream(system, messages)
+
+
+class StubAnthropicClient:
+    """AsyncAnthropic look-alike: messages.create and messages.stream."""
+
+    def __init__(self, latency: Latency) -> None:
+        self.messages = _StubMessages(latency)
+
+
+class StubTextractClient:
+    """boto3 Textract look-alike; detect_document_text is synchronous like the real client."""
+
+    def __init__(self, latency: Latency) -> None:
+        self._latency = latency
+
+    def detect_document_text(self, *, Document: dict) -> dict:
+        delay = self._latency.delay(self._latency.textract)
+        if delay:
+            time.sleep(delay)
+        digest = zlib.crc32(Document["Bytes"])
+        lines = [f"Page {digest % 97}", "We walked along the harbour", "and ate grilled sardines."]
+        return {"Blocks": [{"BlockType": "LINE", "Text": line} for line in lines]}
+
+
+def install(latency: Latency | None = None) -> Latency:
+    """Point the app's provider clients at the stubs. Call before the first request."""
+    from src.generation import generator
+    from src.ingestion import embedder, transcriber
+    from src.retrieval import reranker
+
+    latency = latency or Latency()
+    embedder._provider = StubEmbeddingProvider(settings.embedding_dimensions, latency)
+    reranker._client = StubRerankClient(latency)
+    generator._client = StubAnthropicClient(latency)
+    transcriber._textract_client = StubTextractClient(latency)
+    # The local cross-encoder would download a model; keep every rerank on the stub.
+    settings.rerank_local_enabled = False
+    return latency
@@ -36,7 +36,7 @@ except ImportError:
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 load_dotenv(PROJECT_ROOT / ".env")
 
-QUERY_URL = "http://localhost:8000/api/v1/query"
+QUERY_BATCH_URL = "http://localhost:8000/api/v1/query/batch"
 GOLDEN_PATH = PROJECT_ROOT / "eval" / "golden_dataset.json"
 RESULTS_DIR = PROJECT_ROOT / "eval" / "results"
 
@@ -78,19 +78,18 @@ async def run_queries_and_collect(
     golden: list[dict],
     dry_run: bool,
 ) -> tuple[list[dict], list[dict]]:
-    """POST each question to the query API; collect answer, citations, etc. Returns (rows_for_ragas, raw_responses)."""
+    """POST all questions to the batch query API; collect answer, citations, etc. Returns (rows_for_ragas, raw_responses)."""
     rows_for_ragas = []
     raw_responses = []
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        for item in golden:
-            q = item["question"]
-            filters = item.get("filters")
-            payload = {"question": q, "filters": filters}
-            resp = await client.post(QUERY_URL, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
+    payload = {"queries": [{"question": item["question"], "filters": item.get("filters")} for item in golden]}
+    async with httpx.AsyncClient(timeout=600.0) as client:
+        resp = await client.post(QUERY_BATCH_URL, json=payload)
+        resp.raise_for_status()
+        results = resp.json()["results"]
 
+        for item, data in zip(golden, results):
+            q = item["question"]
             answer = data.get("answer", "")
             citations = data.get("citations") or []
             confidence = data.get("confidence", 0.0)
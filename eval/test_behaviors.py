@@ -189,7 +189,8 @@ class TestMultilingualGraceful:
         assert "traceback" not in answer_lower and "error:" not in answer_lower and "exception" not in answer_lower, (
             f"Response contains error/traceback language. Answer: {answer[:300]}..."
         )
-        assert response.get("confidence", -1) >= 0.0, f"Expected confidence >= 0, got {response.get('confidence')}"
+        confidence = response.get("confidence", -1)
+        assert confidence is None or confidence >= 0.0, f"Expected confidence >= 0 or null, got {confidence}"
 
 
 @pytest.mark.asyncio
@@ -63,9 +63,9 @@ async function submitQuery() {
   document.getElementById('query-loading').classList.remove('hidden');
 
   try {
-    const res = await fetch(`${API_BASE}/api/v1/query`, {
+    const res = await fetch(`${API_BASE}/api/v1/query/stream`, {
       method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
+      headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
       body: JSON.stringify({
         question,
         filters: hasFilters ? filters : null,
@@ -76,9 +76,26 @@ async function submitQuery() {
       throw new Error(`Server error: ${res.status}`);
     }
 
-    const data = await res.json();
-    renderAnswer(data);
-    scrollToAnswer();
+    let answer = '';
+    let scrolled = false;
+    for await (const { event, data } of readEvents(res)) {
+      if (event === 'retrieval') {
+        // Retrieval is done: swap the spinner for the answer card and start filling it in.
+        document.getElementById('query-loading').classList.add('hidden');
+        renderStreamStart(data);
+        if (!scrolled) { scrollToAnswer(); scrolled = true; }
+      } else if (event === 'token') {
+        answer += data.text;
+        renderAnswerBody(answer);
+      } else if (event === 'citations') {
+        renderCitations(data.citations);
+      } else if (event === 'done') {
+        renderAnswer(data);
+      } else if (event === 'error') {
+        throw new Error(data.detail || 'Query failed');
+      }
+    }
+    if (!scrolled) scrollToAnswer();
   } catch (err) {
     renderError(err.message);
     scrollToAnswer();
@@ -89,48 +106,70 @@ async function submitQuery() {
   }
 }
 
+// Parse a server-sent-events response body into { event, data } objects as frames arrive.
+async function* readEvents(res) {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let sep;
+    while ((sep = buffer.indexOf('\n\n')) !== -1) {
+      const frame = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      let event = 'message';
+      const dataLines = [];
+      for (const line of frame.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) dataLines.push(line.slice(5).trimStart());
+      }
+      if (dataLines.length) yield { event, data: JSON.parse(dataLines.join('\n')) };
+    }
+  }
+}
+
 function scrollToAnswer() {
   const el = document.getElementById('answer-section');
   if (el) el.scrollIntoView({ behavior: 'smooth', block: 'start' });
 }
 
-function renderAnswer(data) {
-  const section = document.getElementById('answer-section');
-  const body = document.getElementById('answer-body');
+function renderStreamStart(data) {
   const badge = document.getElementById('confidence-badge');
-  const confText = document.getElementById('confidence-text');
-  const metaChunks = document.getElementById('meta-chunks');
-  const metaStrategy = document.getElementById('meta-strategy');
-  const citationsList = document.getElementById('citations-list');
-  const citationsSection = document.getElementById('citations-section');
-
-  // Confidence
-  const conf = Math.round((data.confidence || 0) * 100);
-  confText.textContent = `${conf}% confident`;
   badge.className = 'confidence-badge';
-  if (conf >= 70) badge.classList.add('confidence-high');
-  else if (conf >= 40) badge.classList.add('confidence-medium');
-  else badge.classList.add('confidence-low');
+  document.getElementById('confidence-text').textContent = 'Answering…';
+  renderMeta(data);
+  renderAnswerBody('');
+  renderCitations([]);
+  document.getElementById('answer-section').classList.remove('hidden');
+}
 
-  // Meta
-  metaChunks.textContent = `${data.chunks_retrieved} chunks → ${data.chunks_after_rerank} reranked`;
-  metaStrategy.textContent = data.retrieval_strategy.replace(/_/g, ' ');
+function renderMeta(data) {
+  document.getElementById('meta-chunks').textContent =
+    `${data.chunks_retrieved} chunks → ${data.chunks_after_rerank} reranked`;
+  document.getElementById('meta-strategy').textContent = data.retrieval_strategy.replace(/_/g, ' ');
+}
 
+function renderAnswerBody(answer) {
   // Answer body — convert citation markers [1], [2] to styled spans
-  let answerHtml = escapeHtml(data.answer || '');
+  let answerHtml = escapeHtml(answer || '');
   answerHtml = answerHtml.replace(/\[(\d+)\]/g, (_, n) => {
     return `<a class="cite-ref" href="#citation-${n}" onclick="scrollToCitation(${n})">${n}</a>`;
   });
   // Wrap paragraphs
   answerHtml = answerHtml.split('\n\n').map(p => `<p>${p}</p>`).join('');
   answerHtml = answerHtml.replace(/\n/g, '<br>');
-  body.innerHTML = answerHtml;
+  document.getElementById('answer-body').innerHTML = answerHtml;
+}
 
-  // Citations
+function renderCitations(citations) {
+  const citationsList = document.getElementById('citations-list');
+  const citationsSection = document.getElementById('citations-section');
   citationsList.innerHTML = '';
-  if (data.citations && data.citations.length > 0) {
+  if (citations && citations.length > 0) {
     citationsSection.style.display = '';
-    data.citations.forEach(c => {
+    citations.forEach(c => {
       const card = document.createElement('div');
       card.className = 'citation-card';
       card.id = `citation-${c.index}`;
@@ -147,8 +186,30 @@ function renderAnswer(data) {
   } else {
     citationsSection.style.display = 'none';
   }
+}
 
-  section.classList.remove('hidden');
+function renderAnswer(data) {
+  const badge = document.getElementById('confidence-badge');
+  const confText = document.getElementById('confidence-text');
+
+  // Confidence (null: the cited passages were ranked without a relevance score)
+  badge.className = 'confidence-badge';
+  if (data.confidence == null) {
+    confText.textContent = 'Confidence n/a';
+    badge.classList.add('confidence-medium');
+  } else {
+    const conf = Math.round(data.confidence * 100);
+    confText.textContent = `${conf}% confident`;
+    if (conf >= 70) badge.classList.add('confidence-high');
+    else if (conf >= 40) badge.classList.add('confidence-medium');
+    else badge.classList.add('confidence-low');
+  }
+
+  renderMeta(data);
+  renderAnswerBody(data.answer);
+  renderCitations(data.citations);
+
+  document.getElementById('answer-section').classList.remove('hidden');
 }
 
 function renderError(message) {
@@ -8,6 +8,10 @@ class Settings(BaseSettings):
     anthropic_api_key: str = ""
     openai_api_key: str = ""
 
+    # Database pool — connections kept per API process, plus overflow allowed under bursts.
+    database_pool_size: int = 10
+    database_max_overflow: int = 5
+
     # Langfuse / OpenTelemetry tracing — keys only work for the region where the project was created.
     # EU: LANGFUSE_HOST=https://cloud.langfuse.com  |  US: LANGFUSE_HOST=https://us.cloud.langfuse.com
     langfuse_public_key: str = ""
@@ -17,6 +21,129 @@ class Settings(BaseSettings):
         description="Langfuse base URL (must match API key region). EU cloud.langfuse.com, US us.cloud.langfuse.com",
     )
 
+    # Tracing — sample_ratio is the fraction of traces exported. With tail sampling every span is
+    # recorded and the decision waits for the root span, so errors, degraded queries and requests
+    # slower than tracing_slow_ms are always kept; without it the ratio applies up front (cheaper).
+    # Spans beyond tracing_max_queue_size waiting for export are dropped and counted.
+    tracing_enabled: bool = True
+    tracing_sample_ratio: float = 1.0
+    tracing_tail_sampling: bool = True
+    tracing_slow_ms: float = 5000.0
+    tracing_max_pending_traces: int = 1000
+    tracing_max_queue_size: int = 2048
+    tracing_max_export_batch_size: int = 512
+    tracing_export_interval_seconds: float = 5.0
+
+    # Prometheus metrics at /metrics — stage latency histograms, provider tokens and spend, cache hits.
+    metrics_enabled: bool = True
+
+    # Server-Timing — return per-stage span latencies as a response header (read by bench/load.py).
+    server_timing_enabled: bool = False
+
+    # Profiling — pyinstrument per request (pip install -e '.[profiling]'), triggered by an X-Profile
+    # header (must equal profiling_token when set — set one in production) or a sampled fraction of
+    # requests. Speedscope files go to profiling_output_dir.
+    profiling_enabled: bool = False
+    profiling_token: str = ""
+    profiling_sample_rate: float = 0.0
+    profiling_interval_ms: float = 1.0
+    profiling_output_dir: str = "profiles"
+
+    # Embeddings — "openai" or "local" (sentence-transformers on CPU, pip install -e '.[local]').
+    # embedding_dimensions is the chunks.embedding column size, fixed when the table is created.
+    embedding_provider: str = "openai"
+    embedding_model: str = "text-embedding-3-small"
+    embedding_dimensions: int = 1536
+    local_embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"
+    local_embedding_backend: str = "torch"  # or "onnx"
+    local_embedding_threads: int = 2
+    local_embedding_batch_size: int = 64
+
+    # Streaming NDJSON ingest — queue depth between stages and worker count per stage.
+    ingest_stream_queue_size: int = 8
+    ingest_stream_chunk_workers: int = 2
+    ingest_stream_embed_workers: int = 4
+    ingest_stream_persist_workers: int = 2
+
+    # Journal OCR — max concurrent Textract calls per upload, the client's read timeout and its
+    # attempts per page (so one page holds a slot for at most timeout x attempts).
+    textract_concurrency: int = 4
+    textract_timeout_seconds: float = 20.0
+    textract_max_attempts: int = 2
+
+    # Journal image normalization — long-edge limits (px) per consumer, JPEG quality, worker processes.
+    image_ocr_max_edge: int = 2048
+    image_vision_max_edge: int = 1568
+    image_jpeg_quality: int = 85
+    image_workers: int = 2
+
+    # Journal transcription — pages per Claude vision call and max concurrent calls per upload.
+    transcription_group_size: int = 4
+    transcription_concurrency: int = 3
+
+    # Journal transcription cache — entries older than the TTL or beyond the size cap are evicted.
+    transcription_cache_enabled: bool = True
+    transcription_cache_ttl_days: int = 30
+    transcription_cache_max_mb: int = 256
+
+    # Fusion — "rrf", "minmax" or "zscore", and per-retriever weights (JSON in the env, e.g.
+    # FUSION_WEIGHTS='{"dense": 1.0, "sparse": 0.5}'); retrievers not listed get 1.0.
+    fusion_method: str = "rrf"
+    fusion_weights: dict[str, float] = {"dense": 1.0, "sparse": 1.0}
+
+    # MMR — diversify fused candidates before rerank; lambda 1.0 is pure relevance, lower values
+    # penalize similarity to already-picked chunks harder. At most mmr_max_candidates go to rerank.
+    mmr_enabled: bool = True
+    mmr_lambda: float = 0.7
+    mmr_max_candidates: int = 10
+
+    # Rerank — max cached (query, chunk) relevance scores kept in memory.
+    rerank_cache_max_entries: int = 20000
+    # Rerank tiers — keep fusion order when the top-2 fusion_score margin shows a clear winner (the
+    # margin is on the 0..1 fusion_score of whichever fusion_method is active); otherwise score with
+    # the local cross-encoder, and call Cohere only if its top-2 margin is below rerank_local_margin.
+    rerank_skip_fusion_margin: float = 0.25
+    rerank_local_enabled: bool = True
+    rerank_local_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    rerank_local_threads: int = 2
+    rerank_local_margin: float = 0.15
+
+    # Query router — classify questions and skip stages they don't need (off: every query runs hybrid + rerank).
+    query_router_enabled: bool = True
+
+    # Query deadline — total budget in seconds (0 disables) and each stage's share of it. Generation
+    # gets whatever is left; max_tokens is cut to what fits at the expected output rate.
+    query_deadline_seconds: float = 12.0
+    query_deadline_share_embedding: float = 0.1
+    query_deadline_share_dense: float = 0.15
+    query_deadline_share_sparse: float = 0.1
+    query_deadline_share_mmr: float = 0.05
+    query_deadline_share_rerank: float = 0.2
+    generation_tokens_per_second: float = 150.0
+    generation_min_tokens: int = 256
+
+    # Prompt context — token budget for packed passages (estimated at ~4 characters per token).
+    context_token_budget: int = 2000
+
+    # Answer cache — in-process LRU; near-duplicate questions hit above the cosine similarity threshold.
+    answer_cache_enabled: bool = True
+    answer_cache_max_entries: int = 1000
+    answer_cache_ttl_seconds: int = 3600
+    answer_cache_similarity_threshold: float = 0.95
+
+    # Search endpoint — deepest result (offset + limit) a client can page to.
+    search_max_results: int = 100
+
+    # Batch queries — max questions per request and the whole batch's time budget in seconds (0
+    # disables it; each question gets query_deadline_seconds, or what is left of the batch budget
+    # if that is less). Searches run at most
+    # database_pool_size at a time; rerank and generation calls are capped separately to stay
+    # under provider rate limits.
+    batch_query_max_questions: int = 500
+    batch_query_deadline_seconds: float = 300.0
+    batch_query_rerank_concurrency: int = 8
+    batch_query_generation_concurrency: int = 8
+
     model_config = {"env_file": ".env"}
 
 
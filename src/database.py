@@ -15,6 +15,8 @@ engine = create_async_engine(
     _database_url,
     echo=False,
     pool_pre_ping=True,
+    pool_size=settings.database_pool_size,
+    max_overflow=settings.database_max_overflow,
 )
 
 async_session_factory = async_sessionmaker(
@@ -45,8 +47,21 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+# create_all only creates missing tables; columns added after the first release are applied here.
+_SCHEMA_UPGRADES = (
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS external_id VARCHAR(255)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_documents_external_id ON documents (external_id)",
+    "ALTER TABLE chunks ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    # Chunks stored before model tags existed were all embedded with OpenAI text-embedding-3-small.
+    "ALTER TABLE chunks ADD COLUMN IF NOT EXISTS embedding_model VARCHAR(200) DEFAULT 'text-embedding-3-small'",
+    "ALTER TABLE chunks ALTER COLUMN embedding_model DROP DEFAULT",
+)
+
+
 async def init_db() -> None:
     """Create pgvector extension and all tables. Call on app startup."""
     async with engine.begin() as conn:
         await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
         await conn.run_sync(Base.metadata.create_all)
+        for statement in _SCHEMA_UPGRADES:
+            await conn.execute(text(statement))
@@ -0,0 +1,54 @@
+"""Request-level latency budget shared by the query stages.
+
+Each stage gets a configurable share of the total budget, capped by whatever is left, and
+has a degraded fallback when it runs out: skip dense retrieval, keep RRF order instead of
+reranking, shorten or cut off generation. Fallbacks taken are collected in `degraded` so
+the handler can put them on its span.
+"""
+
+from __future__ import annotations
+
+import time
+
+from src.config import settings
+
+
+class Deadline:
+    """Time budget for one request. A budget of None never expires."""
+
+    def __init__(self, budget_seconds: float | None) -> None:
+        self.budget = budget_seconds
+        self._start = time.monotonic()
+        self.degraded: list[str] = []
+
+    @classmethod
+    def for_query(cls) -> Deadline:
+        """Deadline from Settings.query_deadline_seconds (0 disables it)."""
+        return cls(settings.query_deadline_seconds or None)
+
+    def remaining(self) -> float | None:
+        if self.budget is None:
+            return None
+        return max(0.0, self.budget - (time.monotonic() - self._start))
+
+    @property
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def timeout(self, stage: str) -> float | None:
+        """Seconds stage may take: its share of the budget, or less if earlier stages ran long."""
+        if self.budget is None:
+            return None
+        share = getattr(settings, f"query_deadline_share_{stage}")
+        return min(self.budget * share, self.remaining())
+
+    def degrade(self, outcome: str) -> None:
+        if outcome not in self.degraded:
+            self.degraded.append(outcome)
+
+    def record(self, span) -> None:
+        span.set_attribute("query.degraded", list(self.degraded))
+        remaining = self.remaining()
+        if remaining is not None:
+            span.set_attribute("query.deadline_remaining_ms", round(remaining * 1000, 2))
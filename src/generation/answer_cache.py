@@ -0,0 +1,231 @@
+"""In-process answer cache in front of the query pipeline.
+
+Lookups are two-step: an exact match on the normalized question plus filters, then a
+cosine-similarity match on the query embedding among entries with the same filters.
+Entries remember which documents their answer context came from and are dropped when one
+of those documents changes or when new content lands in the scope their filters cover.
+Like the BM25 index, the cache lives in the API process and starts empty on restart.
+
+Question embeddings are kept as rows of one preallocated matrix, updated on put and
+eviction, so a similarity lookup is a single matrix-vector product.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from src.config import settings
+from src.metrics import record_cache
+from src.schemas import QueryFilters
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return re.sub(r"\s+", " ", question.strip().lower()).rstrip("?!. ")
+
+
+def filters_key(filters: QueryFilters | None) -> str:
+    """Canonical JSON for the filters; tag order does not matter."""
+    data = filters.model_dump(exclude_none=True) if filters else {}
+    if data.get("tags"):
+        data["tags"] = sorted(data["tags"])
+    return json.dumps(data, sort_keys=True)
+
+
+@dataclass
+class AnswerCacheEntry:
+    question: str
+    filters: QueryFilters | None
+    embedding: np.ndarray | None
+    response: dict  # QueryResponse fields minus trace_id
+    chunks: list[dict]  # RetrievedChunk fields, replayed as the streaming retrieval event
+    document_ids: set[str] = field(default_factory=set)
+    created_at: float = field(default_factory=time.monotonic)
+
+    def in_scope(self, metadata: dict) -> bool:
+        """Whether a document with this metadata could be retrieved under the entry's filters."""
+        f = self.filters
+        if f is None:
+            return True
+        if f.location is not None and metadata.get("location") != f.location:
+            return False
+        if f.country is not None and metadata.get("country") != f.country:
+            return False
+        if f.tags and not set(f.tags) & set(metadata.get("tags") or []):
+            return False
+        return True
+
+
+class AnswerCache:
+    """LRU of generated answers with exact and near-duplicate lookup."""
+
+    def __init__(self) -> None:
+        self._entries: OrderedDict[tuple[str, str], AnswerCacheEntry] = OrderedDict()
+        self._generation = 0
+        # Unit question embeddings, one row per entry that has one; rows are reused after eviction.
+        self._matrix: np.ndarray | None = None
+        self._row_keys: list[tuple[str, str] | None] = []
+        self._row_scopes = np.empty(0, dtype=object)  # filters_key per row, None when free
+        self._row_created = np.empty(0)
+        self._slots: dict[tuple[str, str], int] = {}
+        self._free: list[int] = []
+
+    @property
+    def generation(self) -> int:
+        """Bumped on every invalidation. Read it before retrieval and pass it to put()."""
+        return self._generation
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expired(self, entry: AnswerCacheEntry) -> bool:
+        return time.monotonic() - entry.created_at > settings.answer_cache_ttl_seconds
+
+    def get(self, question: str, filters: QueryFilters | None) -> AnswerCacheEntry | None:
+        """Exact lookup on normalized question + filters."""
+        if not settings.answer_cache_enabled:
+            return None
+        key = (normalize_question(question), filters_key(filters))
+        entry = self._entries.get(key)
+        if entry is not None and self._expired(entry):
+            self._drop(key)
+            entry = None
+        record_cache("answer_exact", int(entry is not None), int(entry is None))
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get_similar(self, embedding: list[float], filters: QueryFilters | None) -> tuple[AnswerCacheEntry, float] | None:
+        """Best entry with the same filters whose question embedding clears the similarity threshold."""
+        if not settings.answer_cache_enabled or not embedding:
+            return None
+        query = _unit(embedding)
+        if self._matrix is None or query.shape[0] != self._matrix.shape[1]:
+            record_cache("answer_semantic", 0, 1)
+            return None
+        cutoff = time.monotonic() - settings.answer_cache_ttl_seconds
+        live = (self._row_scopes == filters_key(filters)) & (self._row_created >= cutoff)
+        if not live.any():
+            record_cache("answer_semantic", 0, 1)
+            return None
+        scores = np.where(live, self._matrix @ query, -np.inf)
+        best = int(np.argmax(scores))
+        hit = scores[best] >= settings.answer_cache_similarity_threshold
+        record_cache("answer_semantic", int(hit), int(not hit))
+        if not hit:
+            return None
+        key = self._row_keys[best]
+        self._entries.move_to_end(key)
+        return self._entries[key], float(scores[best])
+
+    def put(
+        self,
+        question: str,
+        filters: QueryFilters | None,
+        *,
+        embedding: list[float] | None,
+        response: dict,
+        chunks: list[dict],
+        document_ids: Iterable[str],
+        generation: int,
+    ) -> None:
+        """Store an answer, unless an invalidation happened since `generation` was read (it may be stale)."""
+        if not settings.answer_cache_enabled or generation != self._generation:
+            return
+        key = (normalize_question(question), filters_key(filters))
+        entry = AnswerCacheEntry(
+            question=question,
+            filters=filters,
+            embedding=_unit(embedding) if embedding else None,
+            response=response,
+            chunks=chunks,
+            document_ids=set(document_ids),
+        )
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        # Evict first so the new row can take a freed slot instead of growing the matrix.
+        while len(self._entries) > settings.answer_cache_max_entries:
+            self._drop(next(iter(self._entries)))
+        if key not in self._entries:
+            return
+        if entry.embedding is None:
+            self._release(key)
+        else:
+            self._store_row(key, entry)
+
+    def invalidate(self, *, document_ids: Iterable[str] = (), metadata: Iterable[dict] = ()) -> int:
+        """Drop entries built from any of document_ids, or whose filters cover any new document metadata.
+
+        Returns the number of entries dropped.
+        """
+        self._generation += 1
+        changed = set(document_ids)
+        landed = list(metadata)
+        stale = [
+            key for key, entry in self._entries.items()
+            if entry.document_ids & changed or any(entry.in_scope(m) for m in landed)
+        ]
+        for key in stale:
+            self._drop(key)
+        return len(stale)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+        for key in list(self._slots):
+            self._release(key)
+
+    def _drop(self, key: tuple[str, str]) -> None:
+        del self._entries[key]
+        self._release(key)
+
+    def _store_row(self, key: tuple[str, str], entry: AnswerCacheEntry) -> None:
+        if self._matrix is None or self._matrix.shape[1] != entry.embedding.shape[0]:
+            # First embedding, or the embedding model changed: older rows are in another space.
+            self._slots.clear()
+            self._allocate(max(1, settings.answer_cache_max_entries), entry.embedding.shape[0])
+        slot = self._slots.get(key)
+        if slot is None:
+            if not self._free:
+                self._allocate(2 * len(self._row_keys), self._matrix.shape[1])
+            slot = self._slots[key] = self._free.pop()
+        self._matrix[slot] = entry.embedding
+        self._row_keys[slot] = key
+        self._row_scopes[slot] = key[1]
+        self._row_created[slot] = entry.created_at
+
+    def _release(self, key: tuple[str, str]) -> None:
+        slot = self._slots.pop(key, None)
+        if slot is not None:
+            self._row_keys[slot] = None
+            self._row_scopes[slot] = None
+            self._free.append(slot)
+
+    def _allocate(self, rows: int, dim: int) -> None:
+        """Resize the row storage to rows x dim, keeping the rows of current slots."""
+        matrix = np.zeros((rows, dim), dtype=np.float32)
+        scopes = np.full(rows, None, dtype=object)
+        created = np.zeros(rows)
+        keys: list[tuple[str, str] | None] = [None] * rows
+        for key, slot in self._slots.items():
+            matrix[slot] = self._matrix[slot]
+            scopes[slot], created[slot], keys[slot] = key[1], self._row_created[slot], key
+        self._matrix, self._row_scopes, self._row_created, self._row_keys = matrix, scopes, created, keys
+        self._free = [i for i in range(rows - 1, -1, -1) if keys[i] is None]
+
+
+def _unit(vector: list[float]) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+
+answer_cache = AnswerCache()
@@ -1,4 +1,7 @@
+import asyncio
 import re
+import time
+from collections.abc import AsyncIterator
 
 from anthropic import AsyncAnthropic
 
@@ -22,72 +25,162 @@ def _get_client() -> AsyncAnthropic:
     return _client
 
 
-async def generate_answer(question: str, chunks: list[dict]) -> dict:
-    """Call Claude with context from chunks, parse response, and return answer with citations and confidence."""
+def _build_result(answer: str, chunks: list[dict], span) -> dict:
+    """Parse citation markers out of answer, score confidence from cited chunks, and shape the result dict."""
+    span.set_attribute("generation.answer_length", len(answer))
+
+    cited_indices = sorted(
+        set(int(m) for m in CITATION_PATTERN.findall(answer) if m.isdigit())
+    )
+    cited_indices = [i for i in cited_indices if 1 <= i <= len(chunks)]
+    span.set_attribute("generation.citations_count", len(cited_indices))
+
+    citations = []
+    cited_scores: list[float] = []
+    for i in cited_indices:
+        chunk = chunks[i - 1]
+        meta = chunk.get("metadata") or {}
+        content = chunk.get("content", "")
+        excerpt = content[:EXCERPT_MAX_LEN] + ("..." if len(content) > EXCERPT_MAX_LEN else "")
+        citations.append(
+            {
+                "chunk_id": chunk.get("chunk_id", ""),
+                "chunk_ids": chunk.get("chunk_ids") or [chunk.get("chunk_id", "")],
+                "source": meta.get("source") or "Unknown",
+                "location": meta.get("location") or "N/A",
+                "excerpt": excerpt,
+            }
+        )
+        # Only relevance scores (Cohere, cross-encoder, exact metadata matches) count; fusion
+        # scores only order candidates.
+        if "relevance_score" in chunk:
+            cited_scores.append(chunk["relevance_score"])
+
+    # No citations means no supported answer (0.0); citations that were never relevance-scored
+    # (kept in fusion order) leave confidence unknown (None) rather than low.
+    if cited_scores:
+        confidence = round(sum(cited_scores) / len(cited_scores), 4)
+    elif cited_indices:
+        confidence = None
+    else:
+        confidence = 0.0
+
+    if confidence is not None:
+        span.set_attribute("generation.confidence", confidence)
+
+    return {
+        "answer": answer,
+        "confidence": confidence,
+        "citations": citations,
+        "chunks_retrieved": len(chunks),
+        "chunks_after_rerank": len(chunks),
+    }
+
+
+def listing_answer(entries: list[dict], total: int) -> dict:
+    """Answer a listing question straight from metadata lookup rows, without calling Claude.
+
+    total counts every match; entries are the most recent ones, each cited.
+    """
     tracer = get_tracer()
-    with timed_span(tracer, "generation.answer", {
+    with timed_span(tracer, "generation.listing", lambda: {
+        "generation.context_chunks": len(entries),
+    }) as span:
+        noun = "entry" if total == 1 else "entries"
+        header = f"Found {total} matching {noun}"
+        lines = [header + (f"; the {len(entries)} most recent:" if total > len(entries) else ":")]
+        for i, entry in enumerate(entries, start=1):
+            meta = entry.get("metadata") or {}
+            place = ", ".join(p for p in (meta.get("location"), meta.get("country")) if p) or "Unknown location"
+            lines.append(f"- {meta.get('entry_date') or 'Undated'} · {place} · {meta.get('source') or 'Unknown'} [{i}]")
+        return _build_result("\n".join(lines), entries, span)
+
+
+def budget_max_tokens(remaining_seconds: float | None) -> int:
+    """max_tokens that fits in the remaining time at the expected output rate, within [min, MAX_TOKENS]."""
+    if remaining_seconds is None:
+        return MAX_TOKENS
+    fits = int(remaining_seconds * settings.generation_tokens_per_second)
+    return max(settings.generation_min_tokens, min(MAX_TOKENS, fits))
+
+
+def _record_usage(span, usage, max_tokens: int) -> None:
+    cache_read = (getattr(usage, "cache_read_input_tokens", None) or 0) if usage else 0
+    cache_creation = (getattr(usage, "cache_creation_input_tokens", None) or 0) if usage else 0
+    set_llm_attributes(
+        span,
+        model=MODEL,
+        input_tokens=usage.input_tokens if usage else None,
+        output_tokens=usage.output_tokens if usage else None,
+        total_tokens=(usage.input_tokens + cache_read + cache_creation + usage.output_tokens) if usage else None,
+        max_tokens=max_tokens,
+        temperature=0,
+        cache_read_input_tokens=cache_read if usage else None,
+        cache_creation_input_tokens=cache_creation if usage else None,
+    )
+
+
+async def generate_answer(
+    question: str,
+    chunks: list[dict],
+    *,
+    max_tokens: int = MAX_TOKENS,
+    timeout: float | None = None,
+) -> dict:
+    """Answer with citations and confidence, for callers that don't forward tokens.
+
+    Consumes stream_answer, so both answer paths share one implementation; if timeout runs out
+    the result covers the text generated so far.
+    """
+    result: dict = {}
+    async for kind, value in stream_answer(question, chunks, max_tokens=max_tokens, timeout=timeout):
+        if kind == "result":
+            result = value
+    return result
+
+
+async def stream_answer(
+    question: str,
+    chunks: list[dict],
+    *,
+    max_tokens: int = MAX_TOKENS,
+    timeout: float | None = None,
+) -> AsyncIterator[tuple[str, str | dict]]:
+    """Stream Claude's answer as ("token", text) events, then one ("result", dict) with citations and confidence.
+
+    If timeout (seconds) runs out mid-answer the stream is cut off and the result covers the text so far.
+    """
+    tracer = get_tracer()
+    with timed_span(tracer, "generation.answer_stream", lambda: {
         "generation.context_chunks": len(chunks),
     }) as span:
         prompt = build_prompt(question, chunks)
         client = _get_client()
-        response = await client.messages.create(
+        start = time.perf_counter()
+        parts: list[str] = []
+        usage = None
+        async with client.messages.stream(
             model=MODEL,
-            max_tokens=MAX_TOKENS,
+            max_tokens=max_tokens,
             temperature=0,
             system=prompt["system"],
             messages=[{"role": "user", "content": prompt["user"]}],
-        )
-        answer = response.content[0].text if response.content else ""
-
-        # Record LLM attributes
-        usage = response.usage
-        set_llm_attributes(
-            span,
-            model=MODEL,
-            input_tokens=usage.input_tokens if usage else None,
-            output_tokens=usage.output_tokens if usage else None,
-            total_tokens=(usage.input_tokens + usage.output_tokens) if usage else None,
-            max_tokens=MAX_TOKENS,
-            temperature=0,
-        )
-        span.set_attribute("generation.answer_length", len(answer))
+        ) as stream:
+            texts = stream.text_stream.__aiter__()
+            while True:
+                remaining = None if timeout is None else timeout - (time.perf_counter() - start)
+                try:
+                    text = await asyncio.wait_for(texts.__anext__(), remaining)
+                except StopAsyncIteration:
+                    usage = (await stream.get_final_message()).usage
+                    break
+                except asyncio.TimeoutError:
+                    span.set_attribute("generation.timed_out", True)
+                    break
+                if not parts:
+                    span.set_attribute("generation.time_to_first_token_ms", round((time.perf_counter() - start) * 1000, 2))
+                parts.append(text)
+                yield "token", text
 
-        cited_indices = sorted(
-            set(int(m) for m in CITATION_PATTERN.findall(answer) if m.isdigit())
-        )
-        cited_indices = [i for i in cited_indices if 1 <= i <= len(chunks)]
-        span.set_attribute("generation.citations_count", len(cited_indices))
-
-        citations = []
-        cited_scores: list[float] = []
-        for i in cited_indices:
-            chunk = chunks[i - 1]
-            meta = chunk.get("metadata") or {}
-            content = chunk.get("content", "")
-            excerpt = content[:EXCERPT_MAX_LEN] + ("..." if len(content) > EXCERPT_MAX_LEN else "")
-            citations.append(
-                {
-                    "chunk_id": chunk.get("chunk_id", ""),
-                    "source": meta.get("source") or "Unknown",
-                    "location": meta.get("location") or "N/A",
-                    "excerpt": excerpt,
-                }
-            )
-            if "rerank_score" in chunk:
-                cited_scores.append(chunk["rerank_score"])
-
-        if cited_scores:
-            confidence = sum(cited_scores) / len(cited_scores)
-        else:
-            confidence = 0.0
-
-        span.set_attribute("generation.confidence", round(confidence, 4))
-
-        return {
-            "answer": answer,
-            "confidence": round(confidence, 4),
-            "citations": citations,
-            "query_type": "factual",
-            "chunks_retrieved": len(chunks),
-            "chunks_after_rerank": len(chunks),
-        }
+        _record_usage(span, usage, max_tokens)
+        yield "result", _build_result("".join(parts), chunks, span)
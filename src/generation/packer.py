@@ -0,0 +1,113 @@
+"""Pack reranked chunks into prompt passages under a token budget.
+
+Adjacent chunks of a document repeat up to CHUNK_OVERLAP characters of each other. Chunks
+with consecutive chunk_index from the same document are merged into one passage with the
+overlap removed, so the prompt carries each sentence once and a passage gets one citation
+number. Each passage keeps the ids of the chunks it was built from.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+
+from src.config import settings
+from src.ingestion.chunker import CHUNK_OVERLAP
+from src.tracing import get_tracer, timed_span
+
+# Shorter suffix/prefix matches are treated as coincidence, not splitter overlap.
+MIN_OVERLAP = 20
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English prose); good enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+def _overlap(head: str, tail: str) -> int:
+    """Length of the longest suffix of head that is also a prefix of tail, capped at the splitter overlap."""
+    for k in range(min(len(head), len(tail), CHUNK_OVERLAP), MIN_OVERLAP - 1, -1):
+        if head.endswith(tail[:k]):
+            return k
+    return 0
+
+
+def _merge_run(run: list[dict]) -> dict:
+    """Join chunks with consecutive chunk_index into one passage."""
+    content = run[0]["content"]
+    for chunk in run[1:]:
+        k = _overlap(content, chunk["content"])
+        content = content + chunk["content"][k:] if k else f"{content}\n{chunk['content']}"
+    scores = [c["rerank_score"] for c in run if "rerank_score" in c]
+    relevance = [c["relevance_score"] for c in run if "relevance_score" in c]
+    passage = {
+        "chunk_id": run[0]["chunk_id"],
+        "chunk_ids": [c["chunk_id"] for c in run],
+        "content": content,
+        "document_id": run[0]["document_id"],
+        "chunk_index": run[0].get("chunk_index"),
+        "metadata": run[0].get("metadata") or {},
+    }
+    if scores:
+        passage["rerank_score"] = max(scores)
+    if relevance:
+        passage["relevance_score"] = max(relevance)
+    if "rerank_tier" in run[0]:
+        passage["rerank_tier"] = run[0]["rerank_tier"]
+    return passage
+
+
+def _pack(chunks: list[dict]) -> list[dict]:
+    """Merge consecutive chunks per document; passages are ordered by their best chunk's position in chunks."""
+    rank = {c["chunk_id"]: i for i, c in enumerate(chunks)}
+    by_document: dict[str, list[dict]] = defaultdict(list)
+    for chunk in chunks:
+        by_document[chunk["document_id"]].append(chunk)
+
+    passages: list[tuple[int, dict]] = []
+    for doc_chunks in by_document.values():
+        if any(c.get("chunk_index") is None for c in doc_chunks):
+            passages.extend((rank[c["chunk_id"]], _merge_run([c])) for c in doc_chunks)
+            continue
+        doc_chunks.sort(key=lambda c: c["chunk_index"])
+        run = [doc_chunks[0]]
+        for chunk in doc_chunks[1:]:
+            if chunk["chunk_index"] == run[-1]["chunk_index"] + 1:
+                run.append(chunk)
+            else:
+                passages.append((min(rank[c["chunk_id"]] for c in run), _merge_run(run)))
+                run = [chunk]
+        passages.append((min(rank[c["chunk_id"]] for c in run), _merge_run(run)))
+    passages.sort(key=lambda p: p[0])
+    return [p for _, p in passages]
+
+
+def _size(passages: list[dict]) -> int:
+    return sum(estimate_tokens(p["content"]) for p in passages)
+
+
+def pack_context(chunks: list[dict], budget_tokens: int | None = None) -> list[dict]:
+    """Select chunks by rerank score until the packed context would exceed the budget, then merge neighbors.
+
+    Returns passages shaped like chunk dicts plus chunk_ids. The best chunk is always kept.
+    """
+    budget = settings.context_token_budget if budget_tokens is None else budget_tokens
+    tracer = get_tracer()
+    with timed_span(tracer, "generation.pack_context", lambda: {
+        "pack.input_chunks": len(chunks),
+        "pack.budget_tokens": budget,
+    }) as span:
+        ordered = sorted(chunks, key=lambda c: c.get("rerank_score", 0.0), reverse=True)
+        selected: list[dict] = []
+        passages: list[dict] = []
+        for chunk in ordered:
+            candidate = _pack(selected + [chunk])
+            # Merging can make a neighbor almost free, so cost is measured on the packed result.
+            if selected and _size(candidate) > budget:
+                continue
+            selected.append(chunk)
+            passages = candidate
+        span.set_attribute("pack.output_passages", len(passages))
+        span.set_attribute("pack.dropped_chunks", len(chunks) - len(selected))
+        span.set_attribute("pack.input_tokens", _size(chunks))
+        span.set_attribute("pack.output_tokens", _size(passages))
+        return passages
@@ -10,9 +10,12 @@ USER_PROMPT_TEMPLATE = """{context}
 
 Question: {question}"""
 
+def build_prompt(question: str, chunks: list[dict]) -> dict[str, list[dict]]:
+    """Format chunks with numeric citations and return system + user content blocks for response generation.
 
-def build_prompt(question: str, chunks: list[dict]) -> dict[str, str]:
-    """Format chunks with numeric citations and return system + user prompt dict for response generation."""
+    No prompt-cache breakpoint: the only prefix shared across calls is the system prompt, far
+    below Haiku 4.5's minimum cacheable length, and the retrieved context differs per question.
+    """
     context_parts = []
     for i, chunk in enumerate(chunks, start=1):
         meta = chunk.get("metadata") or {}
@@ -23,6 +26,6 @@ def build_prompt(question: str, chunks: list[dict]) -> dict[str, str]:
         context_parts.append(block)
     context = "\n\n".join(context_parts) if context_parts else "(No context provided.)"
     return {
-        "system": SYSTEM_PROMPT,
-        "user": USER_PROMPT_TEMPLATE.format(context=context, question=question),
+        "system": [{"type": "text", "text": SYSTEM_PROMPT}],
+        "user": [{"type": "text", "text": USER_PROMPT_TEMPLATE.format(context=context, question=question)}],
     }
@@ -0,0 +1,293 @@
+"""
+Offline bulk import for backfills. Bypasses the HTTP API and writes straight to PostgreSQL.
+
+  python -m src.ingestion.bulk notes/
+  python -m src.ingestion.bulk corpus.jsonl --checkpoint corpus.ckpt.json --api-url http://localhost:8000
+
+Input is a directory (every .txt / .md file is one document, .jsonl files are read line by
+line) or a single JSONL file with one IngestDocumentRequest per line (external_id optional).
+Documents are processed in batches: chunked in a process pool, embedded through concurrent
+batched calls, and written with COPY in one transaction per batch. After each commit the
+checkpoint records how many input records are done, so an interrupted run resumes at the
+next batch. Inputs are walked in a fixed order; don't change the input between resumes.
+Documents whose external_id is already stored, or repeats within the input, are skipped
+(and counted): a duplicate would abort the COPY for its whole batch.
+
+The BM25 index lives in the API process, so it is refreshed once at the end through
+POST /api/v1/index/rebuild when --api-url is given (otherwise restart the API).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import httpx
+from pydantic import ValidationError
+from sqlalchemy import select
+
+from src.database import engine
+from src.ingestion.chunker import chunk_text
+from src.ingestion.embedder import embed_chunks, get_embedding_provider
+from src.ingestion.pipeline import chunk_metadata, content_hash, parse_entry_date
+from src.models import Document
+from src.schemas import IngestDocumentRequest
+
+logger = logging.getLogger(__name__)
+
+TEXT_SUFFIXES = {".txt", ".md"}
+
+
+class BulkDocument(IngestDocumentRequest):
+    external_id: str | None = None
+
+
+def _iter_jsonl(path: Path, label: str) -> Iterator[BulkDocument]:
+    with path.open(encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                doc = BulkDocument.model_validate_json(line)
+            except ValidationError as e:
+                logger.warning("Skipping %s line %d: %s", label, line_no, e.errors(include_url=False)[0]["msg"])
+                continue
+            yield doc
+
+
+def iter_documents(path: Path) -> Iterator[BulkDocument]:
+    """Yield documents from a directory tree or a JSONL file, in a stable order."""
+    if not path.is_dir():
+        yield from _iter_jsonl(path, path.name)
+        return
+    for file in sorted(p for p in path.rglob("*") if p.is_file()):
+        rel = file.relative_to(path).as_posix()
+        suffix = file.suffix.lower()
+        if suffix in TEXT_SUFFIXES:
+            content = file.read_text(encoding="utf-8", errors="replace")
+            yield BulkDocument(content=content, source=rel)
+        elif suffix == ".jsonl":
+            yield from _iter_jsonl(file, rel)
+
+
+def _chunk_many(contents: list[str]) -> list[list[str]]:
+    """Runs in a worker process."""
+    return [chunk_text(content) for content in contents]
+
+
+async def _chunk_batch(pool: ProcessPoolExecutor, workers: int, contents: list[str]) -> list[list[str]]:
+    """Split a batch across the pool and reassemble per-document chunk lists in order."""
+    loop = asyncio.get_running_loop()
+    step = max(1, -(-len(contents) // workers))
+    parts = await asyncio.gather(
+        *(loop.run_in_executor(pool, _chunk_many, contents[i:i + step]) for i in range(0, len(contents), step))
+    )
+    return [chunks for part in parts for chunks in part]
+
+
+async def _embed_all(texts: list[str], batch_size: int, concurrency: int) -> list[list[float]]:
+    """Embed texts in batch_size requests, at most `concurrency` in flight; output order matches input."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(batch: list[str]) -> list[list[float]]:
+        async with semaphore:
+            return await embed_chunks(batch)
+
+    results = await asyncio.gather(*(one(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)))
+    return [vector for batch in results for vector in batch]
+
+
+async def _drop_duplicates(
+    docs: list[BulkDocument], chunks: list[list[str]]
+) -> tuple[list[BulkDocument], list[list[str]]]:
+    """Drop documents whose external_id is already in the database or earlier in the batch."""
+    ids = [d.external_id for d in docs if d.external_id]
+    seen: set[str] = set()
+    if ids:
+        async with engine.connect() as conn:
+            result = await conn.execute(select(Document.external_id).where(Document.external_id.in_(ids)))
+            seen.update(result.scalars())
+    kept_docs: list[BulkDocument] = []
+    kept_chunks: list[list[str]] = []
+    for doc, doc_chunks in zip(docs, chunks):
+        if doc.external_id:
+            if doc.external_id in seen:
+                continue
+            seen.add(doc.external_id)
+        kept_docs.append(doc)
+        kept_chunks.append(doc_chunks)
+    return kept_docs, kept_chunks
+
+
+def _vector_literal(embedding: list[float]) -> str:
+    return "[" + ",".join(str(x) for x in embedding) + "]"
+
+
+async def _copy_batch(docs: list[BulkDocument], chunks: list[list[str]], embeddings: list[list[float]]) -> int:
+    """Write documents and chunks with COPY in a single transaction. Returns chunks written."""
+    document_rows = []
+    chunk_rows = []
+    vectors = iter(embeddings)
+    model_tag = get_embedding_provider().model_tag
+    for doc, doc_chunks in zip(docs, chunks):
+        document = Document(
+            id=uuid.uuid4(),
+            external_id=doc.external_id,
+            content=doc.content,
+            source=doc.source,
+            location=doc.location,
+            country=doc.country,
+            tags=doc.tags,
+            entry_date=parse_entry_date(doc.entry_date),
+        )
+        document_id = document.id
+        document_rows.append(
+            (document_id, document.external_id, document.content, document.source,
+             document.location, document.country, document.tags, document.entry_date)
+        )
+        metadata = json.dumps(chunk_metadata(document))
+        for i, content in enumerate(doc_chunks):
+            chunk_rows.append(
+                (uuid.uuid4(), document_id, content, i, content_hash(content),
+                 _vector_literal(next(vectors)), model_tag, metadata)
+            )
+
+    async with engine.begin() as conn:
+        raw = await conn.get_raw_connection()
+        async with raw.driver_connection.cursor() as cur:
+            async with cur.copy(
+                "COPY documents (id, external_id, content, source, location, country, tags, entry_date) FROM STDIN"
+            ) as copy:
+                for row in document_rows:
+                    await copy.write_row(row)
+            async with cur.copy(
+                "COPY chunks (id, document_id, content, chunk_index, content_hash, embedding, embedding_model, metadata)"
+                " FROM STDIN"
+            ) as copy:
+                for row in chunk_rows:
+                    await copy.write_row(row)
+    return len(chunk_rows)
+
+
+def _load_checkpoint(path: Path, source: Path) -> dict:
+    if path.exists():
+        state = json.loads(path.read_text())
+        if state.get("source") != str(source.resolve()):
+            raise SystemExit(f"Checkpoint {path} belongs to {state.get('source')}, not {source}")
+        return state
+    return {"source": str(source.resolve()), "records_done": 0, "documents": 0, "chunks": 0, "duplicates": 0}
+
+
+def _save_checkpoint(path: Path, state: dict) -> None:
+    """Write atomically so a crash mid-write never leaves a truncated checkpoint."""
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(state, indent=2))
+    os.replace(tmp, path)
+
+
+async def run_import(
+    source: Path,
+    checkpoint: Path,
+    *,
+    batch_size: int,
+    workers: int,
+    embed_batch_size: int,
+    embed_concurrency: int,
+    api_url: str | None,
+) -> dict:
+    state = _load_checkpoint(checkpoint, source)
+    state.setdefault("duplicates", 0)
+    if state["records_done"]:
+        logger.info("Resuming after %d records", state["records_done"])
+    documents = itertools.islice(iter_documents(source), state["records_done"], None)
+
+    def next_batch() -> list[BulkDocument]:
+        return list(itertools.islice(documents, batch_size))
+
+    started = time.perf_counter()
+    chunks_this_run = 0
+    # spawn, not fork: workers only need the chunker, not a copy of the event loop and DB pool.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        batch = next_batch()
+        pending = asyncio.ensure_future(_chunk_batch(pool, workers, [d.content for d in batch])) if batch else None
+        while batch:
+            chunks = await pending
+            # Chunk the next batch in the pool while this one is embedded and written.
+            following = next_batch()
+            if following:
+                pending = asyncio.ensure_future(_chunk_batch(pool, workers, [d.content for d in following]))
+            docs, chunks = await _drop_duplicates(batch, chunks)
+            if len(docs) < len(batch):
+                logger.warning("Skipping %d documents with an external_id that is already imported", len(batch) - len(docs))
+            embeddings = await _embed_all([c for doc_chunks in chunks for c in doc_chunks], embed_batch_size, embed_concurrency)
+            written = await _copy_batch(docs, chunks, embeddings) if docs else 0
+
+            state["records_done"] += len(batch)
+            state["documents"] += len(docs)
+            state["duplicates"] += len(batch) - len(docs)
+            state["chunks"] += written
+            _save_checkpoint(checkpoint, state)
+            chunks_this_run += written
+            elapsed = time.perf_counter() - started
+            logger.info(
+                "%d records done (%d chunks this run, %.0f chunks/s)",
+                state["records_done"],
+                chunks_this_run,
+                chunks_this_run / elapsed if elapsed else 0.0,
+            )
+            batch = following
+
+    if api_url:
+        async with httpx.AsyncClient(timeout=600.0) as client:
+            resp = await client.post(f"{api_url.rstrip('/')}/api/v1/index/rebuild")
+            resp.raise_for_status()
+        logger.info("Sparse index rebuilt via %s", api_url)
+    else:
+        logger.info("No --api-url given; restart the API or POST /api/v1/index/rebuild to refresh BM25")
+    await engine.dispose()
+    return state
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk-import documents into DriftLog without the HTTP API")
+    parser.add_argument("source", type=Path, help="Directory of .txt/.md/.jsonl files, or a JSONL file")
+    parser.add_argument("--checkpoint", type=Path, help="Progress file (default: <source>.checkpoint.json)")
+    parser.add_argument("--batch-size", type=int, default=500, help="Documents per COPY transaction / checkpoint")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Chunking processes")
+    parser.add_argument("--embed-batch-size", type=int, default=256, help="Texts per embedding request")
+    parser.add_argument("--embed-concurrency", type=int, default=4, help="Embedding requests in flight")
+    parser.add_argument("--api-url", help="Running API to refresh the BM25 index on when done, e.g. http://localhost:8000")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if not args.source.exists():
+        raise SystemExit(f"Source not found: {args.source}")
+    checkpoint = args.checkpoint or args.source.with_name(args.source.name + ".checkpoint.json")
+    state = asyncio.run(
+        run_import(
+            args.source,
+            checkpoint,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            embed_batch_size=args.embed_batch_size,
+            embed_concurrency=args.embed_concurrency,
+            api_url=args.api_url,
+        )
+    )
+    print(
+        f"Imported {state['documents']} documents / {state['chunks']} chunks, "
+        f"skipped {state['duplicates']} duplicates (checkpoint: {checkpoint})"
+    )
+
+
+if __name__ == "__main__":
+    main()
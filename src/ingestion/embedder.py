@@ -1,32 +1,175 @@
+"""Embedding providers behind embed_chunks / embed_text.
+
+Settings.embedding_provider selects OpenAI (default) or a local sentence-transformers model
+running on CPU. Every provider returns vectors of Settings.embedding_dimensions so they fit
+the chunks.embedding column; a local model with fewer dimensions is zero-padded, which
+leaves cosine similarity unchanged. Each chunk stores its provider's model_tag, and dense
+search only compares vectors that share the current tag.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 from openai import AsyncOpenAI
 
+from src.config import settings
 from src.tracing import get_tracer, set_llm_attributes, timed_span
 
-EMBEDDING_MODEL = "text-embedding-3-small"
+# Native size of the OpenAI text-embedding-3-small vectors stored before model tags existed.
+OPENAI_NATIVE_DIMENSIONS = 1536
+
+_client: AsyncOpenAI | None = None
+_provider: EmbeddingProvider | None = None
+
+
+def _get_client() -> AsyncOpenAI:
+    """Return a cached AsyncOpenAI client so concurrent calls share one connection pool."""
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI()
+    return _client
+
+
+class EmbeddingProvider(ABC):
+    """Turns texts into fixed-size vectors. model_tag identifies which vector space they live in."""
+
+    name: str
+    model: str
+    dimensions: int
+
+    @property
+    @abstractmethod
+    def model_tag(self) -> str: ...
+
+    @abstractmethod
+    async def embed(self, texts: list[str]) -> tuple[list[list[float]], int | None]:
+        """Return one vector per text, in order, plus total tokens if the backend reports them."""
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    name = "openai"
+
+    def __init__(self, model: str, dimensions: int) -> None:
+        self.model = model
+        self.dimensions = dimensions
+
+    @property
+    def model_tag(self) -> str:
+        if self.dimensions == OPENAI_NATIVE_DIMENSIONS:
+            return self.model
+        return f"{self.model}:{self.dimensions}"
+
+    async def embed(self, texts: list[str]) -> tuple[list[list[float]], int | None]:
+        kwargs = {}
+        # text-embedding-3 models can be shortened server-side; older models only have their native size.
+        if self.model.startswith("text-embedding-3"):
+            kwargs["dimensions"] = self.dimensions
+        response = await _get_client().embeddings.create(model=self.model, input=texts, **kwargs)
+        # OpenAI embeddings response includes usage
+        usage = getattr(response, "usage", None)
+        total_tokens = getattr(usage, "total_tokens", None) if usage else None
+        return [item.embedding for item in response.data], total_tokens
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """sentence-transformers model on CPU; batches run on a dedicated thread pool, off the event loop."""
+
+    name = "local"
+
+    def __init__(self, model: str, dimensions: int, *, backend: str, threads: int, batch_size: int) -> None:
+        self.model = model
+        self.dimensions = dimensions
+        self._backend = backend
+        self._batch_size = max(1, batch_size)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="embedding")
+        self._model = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def model_tag(self) -> str:
+        return f"local/{self.model}"
+
+    def _load(self):
+        if self._model is not None:
+            return self._model
+        # Worker threads may all hit the first request; only one should load the model.
+        with self._load_lock:
+            if self._model is None:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                except ImportError as e:
+                    raise RuntimeError(
+                        "EMBEDDING_PROVIDER=local requires sentence-transformers: pip install -e '.[local]'"
+                    ) from e
+                kwargs = {} if self._backend == "torch" else {"backend": self._backend}
+                model = SentenceTransformer(self.model, device="cpu", **kwargs)
+                native = model.get_sentence_embedding_dimension()
+                if native > self.dimensions:
+                    raise ValueError(
+                        f"{self.model} produces {native}-dim vectors, more than EMBEDDING_DIMENSIONS={self.dimensions}"
+                    )
+                self._model = model
+        return self._model
+
+    def _encode(self, texts: list[str]) -> list[list[float]]:
+        vectors = self._load().encode(texts, batch_size=len(texts), normalize_embeddings=True, convert_to_numpy=True)
+        pad = self.dimensions - vectors.shape[1]
+        if pad:
+            vectors = np.pad(vectors, ((0, 0), (0, pad)))
+        return vectors.tolist()
+
+    async def embed(self, texts: list[str]) -> tuple[list[list[float]], int | None]:
+        loop = asyncio.get_running_loop()
+        batches = [texts[i:i + self._batch_size] for i in range(0, len(texts), self._batch_size)]
+        results = await asyncio.gather(*(loop.run_in_executor(self._executor, self._encode, b) for b in batches))
+        return [vector for batch in results for vector in batch], None
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """Return the provider selected in Settings, creating it on first use."""
+    global _provider
+    if _provider is None:
+        if settings.embedding_provider == "local":
+            _provider = LocalEmbeddingProvider(
+                settings.local_embedding_model,
+                settings.embedding_dimensions,
+                backend=settings.local_embedding_backend,
+                threads=settings.local_embedding_threads,
+                batch_size=settings.local_embedding_batch_size,
+            )
+        elif settings.embedding_provider == "openai":
+            _provider = OpenAIEmbeddingProvider(settings.embedding_model, settings.embedding_dimensions)
+        else:
+            raise ValueError(f"Unknown EMBEDDING_PROVIDER {settings.embedding_provider!r} (expected openai or local)")
+    return _provider
 
 
 async def embed_chunks(chunks: list[str]) -> list[list[float]]:
-    """Embed a list of text chunks in one batched API call. Returns embeddings in same order as input."""
+    """Embed a list of text chunks in one batched call. Returns embeddings in same order as input."""
     if not chunks:
         return []
+    provider = get_embedding_provider()
     tracer = get_tracer()
-    with timed_span(tracer, "embedding.batch", {"embedding.chunk_count": len(chunks)}) as span:
-        client = AsyncOpenAI()
-        response = await client.embeddings.create(
-            model=EMBEDDING_MODEL,
-            input=chunks,
-        )
-        # OpenAI embeddings response includes usage
-        usage = getattr(response, "usage", None)
-        total_tokens = getattr(usage, "total_tokens", None) if usage else None
-        set_llm_attributes(
-            span,
-            model=EMBEDDING_MODEL,
-            input_tokens=total_tokens,
-            total_tokens=total_tokens,
-        )
-        span.set_attribute("embedding.dimensions", len(response.data[0].embedding) if response.data else 0)
-        return [item.embedding for item in response.data]
+    with timed_span(tracer, "embedding.batch", lambda: {
+        "embedding.chunk_count": len(chunks),
+        "embedding.provider": provider.name,
+        "embedding.model_tag": provider.model_tag,
+    }) as span:
+        embeddings, total_tokens = await provider.embed(chunks)
+        if provider.name == "openai":
+            set_llm_attributes(
+                span,
+                model=provider.model,
+                input_tokens=total_tokens,
+                total_tokens=total_tokens,
+            )
+        span.set_attribute("embedding.dimensions", len(embeddings[0]) if embeddings else 0)
+        return embeddings
 
 
 async def embed_text(text: str) -> list[float]:
@@ -0,0 +1,135 @@
+"""Normalize journal images once before OCR and vision calls.
+
+Phone photos arrive as 10+ MB base64 strings. Each image is decoded once in a worker
+process, rotated according to its EXIF orientation, downscaled and re-encoded as JPEG:
+one rendition sized for Textract, a smaller one for Claude vision (which downsamples
+anything past ~1568px on the long edge anyway, so larger inputs only cost upload time
+and tokens).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import io
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from src.config import settings
+from src.tracing import get_tracer, timed_span
+
+logger = logging.getLogger(__name__)
+
+_pool: ProcessPoolExecutor | None = None
+
+
+@dataclass(frozen=True)
+class PreparedImage:
+    ocr_bytes: bytes
+    vision_data: str  # base64, ready for an Anthropic image block
+    media_type: str
+    original_size: int
+    digest: str  # sha256 of the decoded upload, for transcription cache keys
+
+
+def _encode_jpeg(image: Image.Image, max_edge: int, quality: int) -> tuple[Image.Image, bytes]:
+    """Downscale to fit max_edge (never upscale) and encode as JPEG. Returns the resized image too."""
+    resized = image.copy()
+    resized.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    buf = io.BytesIO()
+    resized.save(buf, format="JPEG", quality=quality, optimize=True)
+    return resized, buf.getvalue()
+
+
+def _prepare(data: str, media_type: str, ocr_max_edge: int, vision_max_edge: int, quality: int) -> PreparedImage:
+    """Runs in a worker process. Undecodable formats (e.g. HEIC without a plugin) pass through unchanged."""
+    # Strip line breaks first: MIME-wrapped base64 is common and validate=True rejects it.
+    raw = base64.b64decode("".join(data.split()), validate=True)
+    digest = hashlib.sha256(raw).hexdigest()
+    try:
+        with Image.open(io.BytesIO(raw)) as opened:
+            # For JPEGs, let the decoder skip detail we would throw away anyway.
+            opened.draft("RGB", (ocr_max_edge, ocr_max_edge))
+            image = ImageOps.exif_transpose(opened)
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            ocr_image, ocr_bytes = _encode_jpeg(image, ocr_max_edge, quality)
+            # Second rendition is derived from the already-downscaled one to avoid resampling the full image twice.
+            _, vision_bytes = _encode_jpeg(ocr_image, vision_max_edge, quality)
+    except (UnidentifiedImageError, OSError, ValueError) as e:
+        logger.warning("Could not normalize %s image, sending original bytes: %s", media_type, e)
+        return PreparedImage(
+            ocr_bytes=raw, vision_data=data, media_type=media_type, original_size=len(raw), digest=digest
+        )
+    return PreparedImage(
+        ocr_bytes=ocr_bytes,
+        vision_data=base64.b64encode(vision_bytes).decode("ascii"),
+        media_type="image/jpeg",
+        original_size=len(raw),
+        digest=digest,
+    )
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Return the shared image worker pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        # spawn, not fork: the API process has live threads (boto3, OTel exporters) that fork would copy mid-state.
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.image_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_image_pool() -> None:
+    """Stop the worker pool. Call on app shutdown."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def prepare_images(images: list[dict]) -> list[PreparedImage]:
+    """Decode and normalize uploaded images in the process pool. Images that are not valid base64 are dropped."""
+    if not images:
+        return []
+    tracer = get_tracer()
+    with timed_span(tracer, "transcription.prepare_images", lambda: {
+        "transcription.image_count": len(images),
+    }) as span:
+        loop = asyncio.get_running_loop()
+        pool = _get_pool()
+        results = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    pool,
+                    _prepare,
+                    img["data"],
+                    img.get("media_type", "image/jpeg"),
+                    settings.image_ocr_max_edge,
+                    settings.image_vision_max_edge,
+                    settings.image_jpeg_quality,
+                )
+                for img in images
+            ),
+            return_exceptions=True,
+        )
+        prepared: list[PreparedImage] = []
+        for i, result in enumerate(results):
+            if isinstance(result, binascii.Error):
+                logger.warning("Failed to base64-decode image %d, skipping it: %s", i, result)
+                continue
+            if isinstance(result, BaseException):
+                raise result
+            prepared.append(result)
+        span.set_attribute("transcription.input_bytes", sum(p.original_size for p in prepared))
+        span.set_attribute("transcription.ocr_bytes", sum(len(p.ocr_bytes) for p in prepared))
+        span.set_attribute("transcription.vision_bytes", sum(len(p.vision_data) * 3 // 4 for p in prepared))
+        return prepared
@@ -1,15 +1,49 @@
+import hashlib
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date
+
+from dateutil import parser as dateutil_parser
+from sqlalchemy import delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.ingestion.chunker import chunk_text
-from src.ingestion.embedder import embed_chunks
+from src.ingestion.embedder import embed_chunks, get_embedding_provider
 from src.models import Chunk, Document
+from src.schemas import UpsertDocumentRequest
 from src.tracing import get_tracer, timed_span
 
 
+def parse_entry_date(value: str | None) -> date | None:
+    """Parse a free-form entry date string; returns None when empty or unparseable."""
+    if not value or not value.strip():
+        return None
+    try:
+        return dateutil_parser.parse(value.strip()).date()
+    except (ValueError, TypeError):
+        return None
+
+
+def content_hash(content: str) -> str:
+    """Stable fingerprint of chunk text, stored on Chunk.content_hash."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def chunk_metadata(document: Document) -> dict:
+    """Metadata copied from the parent document onto each of its Chunk rows."""
+    return {
+        "source": document.source,
+        "location": document.location,
+        "country": document.country,
+        "tags": document.tags,
+        "entry_date": document.entry_date.isoformat() if document.entry_date else None,
+    }
+
+
 async def process_document(session: AsyncSession, document: Document) -> int:
     """Chunk document content, embed chunks, and persist Chunk rows with metadata. Returns number of chunks created."""
     tracer = get_tracer()
-    with timed_span(tracer, "ingestion.process_document", {
+    with timed_span(tracer, "ingestion.process_document", lambda: {
         "document.source": document.source or "",
         "document.location": document.location or "",
         "document.country": document.country or "",
@@ -27,14 +61,9 @@ async def process_document(session: AsyncSession, document: Document) -> int:
             return 0
 
         embeddings = await embed_chunks(chunks)
+        model_tag = get_embedding_provider().model_tag
 
-        metadata = {
-            "source": document.source,
-            "location": document.location,
-            "country": document.country,
-            "tags": document.tags,
-            "entry_date": document.entry_date.isoformat() if document.entry_date else None,
-        }
+        metadata = chunk_metadata(document)
 
         with timed_span(tracer, "ingestion.persist_chunks") as persist_span:
             for i, content in enumerate(chunks):
@@ -43,7 +72,9 @@ async def process_document(session: AsyncSession, document: Document) -> int:
                     document_id=document.id,
                     content=content,
                     chunk_index=i,
+                    content_hash=content_hash(content),
                     embedding=embedding,
+                    embedding_model=model_tag,
                     metadata_=metadata,
                 )
                 session.add(chunk)
@@ -51,3 +82,134 @@ async def process_document(session: AsyncSession, document: Document) -> int:
 
         span.set_attribute("ingestion.chunks_created", len(chunks))
         return len(chunks)
+
+
+@dataclass
+class UpsertOutcome:
+    """What an upsert changed. sparse_upserted / sparse_removed are the delta for BM25Index.apply_delta."""
+
+    document_id: str
+    status: str
+    chunks_added: int = 0
+    chunks_removed: int = 0
+    chunks_unchanged: int = 0
+    sparse_upserted: list[dict] = field(default_factory=list)
+    sparse_removed: list[str] = field(default_factory=list)
+
+
+def _sparse_entry(row: Chunk) -> dict:
+    return {
+        "chunk_id": str(row.id),
+        "content": row.content,
+        "document_id": str(row.document_id),
+        "chunk_index": row.chunk_index,
+        "metadata": dict(row.metadata_) if row.metadata_ else {},
+    }
+
+
+async def upsert_document(session: AsyncSession, doc: UpsertDocumentRequest) -> UpsertOutcome:
+    """Create or update the document keyed by doc.external_id, re-embedding only chunks whose text changed.
+
+    Existing chunks are matched to the new chunking by content hash: matches are kept (index and
+    metadata refreshed in place), unmatched new chunks are embedded and inserted, leftovers deleted.
+    """
+    tracer = get_tracer()
+    with timed_span(tracer, "ingestion.upsert_document", lambda: {
+        "document.external_id": doc.external_id,
+    }) as span:
+        result = await session.execute(select(Document).where(Document.external_id == doc.external_id))
+        document = result.scalar_one_or_none()
+        model_tag = get_embedding_provider().model_tag
+        entry_date = parse_entry_date(doc.entry_date)
+        fields = {
+            "content": doc.content,
+            "source": doc.source,
+            "location": doc.location,
+            "country": doc.country,
+            "tags": doc.tags,
+            "entry_date": entry_date,
+        }
+
+        if document is None:
+            document = Document(external_id=doc.external_id, **fields)
+            session.add(document)
+            await session.flush()
+            existing: list[Chunk] = []
+            status = "created"
+        else:
+            if all(getattr(document, name) == value for name, value in fields.items()):
+                # Same text, but chunks from another embedding model still need re-embedding.
+                tags = await session.execute(
+                    select(Chunk.embedding_model).where(Chunk.document_id == document.id).distinct()
+                )
+                if all(tag == model_tag for tag in tags.scalars()):
+                    span.set_attribute("upsert.status", "unchanged")
+                    return UpsertOutcome(document_id=str(document.id), status="unchanged")
+            for name, value in fields.items():
+                setattr(document, name, value)
+            await session.flush()
+            rows = await session.execute(select(Chunk).where(Chunk.document_id == document.id))
+            existing = list(rows.scalars().all())
+            status = "updated"
+        span.set_attribute("document.id", str(document.id))
+
+        with timed_span(tracer, "ingestion.chunking") as chunk_span:
+            chunks = chunk_text(document.content)
+            chunk_span.set_attribute("chunking.input_length", len(document.content))
+            chunk_span.set_attribute("chunking.chunk_count", len(chunks))
+
+        # Chunks embedded by a different model can't be kept: they are dropped and re-embedded.
+        by_hash: dict[str, list[Chunk]] = defaultdict(list)
+        for row in existing:
+            if row.embedding_model == model_tag:
+                by_hash[row.content_hash or content_hash(row.content)].append(row)
+        stale_ids = [row.id for row in existing if row.embedding_model != model_tag]
+
+        metadata = chunk_metadata(document)
+        outcome = UpsertOutcome(document_id=str(document.id), status=status)
+        new_chunks: list[tuple[int, str, str]] = []
+        for i, text in enumerate(chunks):
+            digest = content_hash(text)
+            if by_hash.get(digest):
+                row = by_hash[digest].pop()
+                row.content_hash = digest
+                if row.chunk_index != i or row.metadata_ != metadata:
+                    row.chunk_index = i
+                    row.metadata_ = metadata
+                    outcome.sparse_upserted.append(_sparse_entry(row))
+                outcome.chunks_unchanged += 1
+            else:
+                new_chunks.append((i, text, digest))
+
+        stale_ids += [row.id for rows in by_hash.values() for row in rows]
+        if stale_ids:
+            await session.execute(delete(Chunk).where(Chunk.id.in_(stale_ids)))
+            outcome.chunks_removed = len(stale_ids)
+            outcome.sparse_removed = [str(cid) for cid in stale_ids]
+
+        embeddings = await embed_chunks([text for _, text, _ in new_chunks])
+
+        with timed_span(tracer, "ingestion.persist_chunks") as persist_span:
+            added = [
+                Chunk(
+                    document_id=document.id,
+                    content=text,
+                    chunk_index=i,
+                    content_hash=digest,
+                    embedding=embeddings[n] if n < len(embeddings) else None,
+                    embedding_model=model_tag,
+                    metadata_=metadata,
+                )
+                for n, (i, text, digest) in enumerate(new_chunks)
+            ]
+            session.add_all(added)
+            await session.flush()
+            persist_span.set_attribute("persist.chunk_count", len(added))
+        outcome.chunks_added = len(added)
+        outcome.sparse_upserted.extend(_sparse_entry(row) for row in added)
+
+        span.set_attribute("upsert.status", status)
+        span.set_attribute("upsert.chunks_added", outcome.chunks_added)
+        span.set_attribute("upsert.chunks_removed", outcome.chunks_removed)
+        span.set_attribute("upsert.chunks_unchanged", outcome.chunks_unchanged)
+        return outcome
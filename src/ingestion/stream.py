@@ -0,0 +1,187 @@
+"""Streaming NDJSON ingest: a bounded chunk → embed → persist pipeline.
+
+Each stage reads from its own bounded asyncio.Queue and runs its own pool of workers,
+so a slow stage stalls the ones upstream of it instead of buffering the whole upload.
+When the first queue is full the reader stops pulling the request body, which pushes
+backpressure all the way to the client's socket. Memory stays proportional to
+queue size x document size, not to the size of the upload.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import AsyncIterable, AsyncIterator, Awaitable, Callable
+from dataclasses import dataclass, field
+
+from pydantic import ValidationError
+
+from src.config import settings
+from src.database import async_session_factory
+from src.ingestion.chunker import chunk_text
+from src.ingestion.embedder import embed_chunks, get_embedding_provider
+from src.ingestion.pipeline import chunk_metadata, content_hash, parse_entry_date
+from src.models import Chunk, Document
+from src.schemas import IngestDocumentRequest, IngestDocumentResult
+from src.tracing import get_tracer, timed_span
+
+logger = logging.getLogger(__name__)
+
+# End-of-stream marker passed down the queues once the upstream stage has drained.
+_DONE = object()
+
+
+@dataclass
+class _Job:
+    line: int
+    request: IngestDocumentRequest | None = None
+    chunks: list[str] = field(default_factory=list)
+    embeddings: list[list[float]] = field(default_factory=list)
+    document_id: str | None = None
+    error: str | None = None
+
+
+async def _iter_lines(body: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Split an async byte stream into lines without holding more than one partial line."""
+    buffer = bytearray()
+    async for part in body:
+        buffer.extend(part)
+        start = 0
+        while (end := buffer.find(b"\n", start)) != -1:
+            yield bytes(buffer[start:end])
+            start = end + 1
+        del buffer[:start]
+    if buffer:
+        yield bytes(buffer)
+
+
+async def _read(body: AsyncIterable[bytes], outbox: asyncio.Queue) -> None:
+    """Parse NDJSON lines into jobs. Invalid lines become failed jobs so they are still reported."""
+    line_no = 0
+    try:
+        async for raw in _iter_lines(body):
+            line_no += 1
+            if not raw.strip():
+                continue
+            try:
+                job = _Job(line=line_no, request=IngestDocumentRequest.model_validate_json(raw))
+            except ValidationError as e:
+                first = e.errors(include_url=False)[0]
+                job = _Job(line=line_no, error=f"invalid document: {first['msg']}")
+            await outbox.put(job)
+    finally:
+        await outbox.put(_DONE)
+
+
+async def _run_stage(
+    inbox: asyncio.Queue,
+    outbox: asyncio.Queue,
+    handler: Callable[[_Job], Awaitable[None]],
+    concurrency: int,
+) -> None:
+    """Run `concurrency` workers applying handler to each job. Failed jobs are passed through untouched."""
+
+    async def worker() -> None:
+        while True:
+            job = await inbox.get()
+            if job is _DONE:
+                await inbox.put(_DONE)  # let sibling workers see it too
+                return
+            if job.error is None:
+                try:
+                    await handler(job)
+                except Exception as e:
+                    logger.exception("Streaming ingest failed on line %d: %s", job.line, e)
+                    job.error = str(e)
+            await outbox.put(job)
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    finally:
+        await outbox.put(_DONE)
+
+
+async def _chunk(job: _Job) -> None:
+    tracer = get_tracer()
+    with timed_span(tracer, "ingestion.chunking") as span:
+        job.chunks = await asyncio.to_thread(chunk_text, job.request.content)
+        span.set_attribute("chunking.input_length", len(job.request.content))
+        span.set_attribute("chunking.chunk_count", len(job.chunks))
+
+
+async def _embed(job: _Job) -> None:
+    if job.chunks:
+        job.embeddings = await embed_chunks(job.chunks)
+
+
+async def _persist(job: _Job) -> None:
+    """Write the document and its chunks in their own transaction so each line commits independently."""
+    doc = job.request
+    tracer = get_tracer()
+    with timed_span(tracer, "ingestion.persist_chunks") as span:
+        async with async_session_factory() as session:
+            document = Document(
+                content=doc.content,
+                source=doc.source,
+                location=doc.location,
+                country=doc.country,
+                tags=doc.tags,
+                entry_date=parse_entry_date(doc.entry_date),
+            )
+            session.add(document)
+            await session.flush()
+            metadata = chunk_metadata(document)
+            model_tag = get_embedding_provider().model_tag
+            for i, content in enumerate(job.chunks):
+                session.add(
+                    Chunk(
+                        document_id=document.id,
+                        content=content,
+                        chunk_index=i,
+                        content_hash=content_hash(content),
+                        embedding=job.embeddings[i] if i < len(job.embeddings) else None,
+                        embedding_model=model_tag,
+                        metadata_=metadata,
+                    )
+                )
+            await session.commit()
+        job.document_id = str(document.id)
+        span.set_attribute("document.id", job.document_id)
+        span.set_attribute("persist.chunk_count", len(job.chunks))
+
+
+def _result(job: _Job) -> IngestDocumentResult:
+    if job.error is not None:
+        return IngestDocumentResult(line=job.line, status="failed", error=job.error)
+    return IngestDocumentResult(
+        line=job.line,
+        status="completed",
+        document_id=job.document_id,
+        chunk_count=len(job.chunks),
+    )
+
+
+async def ingest_ndjson_stream(body: AsyncIterable[bytes]) -> AsyncIterator[IngestDocumentResult]:
+    """Ingest NDJSON documents as they arrive; yield one result per input line, in completion order."""
+    size = settings.ingest_stream_queue_size
+    to_chunk: asyncio.Queue = asyncio.Queue(size)
+    to_embed: asyncio.Queue = asyncio.Queue(size)
+    to_persist: asyncio.Queue = asyncio.Queue(size)
+    done: asyncio.Queue = asyncio.Queue(size)
+    tasks = [
+        asyncio.create_task(_read(body, to_chunk)),
+        asyncio.create_task(_run_stage(to_chunk, to_embed, _chunk, settings.ingest_stream_chunk_workers)),
+        asyncio.create_task(_run_stage(to_embed, to_persist, _embed, settings.ingest_stream_embed_workers)),
+        asyncio.create_task(_run_stage(to_persist, done, _persist, settings.ingest_stream_persist_workers)),
+    ]
+    try:
+        while True:
+            job = await done.get()
+            if job is _DONE:
+                break
+            yield _result(job)
+        # Surface reader errors (e.g. client disconnect) once the pipeline has drained.
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
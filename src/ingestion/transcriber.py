@@ -1,27 +1,65 @@
 """Transcribe handwritten journal images via AWS Textract + Claude vision."""
 import asyncio
-import base64
 import json
 import logging
 import re
+import time
 
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ConnectTimeoutError, ReadTimeoutError
 
+from src.config import settings
 from src.generation.generator import _get_client
+from src.ingestion.images import PreparedImage, prepare_images
+from src.ingestion.transcription_cache import cache_key, transcription_cache
 from src.tracing import get_tracer, set_llm_attributes, timed_span
 
 logger = logging.getLogger(__name__)
 
-_textract_client = boto3.client("textract", region_name="us-east-1")
+# Timeouts live on the client: a worker thread can't be cancelled, so the call has to end itself.
+_textract_client = boto3.client(
+    "textract",
+    region_name="us-east-1",
+    config=Config(
+        connect_timeout=settings.textract_timeout_seconds,
+        read_timeout=settings.textract_timeout_seconds,
+        retries={"total_max_attempts": max(1, settings.textract_max_attempts), "mode": "standard"},
+    ),
+)
 
 TRANSCRIPTION_MODEL = "claude-haiku-4-5-20251001"
 MAX_TOKENS = 8192
+# Bump whenever SYSTEM_PROMPT, TRANSCRIPTION_INSTRUCTIONS or the user prompt changes, so cached transcriptions are not reused.
+PROMPT_VERSION = 3
 
 SYSTEM_PROMPT = (
     "You are a handwriting transcription and metadata extraction assistant. "
     "Respond with a JSON array only: one object per journal entry, each with transcription and metadata."
 )
 
+# Task instructions are identical for every page group, so they sit in the system prompt; only
+# page numbers, OCR text and images vary per call. No prompt-cache breakpoint: this prefix is
+# well under Haiku 4.5's minimum cacheable length, and everything after it differs per group.
+TRANSCRIPTION_INSTRUCTIONS = """You are reading handwritten journal pages. The handwriting is often quick, mixed cursive and print, with abbreviations, possible smudges, angles, or crossed-out parts.
+
+Each request gives you the page range, raw OCR text from Amazon Textract for those pages, and the page images.
+
+Tasks:
+1. Look for date headers or clear entry boundaries (new dates, horizontal lines, "Dear diary", blank lines between sections, etc.). If a page contains MULTIPLE dated or distinct entries, split them into separate items. A page with a single entry yields one item; multiple entries yield multiple items.
+2. For each entry, use BOTH the images and the OCR text to produce an accurate transcription. Fix OCR errors by looking at letter shapes, fix spelling/context (e.g., "pho" not "rho", place names, currency amounts).
+3. For each entry, extract metadata: date of entry, location (the city/place where the author physically was when writing — NOT places mentioned for comparison), country, and relevant tags from: food, coffee, coworking, accommodation, transport, nightlife, culture, nature, fitness, shopping
+4. Set "continues_from_previous_page" to true on the first entry if the first page starts in the middle of an entry (no date header, mid-sentence). Set "continues_on_next_page" to true on the last entry if the last page ends mid-entry. Otherwise false.
+
+Respond with a JSON array only, no other text. One object per entry. A single entry is an array of length 1.
+[{"transcription": "...", "metadata": {"date": null, "location": null, "country": null, "tags": []}, "continues_from_previous_page": false, "continues_on_next_page": false}, ...]
+Use null for any metadata field you cannot confidently determine."""
+
+SYSTEM_BLOCKS = [
+    {"type": "text", "text": SYSTEM_PROMPT},
+    {"type": "text", "text": TRANSCRIPTION_INSTRUCTIONS},
+]
+
 FALLBACK_ENTRY = {
     "transcription": "",
     "metadata": {"date": None, "location": None, "country": None, "tags": []},
@@ -38,112 +76,295 @@ def _extract_text_textract(image_bytes: bytes) -> str:
     return "\n".join(lines)
 
 
-async def transcribe_journal_images(images: list[dict]) -> list[dict]:
-    """Run Textract on each image, then Claude vision; return a list of entries, each with transcription and metadata."""
-    if not images:
+async def _extract_page(index: int, image_bytes: bytes, semaphore: asyncio.Semaphore) -> str:
+    """OCR one page in a worker thread. Timeouts and Textract errors yield "" so one bad page can't fail the upload.
+
+    The semaphore is held until the thread returns, so textract_concurrency bounds real calls.
+    """
+    tracer = get_tracer()
+    queued = time.perf_counter()
+    async with semaphore:
+        with timed_span(tracer, "transcription.textract_page", lambda: {
+            "transcription.page": index,
+            "transcription.image_bytes": len(image_bytes),
+            "transcription.queue_wait_ms": round((time.perf_counter() - queued) * 1000, 2),
+        }) as span:
+            try:
+                text = await asyncio.to_thread(_extract_text_textract, image_bytes)
+            except (ConnectTimeoutError, ReadTimeoutError):
+                logger.warning("Textract timed out on page %d after %.1fs, continuing without its OCR", index, settings.textract_timeout_seconds)
+                span.set_attribute("error", True)
+                span.set_attribute("transcription.timed_out", True)
+                return ""
+            except Exception as e:
+                logger.warning("Textract failed on page %d, continuing without its OCR: %s", index, e)
+                span.set_attribute("error", True)
+                span.set_attribute("error.message", str(e))
+                return ""
+            span.set_attribute("transcription.ocr_chars", len(text))
+            return text
+
+
+async def _extract_text_pages(pages: list[bytes]) -> list[str]:
+    """Run Textract on all pages concurrently (bounded by textract_concurrency); results are in page order."""
+    if not pages:
         return []
+    tracer = get_tracer()
+    with timed_span(tracer, "transcription.textract", lambda: {
+        "transcription.page_count": len(pages),
+        "transcription.concurrency": settings.textract_concurrency,
+    }) as span:
+        semaphore = asyncio.Semaphore(max(1, settings.textract_concurrency))
+        texts = await asyncio.gather(*(_extract_page(i, page, semaphore) for i, page in enumerate(pages)))
+        span.set_attribute("transcription.pages_with_text", sum(1 for t in texts if t.strip()))
+        return list(texts)
+
+
+def _parse_entries(raw: str) -> tuple[list[dict], bool]:
+    """Parse Claude's JSON array of entries. Second value is False when any part needed a fallback.
+
+    Page-boundary flags are kept (as continues_previous / continues_next) for _join_groups.
+    """
+    if not raw:
+        return [], False
+
+    text = raw.strip()
+    if text.startswith("```"):
+        text = re.sub(r"^```(?:json)?\s*", "", text)
+        text = re.sub(r"\s*```\s*$", "", text)
+
+    try:
+        out = json.loads(text)
+    except json.JSONDecodeError:
+        logger.warning("Transcription response was not valid JSON, using raw text as single entry")
+        return [{"transcription": raw, "metadata": FALLBACK_ENTRY["metadata"]}], False
+
+    if isinstance(out, dict):
+        out = [out]
+    if not isinstance(out, list):
+        return [FALLBACK_ENTRY], False
+    entries = []
+    complete = bool(out)
+    for item in out:
+        if isinstance(item, dict) and "transcription" in item and "metadata" in item:
+            entries.append(
+                {
+                    "transcription": item["transcription"],
+                    "metadata": item["metadata"],
+                    "continues_previous": bool(item.get("continues_from_previous_page")),
+                    "continues_next": bool(item.get("continues_on_next_page")),
+                }
+            )
+        else:
+            entries.append({**FALLBACK_ENTRY})
+            complete = False
+    return (entries, complete) if entries else ([FALLBACK_ENTRY], False)
+
+
+def _starts_mid_sentence(text: str) -> bool:
+    stripped = (text or "").lstrip()
+    return bool(stripped) and stripped[0].islower()
+
+
+def _merge_entry(head: dict, tail: dict) -> dict:
+    """Join an entry cut by a group boundary: concatenate text, fill metadata gaps from the tail."""
+    left = (head.get("transcription") or "").rstrip()
+    right = (tail.get("transcription") or "").lstrip()
+    joined = left[:-1] + right if left.endswith("-") else f"{left} {right}".strip()
+    head_meta = head.get("metadata") or {}
+    tail_meta = tail.get("metadata") or {}
+    metadata = {**tail_meta, **{k: v for k, v in head_meta.items() if v is not None}}
+    metadata["tags"] = list(dict.fromkeys((head_meta.get("tags") or []) + (tail_meta.get("tags") or [])))
+    return {**head, "transcription": joined, "metadata": metadata, "continues_next": tail.get("continues_next", False)}
+
 
-    # Step 1: Textract per image (async thread), combine text
-    textract_parts: list[str] = []
-    for img in images:
-        try:
-            image_bytes = base64.b64decode(img["data"])
-        except Exception as e:
-            logger.warning("Failed to base64-decode image for Textract: %s", e)
+def _join_groups(groups: list[list[dict]]) -> list[dict]:
+    """Concatenate per-group entries in page order, joining entries that span a group boundary.
+
+    A boundary is joined when Claude flagged it on either side, or when the next group opens
+    undated and mid-sentence.
+    """
+    merged: list[dict] = []
+    for g, entries in enumerate(groups):
+        if not entries:
             continue
-        try:
-            text = await asyncio.to_thread(_extract_text_textract, image_bytes)
-            if text.strip():
-                textract_parts.append(text)
-        except Exception as e:
-            logger.warning("Textract failed on image, continuing without its OCR: %s", e)
+        first = entries[0]
+        if g > 0 and merged:
+            prev = merged[-1]
+            first_meta = first.get("metadata") or {}
+            spans_boundary = (
+                prev.get("continues_next")
+                or first.get("continues_previous")
+                or (first_meta.get("date") is None and _starts_mid_sentence(first.get("transcription", "")))
+            )
+            if spans_boundary:
+                merged[-1] = _merge_entry(prev, first)
+                entries = entries[1:]
+        merged.extend(entries)
+    return [{"transcription": e["transcription"], "metadata": e["metadata"]} for e in merged]
 
-    textract_text = "\n\n".join(textract_parts) if textract_parts else ""
 
-    # Step 2 & 3: Build content: text block + all image blocks, call Claude
-    user_text = f"""You are reading handwritten journal pages. The handwriting is often quick, mixed cursive and print, with abbreviations, possible smudges, angles, or crossed-out parts.
+def _group_prompt(textract_text: str, first_page: int, last_page: int, total_pages: int) -> str:
+    """Per-call part of the prompt; the task instructions live in the cached system prompt."""
+    return f"""These are pages {first_page}-{last_page} of a {total_pages}-page upload.
 
 Here is raw OCR text from Amazon Textract (may be noisy due to handwriting):
 {textract_text}
 
-You can also SEE the actual images of the pages.
+You can also SEE the actual images of the pages."""
 
-Tasks:
-1. Look for date headers or clear entry boundaries (new dates, horizontal lines, "Dear diary", blank lines between sections, etc.). If a page contains MULTIPLE dated or distinct entries, split them into separate items. A page with a single entry yields one item; multiple entries yield multiple items.
-2. For each entry, use BOTH the images and the OCR text to produce an accurate transcription. Fix OCR errors by looking at letter shapes, fix spelling/context (e.g., "pho" not "rho", place names, currency amounts).
-3. For each entry, extract metadata: date of entry, location (the city/place where the author physically was when writing — NOT places mentioned for comparison), country, and relevant tags from: food, coffee, coworking, accommodation, transport, nightlife, culture, nature, fitness, shopping
 
-Respond with a JSON array only, no other text. One object per entry. A single entry is an array of length 1.
-[{{"transcription": "...", "metadata": {{"date": null, "location": null, "country": null, "tags": []}}}}, ...]
-Use null for any metadata field you cannot confidently determine."""
+async def _transcribe_group(
+    pages: list[PreparedImage],
+    ocr_texts: list[str],
+    first_page: int,
+    total_pages: int,
+    ocr_cache_hits: int,
+    semaphore: asyncio.Semaphore,
+) -> tuple[list[dict], bool]:
+    """One Claude vision call for a group of consecutive pages."""
+    textract_parts = [text for text in ocr_texts if text.strip()]
+    textract_text = "\n\n".join(textract_parts) if textract_parts else ""
+    user_text = _group_prompt(textract_text, first_page, first_page + len(pages) - 1, total_pages)
 
     content: list[dict] = [{"type": "text", "text": user_text}]
-    for img in images:
+    for page in pages:
         content.append(
             {
                 "type": "image",
                 "source": {
                     "type": "base64",
-                    "media_type": img.get("media_type", "image/jpeg"),
-                    "data": img["data"],
+                    "media_type": page.media_type,
+                    "data": page.vision_data,
                 },
             }
         )
 
     client = _get_client()
     tracer = get_tracer()
-    with timed_span(tracer, "transcription.claude_vision", {
-        "transcription.image_count": len(images),
-        "transcription.textract_chars": len(textract_text),
-    }) as span:
-        try:
-            response = await client.messages.create(
+    async with semaphore:
+        with timed_span(tracer, "transcription.claude_vision", lambda: {
+            "transcription.image_count": len(pages),
+            "transcription.first_page": first_page,
+            "transcription.textract_chars": len(textract_text),
+            "transcription.ocr_cache_hits": ocr_cache_hits,
+            "transcription.ocr_cache_misses": len(pages) - ocr_cache_hits,
+        }) as span:
+            try:
+                response = await client.messages.create(
+                    model=TRANSCRIPTION_MODEL,
+                    max_tokens=MAX_TOKENS,
+                    system=SYSTEM_BLOCKS,
+                    messages=[{"role": "user", "content": content}],
+                )
+            except Exception as e:
+                span.set_attribute("error", True)
+                span.set_attribute("error.message", str(e))
+                logger.exception("Claude vision transcription failed: %s", e)
+                raise
+
+            # Record LLM attributes
+            usage = response.usage
+            cache_read = (getattr(usage, "cache_read_input_tokens", None) or 0) if usage else 0
+            cache_creation = (getattr(usage, "cache_creation_input_tokens", None) or 0) if usage else 0
+            set_llm_attributes(
+                span,
                 model=TRANSCRIPTION_MODEL,
+                input_tokens=usage.input_tokens if usage else None,
+                output_tokens=usage.output_tokens if usage else None,
+                total_tokens=(usage.input_tokens + cache_read + cache_creation + usage.output_tokens) if usage else None,
                 max_tokens=MAX_TOKENS,
-                system=SYSTEM_PROMPT,
-                messages=[{"role": "user", "content": content}],
+                cache_read_input_tokens=cache_read if usage else None,
+                cache_creation_input_tokens=cache_creation if usage else None,
             )
-        except Exception as e:
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", str(e))
-            logger.exception("Claude vision transcription failed: %s", e)
-            raise
-
-        # Record LLM attributes
-        usage = response.usage
-        set_llm_attributes(
-            span,
-            model=TRANSCRIPTION_MODEL,
-            input_tokens=usage.input_tokens if usage else None,
-            output_tokens=usage.output_tokens if usage else None,
-            total_tokens=(usage.input_tokens + usage.output_tokens) if usage else None,
-            max_tokens=MAX_TOKENS,
-        )
+            span.set_attribute("transcription.truncated", response.stop_reason == "max_tokens")
 
-    # Step 4: Parse response — strip markdown fences, then expect a list of {transcription, metadata}
+    # Parse response — strip markdown fences, then expect a list of {transcription, metadata}
     raw = response.content[0].text if response.content else ""
-    if not raw:
+    return _parse_entries(raw)
+
+
+async def transcribe_journal_images(images: list[dict]) -> list[dict]:
+    """Run Textract on each image, then Claude vision; return a list of entries, each with transcription and metadata.
+
+    Pages are split into groups of transcription_group_size, each transcribed by its own
+    concurrent Claude call, and the entries are merged back in page order. Results are cached
+    per group by image content, so retrying an upload skips both providers.
+    """
+    if not images:
         return []
+    tracer = get_tracer()
+    with timed_span(tracer, "transcription.journal", lambda: {
+        "transcription.image_count": len(images),
+    }) as span:
+        return await _transcribe(images, span)
 
-    text = raw.strip()
-    if text.startswith("```"):
-        text = re.sub(r"^```(?:json)?\s*", "", text)
-        text = re.sub(r"\s*```\s*$", "", text)
 
-    try:
-        out = json.loads(text)
-    except json.JSONDecodeError:
-        logger.warning("Transcription response was not valid JSON, using raw text as single entry")
-        return [{"transcription": raw, "metadata": FALLBACK_ENTRY["metadata"]}]
-
-    if isinstance(out, list):
-        entries = []
-        for item in out:
-            if isinstance(item, dict) and "transcription" in item and "metadata" in item:
-                entries.append({"transcription": item["transcription"], "metadata": item["metadata"]})
-            else:
-                entries.append({**FALLBACK_ENTRY})
-        return entries if entries else [FALLBACK_ENTRY]
-    if isinstance(out, dict) and "transcription" in out and "metadata" in out:
-        return [out]
-    return [FALLBACK_ENTRY]
+async def _transcribe(images: list[dict], span) -> list[dict]:
+    # Step 1: decode, orient and downscale each page once; Textract and Claude both use the result,
+    # and the digest of the decoded bytes keys the cache
+    pages = await prepare_images(images)
+    if len(pages) != len(images):
+        logger.warning("Image normalization dropped pages, transcribing without them")
+    if not pages:
+        return []
+    size = max(1, settings.transcription_group_size)
+    groups = [list(range(start, min(start + size, len(pages)))) for start in range(0, len(pages), size)]
+    group_keys = [
+        cache_key(
+            "entries",
+            TRANSCRIPTION_MODEL,
+            PROMPT_VERSION,
+            settings.image_vision_max_edge,
+            settings.image_jpeg_quality,
+            *(pages[i].digest for i in group),
+        )
+        for group in groups
+    ]
+    cached_groups = await transcription_cache.get_many("entries", group_keys)
+    pending = [g for g, key in enumerate(group_keys) if key not in cached_groups]
+    span.set_attribute("transcription.group_cache_hits", len(groups) - len(pending))
+    span.set_attribute("transcription.group_cache_misses", len(pending))
+    results: dict[int, list[dict]] = {g: cached_groups[group_keys[g]] for g in range(len(groups)) if g not in pending}
+
+    if pending:
+        needed = [i for g in pending for i in groups[g]]
+
+        # Step 2: Textract per page, fanned out under a concurrency limit; pages OCR'd before are reused
+        ocr_keys = {
+            i: cache_key("ocr", pages[i].digest, settings.image_ocr_max_edge, settings.image_jpeg_quality)
+            for i in needed
+        }
+        cached_ocr = await transcription_cache.get_many("ocr", list(ocr_keys.values()))
+        missing = [i for i in needed if ocr_keys[i] not in cached_ocr]
+        fresh = await _extract_text_pages([pages[i].ocr_bytes for i in missing])
+        page_texts = {i: cached_ocr[key]["text"] for i, key in ocr_keys.items() if key in cached_ocr}
+        page_texts.update(zip(missing, fresh))
+        # Empty OCR may be a timeout or transient Textract error, so only non-empty pages are cached.
+        await transcription_cache.put_many(
+            "ocr", {ocr_keys[i]: {"text": text} for i, text in zip(missing, fresh) if text.strip()}
+        )
+
+        # Step 3: one Claude vision call per page group, run concurrently
+        semaphore = asyncio.Semaphore(max(1, settings.transcription_concurrency))
+        calls = [
+            _transcribe_group(
+                [pages[i] for i in groups[g]],
+                [page_texts.get(i, "") for i in groups[g]],
+                first_page=groups[g][0] + 1,
+                total_pages=len(pages),
+                ocr_cache_hits=sum(1 for i in groups[g] if ocr_keys[i] in cached_ocr),
+                semaphore=semaphore,
+            )
+            for g in pending
+        ]
+        outcomes = await asyncio.gather(*calls)
+        # Only cache clean parses, so a retry after a malformed response gets a fresh attempt.
+        await transcription_cache.put_many(
+            "entries",
+            {group_keys[g]: entries for g, (entries, complete) in zip(pending, outcomes) if complete},
+        )
+        results.update((g, entries) for g, (entries, _) in zip(pending, outcomes))
+
+    # Step 4: merge entries in page order, joining entries split across a group boundary
+    return _join_groups([results[g] for g in range(len(groups))])
@@ -0,0 +1,107 @@
+"""Persistent cache for journal transcription results.
+
+Users retry failed uploads with the same photos, which would otherwise repeat the Textract
+and Claude vision calls. Results are stored in PostgreSQL keyed by a hash of the decoded
+image bytes plus everything else that affects the output (model, prompt version, image
+normalization settings). Lookups and writes never fail a transcription: on a database
+error the cache behaves as a miss.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.dialects.postgresql import insert
+
+from src.config import settings
+from src.database import async_session_factory
+from src.metrics import record_cache
+from src.models import TranscriptionCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(kind: str, *parts: object) -> str:
+    """Combine a result kind and its inputs into a fixed-length key."""
+    return hashlib.sha256("\x1f".join([kind, *map(str, parts)]).encode("utf-8")).hexdigest()
+
+
+class TranscriptionCache:
+    """Read-through store over the transcription_cache table."""
+
+    async def get_many(self, kind: str, keys: list[str]) -> dict[str, dict | list]:
+        """Return payloads for the keys that are cached and within the TTL (kind labels the cache metric)."""
+        if not settings.transcription_cache_enabled or not keys:
+            return {}
+        cutoff = datetime.now(timezone.utc) - timedelta(days=settings.transcription_cache_ttl_days)
+        try:
+            async with async_session_factory() as session:
+                result = await session.execute(
+                    select(TranscriptionCacheEntry.key, TranscriptionCacheEntry.payload).where(
+                        TranscriptionCacheEntry.key.in_(keys),
+                        TranscriptionCacheEntry.created_at >= cutoff,
+                    )
+                )
+                found = {row.key: row.payload for row in result}
+            record_cache(f"transcription_{kind}", len(found), len(keys) - len(found))
+            return found
+        except Exception as e:
+            logger.warning("Transcription cache lookup failed, treating as miss: %s", e)
+            return {}
+
+    async def get(self, kind: str, key: str) -> dict | list | None:
+        return (await self.get_many(kind, [key])).get(key)
+
+    async def put_many(self, kind: str, items: dict[str, dict | list]) -> None:
+        """Store payloads by key, replacing existing entries, then evict past the TTL / size cap."""
+        if not settings.transcription_cache_enabled or not items:
+            return
+        rows = [
+            {"key": key, "kind": kind, "payload": payload, "size_bytes": len(json.dumps(payload))}
+            for key, payload in items.items()
+        ]
+        stmt = insert(TranscriptionCacheEntry).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[TranscriptionCacheEntry.key],
+            set_={
+                "payload": stmt.excluded.payload,
+                "size_bytes": stmt.excluded.size_bytes,
+                "created_at": text("now()"),
+            },
+        )
+        try:
+            async with async_session_factory() as session:
+                await session.execute(stmt)
+                await self._evict(session)
+                await session.commit()
+        except Exception as e:
+            logger.warning("Transcription cache write failed: %s", e)
+
+    async def put(self, kind: str, key: str, payload: dict | list) -> None:
+        await self.put_many(kind, {key: payload})
+
+    async def _evict(self, session) -> None:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=settings.transcription_cache_ttl_days)
+        await session.execute(delete(TranscriptionCacheEntry).where(TranscriptionCacheEntry.created_at < cutoff))
+        # Keep the newest entries whose cumulative size fits under the cap.
+        await session.execute(
+            text(
+                """
+                DELETE FROM transcription_cache WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key, SUM(size_bytes) OVER (ORDER BY created_at DESC, key) AS running
+                        FROM transcription_cache
+                    ) ranked
+                    WHERE running > :max_bytes
+                )
+                """
+            ),
+            {"max_bytes": settings.transcription_cache_max_mb * 1024 * 1024},
+        )
+
+
+transcription_cache = TranscriptionCache()
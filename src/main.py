@@ -1,29 +1,57 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import logging
 import uuid
 from contextlib import asynccontextmanager
-from datetime import date
 from pathlib import Path
 
-from dateutil import parser as dateutil_parser
-from fastapi import Depends, FastAPI, HTTPException
-from fastapi.responses import FileResponse
+import anthropic
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from pydantic import BaseModel
+from sqlalchemy.exc import InterfaceError, OperationalError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database import get_db, init_db
-from src.generation.generator import generate_answer
-from src.ingestion.pipeline import process_document
+from src.config import settings
+from src.database import async_session_factory, get_db, init_db
+from src.deadline import Deadline
+from src.generation.answer_cache import AnswerCacheEntry, answer_cache
+from src.generation.generator import MAX_TOKENS, budget_max_tokens, generate_answer, listing_answer, stream_answer
+from src.ingestion.embedder import embed_chunks
+from src.ingestion.images import shutdown_image_pool
+from src.ingestion.pipeline import chunk_metadata, parse_entry_date, process_document, upsert_document
+from src.ingestion.stream import ingest_ndjson_stream
 from src.ingestion.transcriber import transcribe_journal_images
+from src.metrics import MetricsMiddleware, render as render_metrics
+from src.profiling import ProfilingMiddleware, request_trace_id
 import src.models  # noqa: F401 — register models with Base.metadata for init_db
 from src.models import Document
-from src.schemas import Citation, IngestRequest, IngestResponse, JournalIngestRequest, QueryRequest, QueryResponse
-from src.retrieval.dense import dense_search
+from src.schemas import (
+    BatchQueryError,
+    BatchQueryRequest,
+    BatchQueryResponse,
+    Citation,
+    IngestRequest,
+    IngestResponse,
+    JournalIngestRequest,
+    QueryRequest,
+    QueryResponse,
+    QueryRetrievalEvent,
+    RetrievedChunk,
+    SearchRequest,
+    SearchResponse,
+    SearchResult,
+    UpsertDocumentResult,
+    UpsertRequest,
+    UpsertResponse,
+)
+from src.retrieval.pipeline import RetrievalResult, embed_query, rank, rerank_candidates, retrieve, search
+from src.retrieval.router import HYBRID, Route, route_query
 from src.retrieval.sparse import bm25_index
-from src.retrieval.fusion import fuse_results
-from src.retrieval.reranker import rerank
-from src.tracing import get_tracer, init_tracing, timed_span
+from src.tracing import ServerTimingMiddleware, get_tracer, init_tracing, timed_span, tracing_stats
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +64,7 @@ async def lifespan(app: FastAPI):
     await bm25_index.build_index()
     logger.info("BM25 index built.")
     yield
+    shutdown_image_pool()
 
 
 FRONTEND_DIR = Path(__file__).resolve().parent.parent / "frontend"
@@ -46,6 +75,9 @@ app = FastAPI(
     version="0.1.0",
     lifespan=lifespan,
 )
+app.add_middleware(ServerTimingMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ProfilingMiddleware)
 
 # Serve frontend static assets on /static, and index.html on /
 app.mount("/static", StaticFiles(directory=str(FRONTEND_DIR)), name="static")
@@ -58,25 +90,25 @@ async def root():
 
 @app.get("/health")
 async def health():
-    return {"status": "ok", "version": "0.1.0"}
+    return {"status": "ok", "version": "0.1.0", "tracing": tracing_stats()}
 
 
-def _parse_entry_date(value: str | None) -> date | None:
-    if not value or not value.strip():
-        return None
-    try:
-        return dateutil_parser.parse(value.strip()).date()
-    except (ValueError, TypeError):
-        return None
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
 
 
 @app.post("/api/v1/ingest", response_model=IngestResponse)
 async def ingest(body: IngestRequest, db: AsyncSession = Depends(get_db)):
     tracer = get_tracer()
-    with timed_span(tracer, "api.ingest", {
+    with timed_span(tracer, "api.ingest", lambda: {
         "ingest.document_count": len(body.documents),
     }) as span:
         total_chunks = 0
+        rows: list[Document] = []
         for doc in body.documents:
             row = Document(
                 content=doc.content,
@@ -84,10 +116,14 @@ async def ingest(body: IngestRequest, db: AsyncSession = Depends(get_db)):
                 location=doc.location,
                 country=doc.country,
                 tags=doc.tags,
-                entry_date=_parse_entry_date(doc.entry_date),
+                entry_date=parse_entry_date(doc.entry_date),
             )
             db.add(row)
             total_chunks += await process_document(db, row)
+            rows.append(row)
+        # Commit first so a query racing the invalidation can't re-cache an answer without the new documents.
+        await db.commit()
+        answer_cache.invalidate(metadata=[chunk_metadata(row) for row in rows])
         span.set_attribute("ingest.total_chunks", total_chunks)
         return IngestResponse(
             job_id=str(uuid.uuid4()),
@@ -97,10 +133,115 @@ async def ingest(body: IngestRequest, db: AsyncSession = Depends(get_db)):
         )
 
 
+@app.post("/api/v1/ingest/upsert", response_model=UpsertResponse)
+async def ingest_upsert(body: UpsertRequest, db: AsyncSession = Depends(get_db)):
+    """Create or update documents by external_id; only chunks whose text changed are re-embedded."""
+    tracer = get_tracer()
+    with timed_span(tracer, "api.ingest_upsert", lambda: {
+        "ingest.document_count": len(body.documents),
+    }) as span:
+        results: list[UpsertDocumentResult] = []
+        sparse_upserted: list[dict] = []
+        sparse_removed: list[str] = []
+        for doc in body.documents:
+            outcome = await upsert_document(db, doc)
+            results.append(
+                UpsertDocumentResult(
+                    external_id=doc.external_id,
+                    document_id=outcome.document_id,
+                    status=outcome.status,
+                    chunks_added=outcome.chunks_added,
+                    chunks_removed=outcome.chunks_removed,
+                    chunks_unchanged=outcome.chunks_unchanged,
+                )
+            )
+            sparse_upserted.extend(outcome.sparse_upserted)
+            sparse_removed.extend(outcome.sparse_removed)
+        # Commit before touching the in-memory index so it never gets ahead of the database.
+        await db.commit()
+        await bm25_index.apply_delta(upserted=sparse_upserted, removed_ids=sparse_removed)
+        changed = [(r, doc) for r, doc in zip(results, body.documents) if r.status != "unchanged"]
+        answer_cache.invalidate(
+            document_ids=[r.document_id for r, _ in changed],
+            metadata=[doc.model_dump(include={"location", "country", "tags"}) for _, doc in changed],
+        )
+        span.set_attribute("ingest.chunks_added", sum(r.chunks_added for r in results))
+        span.set_attribute("ingest.chunks_removed", sum(r.chunks_removed for r in results))
+        span.set_attribute("ingest.chunks_unchanged", sum(r.chunks_unchanged for r in results))
+        return UpsertResponse(
+            job_id=str(uuid.uuid4()),
+            status="completed",
+            document_count=len(results),
+            results=results,
+        )
+
+
+@app.post("/api/v1/index/rebuild")
+async def rebuild_index():
+    """Reload the BM25 index from PostgreSQL, e.g. after an offline bulk import."""
+    tracer = get_tracer()
+    with timed_span(tracer, "api.index_rebuild") as span:
+        await bm25_index.build_index()
+        # Bulk imports bypass the API, so there is no way to tell which cached answers they affect.
+        answer_cache.clear()
+        chunk_count = len(bm25_index)
+        span.set_attribute("index.chunk_count", chunk_count)
+        return {"status": "completed", "chunk_count": chunk_count}
+
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse that does not listen for disconnects on `receive`.
+
+    Starlette's StreamingResponse consumes `receive` to watch for disconnects on ASGI < 2.4,
+    which would swallow the request body we are still reading. A disconnect surfaces as
+    ClientDisconnect from request.stream() instead.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+
+
+@app.post("/api/v1/ingest/stream")
+async def ingest_stream(request: Request):
+    """Ingest an NDJSON body (one IngestDocumentRequest per line); streams one NDJSON result per line.
+
+    The last line is an IngestResponse summary. Clients should read the response while uploading.
+    """
+
+    async def results():
+        tracer = get_tracer()
+        with timed_span(tracer, "api.ingest_stream") as span:
+            document_count = 0
+            failed_count = 0
+            total_chunks = 0
+            async for result in ingest_ndjson_stream(request.stream()):
+                if result.status == "completed":
+                    document_count += 1
+                    total_chunks += result.chunk_count
+                else:
+                    failed_count += 1
+                yield result.model_dump_json() + "\n"
+            if document_count:
+                await bm25_index.build_index()
+                answer_cache.clear()
+            span.set_attribute("ingest.document_count", document_count)
+            span.set_attribute("ingest.failed_count", failed_count)
+            span.set_attribute("ingest.total_chunks", total_chunks)
+            summary = IngestResponse(
+                job_id=str(uuid.uuid4()),
+                status="completed" if not failed_count else "completed_with_errors",
+                document_count=document_count,
+                chunk_count=total_chunks,
+            )
+            yield summary.model_dump_json() + "\n"
+
+    return _DuplexStreamingResponse(results(), media_type="application/x-ndjson")
+
+
 @app.post("/api/v1/ingest/journal", response_model=IngestResponse)
 async def ingest_journal(body: JournalIngestRequest, db: AsyncSession = Depends(get_db)):
     tracer = get_tracer()
-    with timed_span(tracer, "api.ingest_journal", {
+    with timed_span(tracer, "api.ingest_journal", lambda: {
         "ingest.image_count": len(body.images),
     }) as span:
         entries = await transcribe_journal_images([{"data": img.data, "media_type": img.media_type} for img in body.images])
@@ -108,7 +249,7 @@ async def ingest_journal(body: JournalIngestRequest, db: AsyncSession = Depends(
             span.set_attribute("error", True)
             raise HTTPException(status_code=422, detail="Could not transcribe any text from the provided images")
         total_chunks = 0
-        document_count = 0
+        rows: list[Document] = []
         for entry in entries:
             transcription = (entry.get("transcription") or "").strip()
             if not transcription:
@@ -118,7 +259,7 @@ async def ingest_journal(body: JournalIngestRequest, db: AsyncSession = Depends(
             location = body.location if body.location is not None else meta.get("location")
             country = body.country if body.country is not None else meta.get("country")
             tags = body.tags if body.tags is not None else meta.get("tags") or []
-            entry_date = _parse_entry_date(body.entry_date) if body.entry_date is not None else _parse_entry_date(meta.get("date"))
+            entry_date = parse_entry_date(body.entry_date) if body.entry_date is not None else parse_entry_date(meta.get("date"))
             row = Document(
                 content=transcription,
                 source=source,
@@ -129,8 +270,12 @@ async def ingest_journal(body: JournalIngestRequest, db: AsyncSession = Depends(
             )
             db.add(row)
             total_chunks += await process_document(db, row)
-            document_count += 1
+            rows.append(row)
+        document_count = len(rows)
+        # The BM25 rebuild reads through its own session, so the new chunks must be committed first.
+        await db.commit()
         await bm25_index.build_index()
+        answer_cache.invalidate(metadata=[chunk_metadata(row) for row in rows])
         span.set_attribute("ingest.document_count", document_count)
         span.set_attribute("ingest.total_chunks", total_chunks)
         return IngestResponse(
@@ -141,75 +286,466 @@ async def ingest_journal(body: JournalIngestRequest, db: AsyncSession = Depends(
         )
 
 
+NO_ANSWER = "I don't have enough information to answer that."
+NO_ANSWER_RESULT = {"answer": NO_ANSWER, "confidence": 0.0, "citations": []}
+
+
+def _citations(result: dict) -> list[Citation]:
+    return [
+        Citation(
+            index=i,
+            chunk_id=c["chunk_id"],
+            source=c["source"],
+            location=c["location"],
+            excerpt=c["excerpt"],
+            chunk_ids=c["chunk_ids"],
+        )
+        for i, c in enumerate(result["citations"], start=1)
+    ]
+
+
+def _record_retrieval(span, retrieval: RetrievalResult) -> None:
+    span.set_attribute("query.type", retrieval.query_type)
+    span.set_attribute("query.plan", retrieval.strategy)
+    span.set_attribute("query.dense_results", retrieval.dense_count)
+    span.set_attribute("query.sparse_results", retrieval.sparse_count)
+    if retrieval.fused:
+        span.set_attribute("query.fused_results", len(retrieval.fused))
+        span.set_attribute("query.rerank_candidates", len(retrieval.candidates))
+        span.set_attribute("query.reranked_results", len(retrieval.reranked))
+        span.set_attribute("query.context_passages", len(retrieval.context))
+    if not retrieval.reranked:
+        span.set_attribute("query.early_exit", "no_reranked" if retrieval.fused else "no_results")
+
+
+def _retrieved_chunks(retrieval: RetrievalResult) -> list[RetrievedChunk]:
+    return [
+        RetrievedChunk(
+            index=i,
+            chunk_id=c["chunk_id"],
+            source=(c.get("metadata") or {}).get("source") or "Unknown",
+            location=(c.get("metadata") or {}).get("location") or "N/A",
+            score=c.get("rerank_score"),
+            chunk_ids=c["chunk_ids"],
+        )
+        for i, c in enumerate(retrieval.context, start=1)
+    ]
+
+
+async def _cached_answer(
+    body: QueryRequest,
+    span,
+    deadline: Deadline,
+    route: Route,
+) -> tuple[AnswerCacheEntry | None, list[float] | None]:
+    """Look the question up in the answer cache. On a miss, also returns the query embedding for retrieval.
+
+    The semantic lookup needs an embedding, so it only runs for plans that embed the question anyway.
+    """
+    entry = answer_cache.get(body.question, body.filters)
+    if entry is not None:
+        span.set_attribute("answer_cache.result", "exact")
+        return entry, None
+    if not settings.answer_cache_enabled or not route.plan.dense:
+        return None, None
+    embedding = await embed_query(body.question, deadline)
+    match = answer_cache.get_similar(embedding, body.filters) if embedding else None
+    if match is not None:
+        entry, similarity = match
+        span.set_attribute("answer_cache.result", "semantic")
+        span.set_attribute("answer_cache.similarity", round(similarity, 4))
+        return entry, embedding
+    span.set_attribute("answer_cache.result", "miss")
+    return None, embedding
+
+
+def _cache_answer(
+    body: QueryRequest,
+    embedding: list[float] | None,
+    response: QueryResponse,
+    retrieval: RetrievalResult,
+    generation: int,
+    deadline: Deadline,
+) -> None:
+    if deadline.degraded:
+        return  # don't pin an answer built from degraded retrieval or a cut-short generation
+    answer_cache.put(
+        body.question,
+        body.filters,
+        embedding=embedding,
+        response=response.model_dump(exclude={"trace_id"}),
+        chunks=[c.model_dump() for c in _retrieved_chunks(retrieval)],
+        document_ids={c["document_id"] for c in retrieval.context},
+        generation=generation,
+    )
+
+
+def _query_response(result: dict, retrieval: RetrievalResult, trace_id: str) -> QueryResponse:
+    return QueryResponse(
+        answer=result["answer"],
+        confidence=result["confidence"],
+        citations=_citations(result),
+        query_type=retrieval.query_type,
+        retrieval_strategy=retrieval.strategy,
+        chunks_retrieved=len(retrieval.fused),
+        chunks_after_rerank=len(retrieval.reranked),
+        trace_id=trace_id,
+    )
+
+
+def _generation_budget(deadline: Deadline) -> int:
+    max_tokens = budget_max_tokens(deadline.remaining())
+    if max_tokens < MAX_TOKENS:
+        deadline.degrade("max_tokens_shortened")
+    return max_tokens
+
+
+async def _generate(question: str, context: list[dict], deadline: Deadline) -> dict:
+    """Generate within what is left of the deadline.
+
+    An overrun returns the answer so far (degraded: generation_timeout) instead of discarding
+    the retrieval work.
+    """
+    result = await generate_answer(
+        question, context, max_tokens=_generation_budget(deadline), timeout=deadline.remaining()
+    )
+    if deadline.expired:
+        deadline.degrade("generation_timeout")
+    return result
+
+
 @app.post("/api/v1/query", response_model=QueryResponse)
 async def query(body: QueryRequest, db: AsyncSession = Depends(get_db)):
     tracer = get_tracer()
-    trace_id = str(uuid.uuid4())
-    with timed_span(tracer, "api.query", {
+    trace_id = request_trace_id()
+    deadline = Deadline.for_query()
+    with timed_span(tracer, "api.query", lambda: {
         "query.question_length": len(body.question),
         "query.has_filters": body.filters is not None,
         "query.trace_id": trace_id,
     }) as span:
-        f = body.filters
-        dense_chunks = await dense_search(
-            db,
-            body.question,
-            location=f.location if f else None,
-            country=f.country if f else None,
-            tags=f.tags if f else None,
+        try:
+            generation = answer_cache.generation
+            route = route_query(body.question, body.filters)
+            cached, query_embedding = await _cached_answer(body, span, deadline, route)
+            if cached is not None:
+                return QueryResponse(**cached.response, trace_id=trace_id)
+            retrieval = await retrieve(
+                db, body.question, body.filters, query_embedding=query_embedding, deadline=deadline, route=route
+            )
+            _record_retrieval(span, retrieval)
+            if not retrieval.reranked:
+                return _query_response(NO_ANSWER_RESULT, retrieval, trace_id)
+            if not retrieval.plan.generate:
+                result = listing_answer(retrieval.context, retrieval.metadata_count)
+            else:
+                result = await _generate(body.question, retrieval.context, deadline)
+            response = _query_response(result, retrieval, trace_id)
+            if response.confidence is not None:
+                span.set_attribute("query.confidence", response.confidence)
+            span.set_attribute("query.citations_count", len(response.citations))
+            span.set_attribute("query.answer_length", len(response.answer))
+            _cache_answer(body, query_embedding, response, retrieval, generation, deadline)
+            return response
+        finally:
+            deadline.record(span)
+
+
+# Errors every question in a batch would hit; one of these aborts the whole batch.
+BATCH_FATAL_ERRORS = (
+    anthropic.AuthenticationError,
+    anthropic.PermissionDeniedError,
+    OperationalError,
+    InterfaceError,
+)
+
+
+@app.post("/api/v1/query/batch", response_model=BatchQueryResponse)
+async def query_batch(body: BatchQueryRequest):
+    """Answer many questions in one request; results come back in input order.
+
+    Questions missing from the answer cache are embedded in one call. Searches then run
+    concurrently, at most Settings.database_pool_size at a time, each on its own session;
+    rerank and generation have their own concurrency caps. Each question gets the usual query
+    deadline (so the same per-stage timeouts), cut short if less of
+    Settings.batch_query_deadline_seconds is left when it starts.
+
+    A failing question gets a BatchQueryError entry and the others carry on. Errors every
+    question would hit (bad credentials, database unreachable) cancel the rest of the batch.
+    """
+    if len(body.queries) > settings.batch_query_max_questions:
+        raise HTTPException(
+            status_code=422, detail=f"At most {settings.batch_query_max_questions} questions per batch"
         )
-        sparse_chunks = bm25_index.search(body.question, top_k=20)
-        span.set_attribute("query.dense_results", len(dense_chunks))
-        span.set_attribute("query.sparse_results", len(sparse_chunks))
-        if not dense_chunks and not sparse_chunks:
-            span.set_attribute("query.early_exit", "no_results")
-            return QueryResponse(
-                answer="I don't have enough information to answer that.",
-                confidence=0.0,
-                citations=[],
-                query_type="factual",
-                retrieval_strategy="hybrid_rrf_rerank",
-                chunks_retrieved=0,
-                chunks_after_rerank=0,
-                trace_id=trace_id,
+    tracer = get_tracer()
+    with timed_span(tracer, "api.query_batch", lambda: {
+        "batch.size": len(body.queries),
+    }) as span:
+        batch_deadline = Deadline(settings.batch_query_deadline_seconds or None)
+        generation = answer_cache.generation
+        routes = [route_query(q.question, q.filters) for q in body.queries]
+        cached: list[AnswerCacheEntry | None] = [answer_cache.get(q.question, q.filters) for q in body.queries]
+        # Only plans with dense search need the embedding, for retrieval and the semantic cache lookup.
+        misses = [i for i, entry in enumerate(cached) if entry is None and routes[i].plan.dense]
+        embeddings = dict(zip(misses, await embed_chunks([body.queries[i].question for i in misses])))
+        for i in misses:
+            match = answer_cache.get_similar(embeddings[i], body.queries[i].filters)
+            if match is not None:
+                cached[i] = match[0]
+        span.set_attribute("batch.cache_hits", sum(entry is not None for entry in cached))
+
+        search_slots = asyncio.Semaphore(max(1, settings.database_pool_size))
+        rerank_slots = asyncio.Semaphore(max(1, settings.batch_query_rerank_concurrency))
+        generation_slots = asyncio.Semaphore(max(1, settings.batch_query_generation_concurrency))
+
+        async def answer(index: int, q: QueryRequest, trace_id: str) -> QueryResponse:
+            if cached[index] is not None:
+                return QueryResponse(**cached[index].response, trace_id=trace_id)
+            with timed_span(tracer, "api.query_batch.item", lambda: {
+                "batch.index": index,
+                "query.question_length": len(q.question),
+                "query.has_filters": q.filters is not None,
+                "query.trace_id": trace_id,
+            }) as item_span:
+                budgets = [b for b in (settings.query_deadline_seconds or None, batch_deadline.remaining()) if b is not None]
+                deadline = Deadline(min(budgets) if budgets else None)
+                try:
+                    async with search_slots:
+                        # A session per question: concurrent searches can't share one connection.
+                        async with async_session_factory() as db:
+                            retrieval = await search(
+                                db,
+                                q.question,
+                                q.filters,
+                                query_embedding=embeddings.get(index),
+                                deadline=deadline,
+                                route=routes[index],
+                            )
+                    async with rerank_slots:
+                        retrieval = await rank(q.question, retrieval, deadline)
+                    _record_retrieval(item_span, retrieval)
+                    if not retrieval.reranked:
+                        return _query_response(NO_ANSWER_RESULT, retrieval, trace_id)
+                    if not retrieval.plan.generate:
+                        result = listing_answer(retrieval.context, retrieval.metadata_count)
+                    else:
+                        async with generation_slots:
+                            result = await _generate(q.question, retrieval.context, deadline)
+                    response = _query_response(result, retrieval, trace_id)
+                    if response.confidence is not None:
+                        item_span.set_attribute("query.confidence", response.confidence)
+                    _cache_answer(q, embeddings.get(index), response, retrieval, generation, deadline)
+                    return response
+                finally:
+                    deadline.record(item_span)
+
+        async def answer_or_error(index: int, q: QueryRequest) -> QueryResponse | BatchQueryError:
+            trace_id = str(uuid.uuid4())
+            try:
+                return await answer(index, q, trace_id)
+            except BATCH_FATAL_ERRORS:
+                raise
+            except Exception as e:
+                logger.exception("Batch question %d failed: %s", index, e)
+                return BatchQueryError(error="Query failed", trace_id=trace_id)
+
+        tasks = [asyncio.create_task(answer_or_error(i, q)) for i, q in enumerate(body.queries)]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            # Don't leave the remaining questions spending provider calls for a failed batch.
+            for task in tasks:
+                task.cancel()
+            raise
+        failed = sum(isinstance(r, BatchQueryError) for r in results)
+        span.set_attribute("batch.failed", failed)
+        if failed:
+            span.set_attribute("error", True)
+        return BatchQueryResponse(results=results)
+
+
+@app.post("/api/v1/search", response_model=SearchResponse)
+async def search_chunks(body: SearchRequest, db: AsyncSession = Depends(get_db)):
+    """Ranked chunks without a generated answer: dense + BM25 search, fusion and optional rerank.
+
+    Every page is cut from the same candidate pool (Settings.search_max_results, ranked and
+    reranked as a whole), so pages never overlap or skip results. Rerank scores are cached per
+    query, so later pages don't pay for Cohere again.
+    """
+    window = body.offset + body.limit
+    if window > settings.search_max_results:
+        raise HTTPException(
+            status_code=422, detail=f"offset + limit may not exceed {settings.search_max_results}"
+        )
+    tracer = get_tracer()
+    trace_id = request_trace_id()
+    deadline = Deadline.for_query()
+    with timed_span(tracer, "api.search", lambda: {
+        "search.query_length": len(body.query),
+        "search.has_filters": body.filters is not None,
+        "search.offset": body.offset,
+        "search.limit": body.limit,
+        "search.rerank": body.rerank,
+        "query.trace_id": trace_id,
+    }) as span:
+        try:
+            # Search always runs the full hybrid stages, in plain fusion order; the router's shortcuts
+            # and MMR's candidate cap are for building answer context.
+            route = Route("search", HYBRID, body.filters)
+            # The pool doesn't depend on the page; one candidate past it shows whether it was cut short.
+            pool = settings.search_max_results
+            retrieval = await search(
+                db, body.query, body.filters, deadline=deadline, route=route, top_k=pool + 1, diversify=False
             )
-        fused = fuse_results(dense_chunks, sparse_chunks, top_k=20)
-        span.set_attribute("query.fused_results", len(fused))
-        reranked = await rerank(body.question, fused, top_n=5)
-        span.set_attribute("query.reranked_results", len(reranked))
-        if not reranked:
-            span.set_attribute("query.early_exit", "no_reranked")
-            return QueryResponse(
-                answer="I don't have enough information to answer that.",
-                confidence=0.0,
-                citations=[],
-                query_type="factual",
-                retrieval_strategy="hybrid_rrf_rerank",
-                chunks_retrieved=len(fused),
-                chunks_after_rerank=0,
+            ranked = retrieval.fused[:pool]
+            rerank_tier = None
+            if body.rerank and ranked:
+                ranked = await rerank_candidates(body.query, ranked, deadline, top_n=len(ranked))
+                rerank_tier = ranked[0]["rerank_tier"]
+            # skip, fallback and timeout keep fusion order; only local and remote produce rerank scores.
+            reranked = rerank_tier in ("local", "remote")
+
+            stages = []
+            if "dense_skipped" not in deadline.degraded:
+                stages += ["embedding", "dense"]
+            if "sparse_skipped" not in deadline.degraded:
+                stages.append("sparse")
+            if retrieval.fused:
+                stages.append("fusion")
+            if rerank_tier:
+                stages.append(f"rerank_{rerank_tier}")
+
+            results = []
+            for position, c in enumerate(ranked[body.offset:window], start=body.offset + 1):
+                meta = c.get("metadata") or {}
+                rerank_score = c["rerank_score"] if reranked else None
+                results.append(
+                    SearchResult(
+                        rank=position,
+                        chunk_id=c["chunk_id"],
+                        document_id=c["document_id"],
+                        content=c["content"],
+                        source=meta.get("source") or "Unknown",
+                        location=meta.get("location") or "N/A",
+                        metadata=meta,
+                        score=rerank_score if rerank_score is not None else c["fusion_score"],
+                        fusion_score=c["fusion_score"],
+                        rerank_score=rerank_score,
+                        ranks=c.get("ranks") or {},
+                    )
+                )
+            span.set_attribute("search.dense_results", retrieval.dense_count)
+            span.set_attribute("search.sparse_results", retrieval.sparse_count)
+            span.set_attribute("search.results_count", len(results))
+            span.set_attribute("search.stages", stages)
+            span.set_attribute("search.pool_truncated", len(retrieval.fused) > pool)
+            return SearchResponse(
                 trace_id=trace_id,
+                results=results,
+                offset=body.offset,
+                limit=body.limit,
+                has_more=len(ranked) > window,
+                stages=stages,
+                degraded=list(deadline.degraded),
             )
-        result = await generate_answer(body.question, reranked)
-        citations = [
-            Citation(
-                index=i,
-                chunk_id=c["chunk_id"],
-                source=c["source"],
-                location=c["location"],
-                excerpt=c["excerpt"],
-            )
-            for i, c in enumerate(result["citations"], start=1)
-        ]
-        span.set_attribute("query.confidence", result["confidence"])
-        span.set_attribute("query.citations_count", len(citations))
-        span.set_attribute("query.answer_length", len(result["answer"]))
-        return QueryResponse(
-            answer=result["answer"],
-            confidence=result["confidence"],
-            citations=citations,
-            query_type=result["query_type"],
-            retrieval_strategy="hybrid_rrf_rerank",
-            chunks_retrieved=len(fused),
-            chunks_after_rerank=len(reranked),
-            trace_id=trace_id,
-        )
\ No newline at end of file
+        finally:
+            deadline.record(span)
+
+
+def _sse(event: str, data: BaseModel | dict) -> str:
+    payload = data.model_dump_json() if isinstance(data, BaseModel) else json.dumps(data)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+@app.post("/api/v1/query/stream")
+async def query_stream(body: QueryRequest):
+    """Answer a question as server-sent events: retrieval, token (repeated), citations, done.
+
+    `done` carries the full QueryResponse. Failures after the stream has started arrive as an `error` event.
+    A cached answer is replayed as the same event sequence with the whole answer in one token event.
+    """
+
+    async def events():
+        tracer = get_tracer()
+        trace_id = request_trace_id()
+        deadline = Deadline.for_query()
+        with timed_span(tracer, "api.query_stream", lambda: {
+            "query.question_length": len(body.question),
+            "query.has_filters": body.filters is not None,
+            "query.trace_id": trace_id,
+        }) as span:
+            try:
+                generation = answer_cache.generation
+                route = route_query(body.question, body.filters)
+                cached, query_embedding = await _cached_answer(body, span, deadline, route)
+                if cached is not None:
+                    response = QueryResponse(**cached.response, trace_id=trace_id)
+                    yield _sse("retrieval", QueryRetrievalEvent(
+                        trace_id=trace_id,
+                        retrieval_strategy=response.retrieval_strategy,
+                        chunks_retrieved=response.chunks_retrieved,
+                        chunks_after_rerank=response.chunks_after_rerank,
+                        chunks=cached.chunks,
+                    ))
+                    yield _sse("token", {"text": response.answer})
+                    yield _sse("citations", {"citations": [c.model_dump() for c in response.citations]})
+                    yield _sse("done", response)
+                    return
+
+                async with async_session_factory() as db:
+                    retrieval = await retrieve(
+                        db, body.question, body.filters, query_embedding=query_embedding, deadline=deadline, route=route
+                    )
+                _record_retrieval(span, retrieval)
+                yield _sse("retrieval", QueryRetrievalEvent(
+                    trace_id=trace_id,
+                    retrieval_strategy=retrieval.strategy,
+                    chunks_retrieved=len(retrieval.fused),
+                    chunks_after_rerank=len(retrieval.reranked),
+                    chunks=_retrieved_chunks(retrieval),
+                ))
+
+                if retrieval.reranked and not retrieval.plan.generate:
+                    result = listing_answer(retrieval.context, retrieval.metadata_count)
+                    yield _sse("token", {"text": result["answer"]})
+                elif retrieval.reranked:
+                    result = {}
+                    stream = stream_answer(
+                        body.question,
+                        retrieval.context,
+                        max_tokens=_generation_budget(deadline),
+                        timeout=deadline.remaining(),
+                    )
+                    async for kind, value in stream:
+                        if kind == "token":
+                            yield _sse("token", {"text": value})
+                        else:
+                            result = value
+                    if deadline.expired:
+                        deadline.degrade("generation_truncated")
+                else:
+                    result = NO_ANSWER_RESULT
+                    yield _sse("token", {"text": NO_ANSWER})
+
+                response = _query_response(result, retrieval, trace_id)
+                if response.confidence is not None:
+                    span.set_attribute("query.confidence", response.confidence)
+                span.set_attribute("query.citations_count", len(response.citations))
+                span.set_attribute("query.answer_length", len(response.answer))
+                yield _sse("citations", {"citations": [c.model_dump() for c in response.citations]})
+                if retrieval.reranked:
+                    _cache_answer(body, query_embedding, response, retrieval, generation, deadline)
+                yield _sse("done", response)
+            except Exception as e:
+                logger.exception("Streaming query failed: %s", e)
+                span.set_attribute("error", True)
+                yield _sse("error", {"detail": "Query failed", "trace_id": trace_id})
+            finally:
+                deadline.record(span)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream or caching it.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
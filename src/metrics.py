@@ -0,0 +1,165 @@
+"""Prometheus metrics, exposed at GET /metrics.
+
+Fed by the same instrumentation points as tracing, so they work without a tracing backend:
+every timed_span observes its latency in driftlog_stage_duration_seconds (label: span name),
+set_llm_attributes counts tokens, calls and estimated spend, and the caches count hits and
+misses. Index size, DB pool and span-export gauges are read when Prometheus scrapes.
+Metrics are per process; run one API process per scrape target.
+"""
+
+from __future__ import annotations
+
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from src.config import settings
+
+# Seconds; covers in-memory stages (fusion, BM25) through LLM generation and journal transcription.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# USD list prices per million tokens (input, output, cache_read, cache_creation) or per call;
+# models are matched by prefix. Unlisted models still count tokens, just no spend.
+LLM_PRICES: dict[str, dict[str, float]] = {
+    "claude-haiku-4-5": {"input": 1.0, "output": 5.0, "cache_read": 0.1, "cache_creation": 1.25},
+    "text-embedding-3-small": {"input": 0.02},
+    "text-embedding-3-large": {"input": 0.13},
+    "rerank-v3.5": {"call": 0.002},
+}
+
+STAGE_LATENCY = Histogram(
+    "driftlog_stage_duration_seconds", "Latency of each instrumented stage (timed_span name)", ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+STAGE_ERRORS = Counter(
+    "driftlog_stage_errors_total", "Stages that raised or were marked error", ["stage"],
+)
+HTTP_REQUESTS = Counter(
+    "driftlog_http_requests_total", "HTTP requests by endpoint and status code", ["endpoint", "status"],
+)
+HTTP_LATENCY = Histogram(
+    "driftlog_http_request_duration_seconds", "Time to the end of the response body", ["endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_CALLS = Counter("driftlog_llm_calls_total", "Provider calls (generation, transcription, embedding, rerank)", ["model"])
+LLM_TOKENS = Counter("driftlog_llm_tokens_total", "Provider tokens by type", ["model", "type"])
+LLM_COST = Counter("driftlog_llm_cost_usd_total", "Estimated provider spend at list prices", ["model"])
+CACHE_LOOKUPS = Counter("driftlog_cache_lookups_total", "Cache lookups by cache and result", ["cache", "result"])
+
+
+def _price(model: str) -> dict[str, float]:
+    return next((p for prefix, p in LLM_PRICES.items() if model.startswith(prefix)), {})
+
+
+def observe_stage(stage: str, seconds: float, failed: bool) -> None:
+    if not settings.metrics_enabled:
+        return
+    STAGE_LATENCY.labels(stage).observe(seconds)
+    if failed:
+        STAGE_ERRORS.labels(stage).inc()
+
+
+def record_llm_usage(model: str, tokens: dict[str, int | None]) -> None:
+    """Count one provider call and its tokens (keys: input, output, cache_read, cache_creation)."""
+    if not settings.metrics_enabled:
+        return
+    price = _price(model)
+    cost = price.get("call", 0.0)
+    LLM_CALLS.labels(model).inc()
+    for kind, count in tokens.items():
+        if count:
+            LLM_TOKENS.labels(model, kind).inc(count)
+            cost += count * price.get(kind, 0.0) / 1_000_000
+    if cost:
+        LLM_COST.labels(model).inc(cost)
+
+
+def record_cache(cache: str, hits: int, misses: int) -> None:
+    if not settings.metrics_enabled:
+        return
+    if hits:
+        CACHE_LOOKUPS.labels(cache, "hit").inc(hits)
+    if misses:
+        CACHE_LOOKUPS.labels(cache, "miss").inc(misses)
+
+
+class _RuntimeCollector:
+    """Gauges read at scrape time: BM25 index and cache sizes, DB pool, span export counters."""
+
+    def describe(self):
+        # Without this the registry calls collect() at registration, before those modules exist.
+        return []
+
+    def collect(self):
+        # Imported here: these modules import tracing, which imports this module.
+        from src.database import engine
+        from src.generation.answer_cache import answer_cache
+        from src.retrieval.reranker import score_cache
+        from src.retrieval.sparse import bm25_index
+        from src.tracing import tracing_stats
+
+        yield GaugeMetricFamily("driftlog_bm25_index_chunks", "Chunks in the in-memory BM25 index", value=len(bm25_index))
+        entries = GaugeMetricFamily("driftlog_cache_entries", "Entries held by in-process caches", labels=["cache"])
+        entries.add_metric(["answer"], len(answer_cache))
+        entries.add_metric(["rerank_score"], len(score_cache))
+        yield entries
+
+        pool = engine.pool
+        connections = GaugeMetricFamily("driftlog_db_pool_connections", "Database pool connections by state", labels=["state"])
+        connections.add_metric(["checked_out"], pool.checkedout())
+        connections.add_metric(["idle"], pool.checkedin())
+        connections.add_metric(["overflow"], max(0, pool.overflow()))
+        yield connections
+        yield GaugeMetricFamily(
+            "driftlog_db_pool_capacity", "Pool size plus allowed overflow",
+            value=settings.database_pool_size + settings.database_max_overflow,
+        )
+
+        stats = tracing_stats()
+        spans = CounterMetricFamily("driftlog_tracing_spans", "Spans by export outcome", labels=["outcome"])
+        for outcome in ("exported", "dropped", "failed"):
+            spans.add_metric([outcome], stats[f"{outcome}_spans"])
+        yield spans
+        traces = CounterMetricFamily("driftlog_tracing_traces", "Traces by tail-sampling outcome", labels=["outcome"])
+        for outcome in ("kept", "sampled_out", "evicted"):
+            traces.add_metric([outcome], stats[f"{outcome}_traces"])
+        yield traces
+        yield GaugeMetricFamily("driftlog_tracing_queued_spans", "Spans waiting for export", value=stats["queued_spans"])
+
+
+REGISTRY.register(_RuntimeCollector())
+
+
+def render() -> tuple[bytes, str]:
+    """Current metrics in the Prometheus text format, with its content type."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests and timing them per endpoint (route function name)."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not settings.metrics_enabled:
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched endpoint in the scope; unmatched paths share one label.
+            endpoint = scope.get("endpoint")
+            name = getattr(endpoint, "__name__", type(endpoint).__name__) if endpoint else "unmatched"
+            HTTP_REQUESTS.labels(name, str(status)).inc()
+            HTTP_LATENCY.labels(name).observe(time.perf_counter() - start)
@@ -8,17 +8,23 @@ from sqlalchemy import Date, DateTime, ForeignKey, Index, Integer, String, Text,
 from sqlalchemy.dialects.postgresql import ARRAY, JSONB, UUID as PG_UUID
 from sqlalchemy.orm import Mapped, mapped_column
 
+from src.config import settings
 from src.database import Base
 
 
 class Document(Base):
     __tablename__ = "documents"
+    __table_args__ = (
+        Index("ix_documents_external_id", "external_id", unique=True),
+    )
 
     id: Mapped[UUID] = mapped_column(
         PG_UUID(as_uuid=True),
         primary_key=True,
         server_default=text("gen_random_uuid()"),
     )
+    # Caller-supplied key for upserts; documents ingested without one can't be updated in place.
+    external_id: Mapped[str | None] = mapped_column(String(255), nullable=True)
     content: Mapped[str] = mapped_column(Text, nullable=False)
     source: Mapped[str | None] = mapped_column(String(500), nullable=True)
     location: Mapped[str | None] = mapped_column(String(200), nullable=True)
@@ -66,7 +72,11 @@ class Chunk(Base):
     )
     content: Mapped[str] = mapped_column(Text, nullable=False)
     chunk_index: Mapped[int] = mapped_column(Integer, nullable=False)
-    embedding: Mapped[list[float] | None] = mapped_column(Vector(1536), nullable=True)
+    # sha256 of content; upserts diff on this to re-embed only changed chunks.
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    embedding: Mapped[list[float] | None] = mapped_column(Vector(settings.embedding_dimensions), nullable=True)
+    # EmbeddingProvider.model_tag of the vector; dense search only compares vectors with the same tag.
+    embedding_model: Mapped[str | None] = mapped_column(String(200), nullable=True)
     metadata_: Mapped[dict] = mapped_column(
         "metadata",
         JSONB,
@@ -78,3 +88,22 @@ class Chunk(Base):
         server_default=func.now(),
         nullable=False,
     )
+
+
+class TranscriptionCacheEntry(Base):
+    """Cached Textract OCR text or parsed Claude entries, keyed by a hash of the image bytes and prompt inputs."""
+
+    __tablename__ = "transcription_cache"
+    __table_args__ = (
+        Index("ix_transcription_cache_created_at", "created_at"),
+    )
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    kind: Mapped[str] = mapped_column(String(20), nullable=False)
+    payload: Mapped[dict | list] = mapped_column(JSONB, nullable=False)
+    size_bytes: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
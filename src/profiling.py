@@ -0,0 +1,136 @@
+"""On-demand per-request profiling with pyinstrument (pip install -e '.[profiling]').
+
+With PROFILING_ENABLED=true, a request is profiled when it sends an X-Profile header (equal to
+PROFILING_TOKEN when one is set) or falls in PROFILING_SAMPLE_RATE. The sampler follows the
+request's task in async mode: time spent awaiting providers or the database shows up as
+`await` frames, CPU work that blocks the event loop (BM25 scoring, chunking, JSON parsing)
+as real stacks. After the response is sent the profile is written as speedscope JSON (open it
+at https://www.speedscope.app), named after the request's trace id. The response carries an
+X-Profile-Id header, and the request's first recorded span gets profile.id / profile.path.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hmac
+import importlib.util
+import logging
+import random
+import uuid
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+from opentelemetry import trace
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+# Each profiled request pays the sampler's overhead; don't let a burst of them pile up.
+MAX_CONCURRENT_PROFILES = 4
+
+_active_profiles = 0
+_warned_unavailable = False
+
+
+@dataclass
+class ActiveProfile:
+    trace_id: str
+    path: Path
+    linked: bool = False
+
+
+_current: ContextVar[ActiveProfile | None] = ContextVar("profile", default=None)
+
+
+def is_available() -> bool:
+    """Whether profiling is enabled and pyinstrument is installed."""
+    return settings.profiling_enabled and importlib.util.find_spec("pyinstrument") is not None
+
+
+def request_trace_id() -> str:
+    """Trace id for the current request: the profile's when it is being profiled, otherwise a new one."""
+    profile = _current.get()
+    return profile.trace_id if profile else str(uuid.uuid4())
+
+
+def link_span(span: trace.Span) -> None:
+    """Tag the request's first recorded span with its profile (called by timed_span)."""
+    profile = _current.get()
+    if profile is None or profile.linked or not span.is_recording():
+        return
+    span.set_attribute("profile.id", profile.trace_id)
+    span.set_attribute("profile.path", str(profile.path))
+    profile.linked = True
+
+
+def _requested(scope) -> bool:
+    for name, value in scope.get("headers", []):
+        if name == PROFILE_HEADER:
+            return not settings.profiling_token or hmac.compare_digest(
+                value.decode("latin-1"), settings.profiling_token
+            )
+    return settings.profiling_sample_rate > 0 and random.random() < settings.profiling_sample_rate
+
+
+def _write(profiler, path: Path) -> None:
+    from pyinstrument.renderers import SpeedscopeRenderer
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(profiler.output(SpeedscopeRenderer()), encoding="utf-8")
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that runs pyinstrument for the requests chosen by _requested."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        global _active_profiles, _warned_unavailable
+        if (
+            scope["type"] != "http"
+            or not settings.profiling_enabled
+            or _active_profiles >= MAX_CONCURRENT_PROFILES
+            or not _requested(scope)
+        ):
+            await self.app(scope, receive, send)
+            return
+        if not is_available():
+            if not _warned_unavailable:
+                logger.warning("PROFILING_ENABLED is set but pyinstrument is missing: pip install -e '.[profiling]'")
+                _warned_unavailable = True
+            await self.app(scope, receive, send)
+            return
+
+        from pyinstrument import Profiler
+
+        trace_id = str(uuid.uuid4())
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        profile = ActiveProfile(trace_id, Path(settings.profiling_output_dir) / f"{stamp}_{trace_id}.speedscope.json")
+
+        async def send_with_profile_id(message) -> None:
+            if message["type"] == "http.response.start":
+                headers = [*message.get("headers", []), (b"x-profile-id", trace_id.encode("latin-1"))]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        profiler = Profiler(interval=settings.profiling_interval_ms / 1000, async_mode="enabled")
+        token = _current.set(profile)
+        _active_profiles += 1
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.stop()
+            _active_profiles -= 1
+            _current.reset(token)
+            # The response has gone out already; render and write off the event loop.
+            try:
+                await asyncio.to_thread(_write, profiler, profile.path)
+                logger.info("Profiled %s %s -> %s", scope["method"], scope["path"], profile.path)
+            except Exception:
+                logger.exception("Writing profile %s failed", profile.path)
@@ -0,0 +1,53 @@
+"""Local CPU cross-encoder, the middle rerank tier between plain RRF order and Cohere.
+
+Needs sentence-transformers (pip install -e '.[local]'). Without it the tier is reported
+unavailable and rerank goes straight to Cohere.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import logging
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+_model = None
+_load_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+
+
+def is_available() -> bool:
+    """Whether the local tier is enabled and its dependency is installed."""
+    return settings.rerank_local_enabled and importlib.util.find_spec("sentence_transformers") is not None
+
+
+def _load():
+    global _model
+    if _model is None:
+        with _load_lock:
+            if _model is None:
+                from sentence_transformers import CrossEncoder
+
+                _model = CrossEncoder(settings.rerank_local_model, device="cpu")
+    return _model
+
+
+def _predict(query: str, documents: list[str]) -> list[float]:
+    logits = _load().predict([(query, doc) for doc in documents], batch_size=len(documents))
+    # ms-marco cross-encoders emit logits; squash to 0..1 so scores are comparable to Cohere's.
+    return [1.0 / (1.0 + math.exp(-float(x))) for x in logits]
+
+
+async def score(query: str, documents: list[str]) -> list[float]:
+    """Relevance of each document to query, in input order, computed off the event loop."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=max(1, settings.rerank_local_threads), thread_name_prefix="rerank")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, _predict, query, documents)
@@ -1,7 +1,7 @@
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.ingestion.embedder import embed_text
+from src.ingestion.embedder import embed_text, get_embedding_provider
 from src.tracing import get_tracer, timed_span
 
 
@@ -13,23 +13,29 @@ async def dense_search(
     location: str | None = None,
     country: str | None = None,
     tags: list[str] | None = None,
+    query_embedding: list[float] | None = None,
 ) -> list[dict]:
-    """Run pgvector cosine similarity search on chunks with optional metadata filters."""
+    """Run pgvector cosine similarity search on chunks with optional metadata filters.
+
+    Pass query_embedding when the caller already embedded the query to skip a second embedding call.
+    """
     tracer = get_tracer()
-    with timed_span(tracer, "retrieval.dense_search", {
+    with timed_span(tracer, "retrieval.dense_search", lambda: {
         "search.top_k": top_k,
         "search.has_location_filter": location is not None,
         "search.has_country_filter": country is not None,
         "search.has_tags_filter": tags is not None and len(tags) > 0,
     }) as span:
-        query_embedding = await embed_text(query)
+        if query_embedding is None:
+            query_embedding = await embed_text(query)
         if not query_embedding:
             span.set_attribute("search.results_count", 0)
             return []
         vector_str = "[" + ",".join(str(x) for x in query_embedding) + "]"
 
-        conditions = []
-        params: dict = {"top_k": top_k}
+        # Vectors from a different embedding model live in a different space; never mix them.
+        conditions = ["embedding_model = :embedding_model"]
+        params: dict = {"top_k": top_k, "embedding_model": get_embedding_provider().model_tag}
         if location is not None:
             conditions.append("metadata->>'location' = :location")
             params["location"] = location
@@ -40,9 +46,9 @@ async def dense_search(
             conditions.append("metadata->'tags' ?| cast(:tags as text[])")
             params["tags"] = tags
 
-        where_clause = " AND ".join(conditions) if conditions else "TRUE"
+        where_clause = " AND ".join(conditions)
         sql_str = f"""
-            SELECT id, content, document_id, metadata,
+            SELECT id, content, document_id, chunk_index, metadata,
                    1 - (embedding <=> '{vector_str}'::vector) AS similarity_score
             FROM chunks
             WHERE embedding IS NOT NULL AND {where_clause}
@@ -59,6 +65,7 @@ async def dense_search(
                 "content": row["content"],
                 "similarity_score": float(row["similarity_score"]),
                 "document_id": str(row["document_id"]),
+                "chunk_index": row["chunk_index"],
                 "metadata": dict(row["metadata"]) if row["metadata"] else {},
             }
             for row in rows
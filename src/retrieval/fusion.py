@@ -1,85 +1,151 @@
-"""Reciprocal Rank Fusion to merge dense and sparse search results."""
+"""Fusion of ranked result lists from any number of retrievers.
+
+Candidates from all lists are laid out once as a (retrievers x candidates) matrix of ranks
+and raw scores; scoring and top-k selection then run in NumPy. Methods:
+
+- rrf: weighted Reciprocal Rank Fusion, sum of weight / (k + rank). Scale-free, the default.
+- minmax: each retriever's raw scores rescaled to 0..1, then a weighted mean.
+- zscore: each retriever's raw scores standardized, then a weighted mean squashed to 0..1.
+
+A candidate missing from a list contributes nothing under rrf and minmax, and that list's
+worst score under zscore. fusion_score is always 0..1 and is what the output is ordered by.
+"""
 import logging
+from collections.abc import Mapping
+
+import numpy as np
 
 from src.tracing import get_tracer, timed_span
 
 logger = logging.getLogger(__name__)
 
+RRF_K = 60
+FUSION_METHODS = ("rrf", "minmax", "zscore")
+# Raw score field per result shape: dense_search sets similarity_score, BM25 sets score.
+SCORE_KEYS = ("similarity_score", "score")
 
-def fuse_results(
-    dense_results: list[dict],
-    sparse_results: list[dict],
-    k: int = 60,
+
+def _raw_score(item: dict) -> float:
+    for key in SCORE_KEYS:
+        if key in item:
+            return float(item[key])
+    return 0.0
+
+
+def _normalized(scores: np.ndarray, present: np.ndarray, method: str) -> np.ndarray:
+    """Per-row min-max or z-score normalization over present entries; missing entries get 0 or the row minimum."""
+    masked = np.where(present, scores, np.nan)
+    if method == "minmax":
+        lo = np.nanmin(masked, axis=1, keepdims=True)
+        span = np.nanmax(masked, axis=1, keepdims=True) - lo
+        # A retriever whose candidates all tie gives each of them full credit.
+        normed = np.divide(masked - lo, span, out=np.ones_like(masked), where=span > 0)
+        return np.where(present, normed, 0.0)
+    mean = np.nanmean(masked, axis=1, keepdims=True)
+    std = np.nanstd(masked, axis=1, keepdims=True)
+    z = np.divide(masked - mean, std, out=np.zeros_like(masked), where=std > 0)
+    worst = np.nanmin(np.where(present, z, np.nan), axis=1, keepdims=True)
+    return np.where(present, z, worst)
+
+
+def fuse(
+    results: Mapping[str, list[dict]],
+    *,
+    method: str = "rrf",
+    weights: Mapping[str, float] | None = None,
+    k: int = RRF_K,
     top_k: int = 20,
 ) -> list[dict]:
-    """Merge dense and sparse results by RRF. Each input dict has chunk_id, content, document_id, metadata."""
+    """Fuse ranked lists keyed by retriever name. Each result dict has chunk_id, content, document_id, chunk_index, metadata.
+
+    Retrievers missing from weights get weight 1.0. Each output carries fusion_score, the
+    per-retriever 1-based ranks, sources, and rrf_score / rrf_normalized (1.0 means ranked first
+    by every retriever) whatever the method.
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method {method!r} (expected one of {', '.join(FUSION_METHODS)})")
+    names = [name for name, items in results.items() if items]
     tracer = get_tracer()
-    with timed_span(tracer, "retrieval.fusion", {
+    with timed_span(tracer, "retrieval.fusion", lambda: {
+        "fusion.method": method,
         "fusion.k": k,
         "fusion.top_k": top_k,
-        "fusion.dense_input_count": len(dense_results),
-        "fusion.sparse_input_count": len(sparse_results),
+        "fusion.retrievers": names,
+        **{f"fusion.{name}_input_count": len(items) for name, items in results.items()},
     }) as span:
-        # 1-based rank and dict by chunk_id (no dependency on similarity_score / score)
-        dense_rank: dict[str, int] = {}
-        dense_by_id: dict[str, dict] = {}
-        for rank, d in enumerate(dense_results, start=1):
-            cid = d["chunk_id"]
-            dense_rank[cid] = rank
-            dense_by_id[cid] = d
-
-        sparse_rank: dict[str, int] = {}
-        sparse_by_id: dict[str, dict] = {}
-        for rank, s in enumerate(sparse_results, start=1):
-            cid = s["chunk_id"]
-            sparse_rank[cid] = rank
-            sparse_by_id[cid] = s
-
-        all_chunk_ids = set(dense_rank) | set(sparse_rank)
-        dense_only = sum(1 for cid in all_chunk_ids if cid in dense_rank and cid not in sparse_rank)
-        sparse_only = sum(1 for cid in all_chunk_ids if cid in sparse_rank and cid not in dense_rank)
-        both = sum(1 for cid in all_chunk_ids if cid in dense_rank and cid in sparse_rank)
-        span.set_attribute("fusion.dense_only", dense_only)
-        span.set_attribute("fusion.sparse_only", sparse_only)
-        span.set_attribute("fusion.overlap", both)
-        span.set_attribute("fusion.unique_chunks", len(all_chunk_ids))
-        logger.info(
-            "fusion stats: dense_only=%d, sparse_only=%d, both=%d",
-            dense_only,
-            sparse_only,
-            both,
-        )
+        # One pass to give every chunk a column; content comes from the list that ranked it best.
+        column: dict[str, int] = {}
+        best: list[tuple[int, dict]] = []
+        ranks = np.zeros((len(names), sum(len(results[n]) for n in names)), dtype=np.float64)
+        raw = np.zeros_like(ranks)
+        for row, name in enumerate(names):
+            for rank, item in enumerate(results[name], start=1):
+                cid = item["chunk_id"]
+                col = column.get(cid)
+                if col is None:
+                    col = column[cid] = len(best)
+                    best.append((rank, item))
+                elif ranks[row, col] == 0 and rank < best[col][0]:
+                    best[col] = (rank, item)
+                if ranks[row, col] == 0:
+                    ranks[row, col] = rank
+                    raw[row, col] = _raw_score(item)
+        n = len(best)
+        ranks, raw = ranks[:, :n], raw[:, :n]
+        present = ranks > 0
+        w = np.array([(weights or {}).get(name, 1.0) for name in names], dtype=np.float64)
+        total_weight = w.sum() or 1.0
+
+        rrf = (w[:, None] * np.where(present, 1.0 / (k + np.where(present, ranks, 1.0)), 0.0)).sum(axis=0)
+        rrf_normalized = rrf * (k + 1) / total_weight
+        if method == "rrf":
+            score = rrf_normalized
+        else:
+            combined = (w[:, None] * _normalized(raw, present, method)).sum(axis=0) / total_weight
+            score = combined if method == "minmax" else 1.0 / (1.0 + np.exp(-combined))
+
+        hits = present.sum(axis=0)
+        span.set_attribute("fusion.unique_chunks", n)
+        span.set_attribute("fusion.overlap", int((hits > 1).sum()))
+        for row, name in enumerate(names):
+            span.set_attribute(f"fusion.{name}_only", int((present[row] & (hits == 1)).sum()))
+        logger.info("fusion stats: unique=%d, overlap=%d", n, int((hits > 1).sum()))
+
+        if n > top_k:
+            selected = np.argpartition(-score, top_k - 1)[:top_k]
+        else:
+            selected = np.arange(n)
+        # Highest score first; ties keep first-seen order so results are deterministic.
+        selected = selected[np.lexsort((selected, -score[selected]))]
 
         fused: list[dict] = []
-        for cid in all_chunk_ids:
-            rrf_score = 0.0
-            sources: list[str] = []
-            if cid in dense_rank:
-                rrf_score += 1.0 / (k + dense_rank[cid])
-                sources.append("dense")
-            if cid in sparse_rank:
-                rrf_score += 1.0 / (k + sparse_rank[cid])
-                sources.append("sparse")
-
-            # Use content/metadata from whichever list had it ranked higher (lower rank)
-            use_dense = cid in dense_rank and (
-                cid not in sparse_rank or dense_rank[cid] <= sparse_rank[cid]
-            )
-            src = dense_by_id[cid] if use_dense else sparse_by_id[cid]
+        for col in selected.tolist():
+            src = best[col][1]
             fused.append(
                 {
-                    "chunk_id": cid,
+                    "chunk_id": src["chunk_id"],
                     "content": src["content"],
                     "document_id": src["document_id"],
+                    "chunk_index": src["chunk_index"],
                     "metadata": src["metadata"],
-                    "rrf_score": rrf_score,
-                    "sources": sources,
+                    "fusion_score": float(score[col]),
+                    "rrf_score": float(rrf[col]),
+                    "rrf_normalized": float(rrf_normalized[col]),
+                    "ranks": {name: int(ranks[row, col]) for row, name in enumerate(names) if present[row, col]},
+                    "sources": [name for row, name in enumerate(names) if present[row, col]],
                 }
             )
+        span.set_attribute("fusion.output_count", len(fused))
+        if fused:
+            span.set_attribute("fusion.top_score", fused[0]["fusion_score"])
+        return fused
+
 
-        fused.sort(key=lambda x: x["rrf_score"], reverse=True)
-        result = fused[:top_k]
-        span.set_attribute("fusion.output_count", len(result))
-        if result:
-            span.set_attribute("fusion.top_rrf_score", result[0]["rrf_score"])
-        return result
+def fuse_results(
+    dense_results: list[dict],
+    sparse_results: list[dict],
+    k: int = RRF_K,
+    top_k: int = 20,
+) -> list[dict]:
+    """Merge dense and sparse results by equal-weight RRF; see fuse()."""
+    return fuse({"dense": dense_results, "sparse": sparse_results}, method="rrf", k=k, top_k=top_k)
@@ -0,0 +1,65 @@
+"""Metadata lookup over documents, the retrieval step of the router's metadata_lookup plan."""
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models import Chunk, Document
+from src.schemas import QueryFilters
+from src.tracing import get_tracer, timed_span
+
+LOOKUP_LIMIT = 20
+
+
+async def metadata_lookup(
+    session: AsyncSession,
+    filters: QueryFilters | None,
+    *,
+    limit: int = LOOKUP_LIMIT,
+) -> tuple[list[dict], int]:
+    """Most recent documents matching filters, as chunk dicts for their first chunk, plus the total match count.
+
+    Matches are exact, so each carries rerank_score and relevance_score 1.0 and is its own context passage.
+    """
+    f = filters
+    tracer = get_tracer()
+    with timed_span(tracer, "retrieval.metadata_lookup", lambda: {
+        "search.top_k": limit,
+        "search.has_location_filter": f is not None and f.location is not None,
+        "search.has_country_filter": f is not None and f.country is not None,
+        "search.has_tags_filter": f is not None and bool(f.tags),
+    }) as span:
+        conditions = []
+        if f is not None and f.location is not None:
+            conditions.append(Document.location == f.location)
+        if f is not None and f.country is not None:
+            conditions.append(Document.country == f.country)
+        if f is not None and f.tags:
+            conditions.append(Document.tags.overlap(f.tags))
+
+        total = (await session.execute(select(func.count()).select_from(Document).where(*conditions))).scalar_one()
+        rows = (
+            await session.execute(
+                select(Chunk.id, Chunk.content, Chunk.document_id, Chunk.chunk_index, Chunk.metadata_)
+                .join(Document, Document.id == Chunk.document_id)
+                .where(Chunk.chunk_index == 0, *conditions)
+                .order_by(Document.entry_date.desc().nulls_last(), Document.created_at.desc())
+                .limit(limit)
+            )
+        ).all()
+        results = [
+            {
+                "chunk_id": str(row.id),
+                "chunk_ids": [str(row.id)],
+                "content": row.content,
+                "document_id": str(row.document_id),
+                "chunk_index": row.chunk_index,
+                "metadata": dict(row.metadata_) if row.metadata_ else {},
+                "rerank_score": 1.0,
+                "relevance_score": 1.0,
+                "rerank_tier": "metadata",
+            }
+            for row in rows
+        ]
+        span.set_attribute("search.total_matches", total)
+        span.set_attribute("search.results_count", len(results))
+        return results, total
@@ -0,0 +1,85 @@
+"""Maximal marginal relevance over fused candidates, between fusion and rerank.
+
+Fused lists often hold several overlapping chunks of one document. MMR picks candidates one
+at a time, trading relevance (fusion_score relative to the best candidate) against similarity
+to what was already picked: lambda * relevance - (1 - lambda) * max cosine to the picked set.
+Similarity uses the chunk embeddings stored in Postgres, fetched in one query.
+"""
+
+from __future__ import annotations
+
+import uuid
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.ingestion.embedder import get_embedding_provider
+from src.models import Chunk
+from src.tracing import get_tracer, timed_span
+
+
+async def _embeddings(session: AsyncSession, chunk_ids: list[str]) -> dict[str, np.ndarray]:
+    """Stored embeddings for chunk_ids in the current model's space, keyed by chunk id."""
+    rows = await session.execute(
+        select(Chunk.id, Chunk.embedding).where(
+            Chunk.id.in_([uuid.UUID(cid) for cid in chunk_ids]),
+            Chunk.embedding_model == get_embedding_provider().model_tag,
+            Chunk.embedding.is_not(None),
+        )
+    )
+    return {str(cid): np.asarray(embedding, dtype=np.float32) for cid, embedding in rows.all()}
+
+
+def _select(relevance: np.ndarray, vectors: np.ndarray, lambda_: float, top_n: int) -> list[int]:
+    """Greedy MMR; returns candidate positions in pick order. Zero vectors count as similar to nothing."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+    similarity = unit @ unit.T
+    redundancy = np.zeros(len(relevance), dtype=np.float32)
+    available = np.ones(len(relevance), dtype=bool)
+    picked: list[int] = []
+    for _ in range(min(top_n, len(relevance))):
+        score = np.where(available, lambda_ * relevance - (1 - lambda_) * redundancy, -np.inf)
+        best = int(np.argmax(score))
+        picked.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return picked
+
+
+async def diversify(
+    session: AsyncSession,
+    candidates: list[dict],
+    *,
+    lambda_: float | None = None,
+    top_n: int | None = None,
+) -> list[dict]:
+    """Reorder fused candidates by MMR and keep the first top_n (Settings.mmr_lambda / mmr_max_candidates by default)."""
+    lambda_ = settings.mmr_lambda if lambda_ is None else lambda_
+    top_n = settings.mmr_max_candidates if top_n is None else top_n
+    tracer = get_tracer()
+    with timed_span(tracer, "retrieval.mmr", lambda: {
+        "mmr.input_count": len(candidates),
+        "mmr.lambda": lambda_,
+        "mmr.top_n": top_n,
+    }) as span:
+        if len(candidates) <= 1:
+            span.set_attribute("mmr.output_count", len(candidates))
+            return candidates[:top_n]
+        stored = await _embeddings(session, [c["chunk_id"] for c in candidates])
+        span.set_attribute("mmr.missing_embeddings", len(candidates) - len(stored))
+        dims = next(iter(stored.values())).shape[0] if stored else 1
+        vectors = np.stack([stored.get(c["chunk_id"], np.zeros(dims, dtype=np.float32)) for c in candidates])
+
+        # Scaled to the best candidate, not min-max: stretching small fusion gaps to 0..1 would let
+        # relevance swamp the similarity penalty.
+        scores = np.array([c.get("fusion_score", 0.0) for c in candidates], dtype=np.float32)
+        relevance = scores / scores.max() if scores.max() > 0 else np.ones_like(scores)
+
+        picked = [candidates[i] for i in _select(relevance, vectors, lambda_, top_n)]
+        span.set_attribute("mmr.output_count", len(picked))
+        span.set_attribute("mmr.input_documents", len({c["document_id"] for c in candidates}))
+        span.set_attribute("mmr.output_documents", len({c["document_id"] for c in picked}))
+        return picked
@@ -0,0 +1,229 @@
+"""Retrieval shared by the query endpoints: dense + BM25 search, fusion, MMR, rerank.
+
+The router's plan decides which of these run: a metadata lookup replaces search entirely,
+and single-retriever plans skip the other retriever (and, for sparse_only, rerank).
+
+Stages run under the request Deadline. Out of time, embedding or dense search is skipped
+(BM25 results only) and rerank keeps RRF order; each fallback is noted on the deadline.
+retrieve() is search() then rank(); callers that fan out call them separately so the DB
+session is only held for search.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+from dataclasses import dataclass, field
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.deadline import Deadline
+from src.generation.packer import pack_context
+from src.ingestion.embedder import embed_text
+from src.retrieval import mmr
+from src.retrieval.dense import dense_search
+from src.retrieval.fusion import fuse
+from src.retrieval.metadata import metadata_lookup
+from src.retrieval.reranker import fusion_order, rerank
+from src.retrieval.router import Plan, Route, route_query
+from src.retrieval.sparse import bm25_index
+from src.schemas import QueryFilters
+
+logger = logging.getLogger(__name__)
+
+RERANK_TOP_N = 5
+# Candidates fetched from each retriever and kept after fusion.
+SEARCH_TOP_K = 20
+
+
+@dataclass
+class RetrievalResult:
+    plan: Plan
+    query_type: str
+    dense_count: int = 0
+    sparse_count: int = 0
+    # Documents matching a metadata lookup, including any beyond the lookup limit.
+    metadata_count: int = 0
+    fused: list[dict] = field(default_factory=list)
+    # What rerank sees: fused, diversified and capped by MMR when enabled.
+    candidates: list[dict] = field(default_factory=list)
+    reranked: list[dict] = field(default_factory=list)
+    # Reranked chunks packed into prompt passages; [n] citations index into this list.
+    context: list[dict] = field(default_factory=list)
+
+    @property
+    def strategy(self) -> str:
+        return self.plan.name
+
+
+async def embed_query(question: str, deadline: Deadline) -> list[float] | None:
+    """Embed the question within the embedding share. Returns None (and marks dense skipped) on timeout."""
+    try:
+        return await asyncio.wait_for(embed_text(question), deadline.timeout("embedding"))
+    except asyncio.TimeoutError:
+        logger.warning("Query embedding timed out, skipping dense retrieval")
+        deadline.degrade("dense_skipped")
+        return None
+
+
+async def _dense(
+    db: AsyncSession,
+    question: str,
+    filters: QueryFilters | None,
+    query_embedding: list[float],
+    deadline: Deadline,
+    top_k: int,
+) -> list[dict]:
+    f = filters
+    try:
+        return await asyncio.wait_for(
+            dense_search(
+                db,
+                question,
+                top_k=top_k,
+                location=f.location if f else None,
+                country=f.country if f else None,
+                tags=f.tags if f else None,
+                query_embedding=query_embedding,
+            ),
+            deadline.timeout("dense"),
+        )
+    except asyncio.TimeoutError:
+        logger.warning("Dense search timed out, using BM25 results only")
+        deadline.degrade("dense_skipped")
+        # The cancelled statement may have left the transaction unusable.
+        await db.rollback()
+        return []
+
+
+async def _sparse(question: str, filters: QueryFilters | None, deadline: Deadline, top_k: int) -> list[dict]:
+    f = filters
+    search = functools.partial(
+        bm25_index.search,
+        question,
+        top_k,
+        location=f.location if f else None,
+        country=f.country if f else None,
+        tags=f.tags if f else None,
+    )
+    try:
+        # BM25 scoring is CPU-bound; a thread keeps it off the event loop and lets it overlap dense search.
+        return await asyncio.wait_for(asyncio.to_thread(search), deadline.timeout("sparse"))
+    except asyncio.TimeoutError:
+        logger.warning("BM25 search timed out")
+        deadline.degrade("sparse_skipped")
+        return []
+
+
+async def _no_results() -> list[dict]:
+    return []
+
+
+async def search(
+    db: AsyncSession,
+    question: str,
+    filters: QueryFilters | None,
+    *,
+    query_embedding: list[float] | None = None,
+    deadline: Deadline | None = None,
+    route: Route | None = None,
+    top_k: int = SEARCH_TOP_K,
+    diversify: bool = True,
+) -> RetrievalResult:
+    """The stages that need the database session: metadata lookup, or search, fusion and MMR.
+
+    Without a route the question is routed here; pass one to reuse the caller's (its filters replace `filters`).
+    diversify=False skips MMR, keeping candidates in fusion order.
+    """
+    deadline = deadline or Deadline(None)
+    route = route or route_query(question, filters)
+    plan, filters = route.plan, route.filters
+    result = RetrievalResult(plan=plan, query_type=route.query_type)
+    if plan.metadata:
+        result.fused, result.metadata_count = await metadata_lookup(db, filters)
+        result.candidates = result.fused
+        return result
+
+    if plan.dense and query_embedding is None and "dense_skipped" not in deadline.degraded:
+        query_embedding = await embed_query(question, deadline)
+    dense_chunks, sparse_chunks = await asyncio.gather(
+        _dense(db, question, filters, query_embedding, deadline, top_k) if plan.dense and query_embedding else _no_results(),
+        _sparse(question, filters, deadline, top_k) if plan.sparse else _no_results(),
+    )
+    result.dense_count, result.sparse_count = len(dense_chunks), len(sparse_chunks)
+    if dense_chunks or sparse_chunks:
+        result.fused = fuse(
+            {"dense": dense_chunks, "sparse": sparse_chunks},
+            method=settings.fusion_method,
+            weights=settings.fusion_weights,
+            top_k=top_k,
+        )
+    result.candidates = result.fused
+    if diversify and settings.mmr_enabled and len(result.fused) > 1:
+        result.candidates = await _mmr(db, result.fused, deadline)
+    return result
+
+
+async def _mmr(db: AsyncSession, fused: list[dict], deadline: Deadline) -> list[dict]:
+    try:
+        return await asyncio.wait_for(mmr.diversify(db, fused), deadline.timeout("mmr"))
+    except asyncio.TimeoutError:
+        logger.warning("MMR timed out, keeping fusion order")
+        deadline.degrade("mmr_skipped")
+        await db.rollback()
+        return fused[:settings.mmr_max_candidates]
+
+
+async def rerank_candidates(
+    question: str,
+    fused: list[dict],
+    deadline: Deadline | None = None,
+    *,
+    top_n: int = RERANK_TOP_N,
+) -> list[dict]:
+    """Rerank within the deadline's rerank share; on timeout keep fusion order (and note it on the deadline)."""
+    deadline = deadline or Deadline(None)
+    try:
+        return await asyncio.wait_for(rerank(question, fused, top_n=top_n), deadline.timeout("rerank"))
+    except asyncio.TimeoutError:
+        logger.warning("Rerank timed out, keeping RRF order")
+        deadline.degrade("rerank_rrf_order")
+        return fusion_order(fused, top_n, tier="timeout")
+
+
+async def rank(question: str, result: RetrievalResult, deadline: Deadline | None = None) -> RetrievalResult:
+    """Rerank the fused candidates and pack the context. No-op when search found nothing.
+
+    Metadata matches are already final; plans without rerank keep RRF (here: BM25) order.
+    """
+    if not result.fused:
+        return result
+    if result.plan.metadata:
+        result.reranked = result.context = result.candidates
+        return result
+    if result.plan.rerank:
+        result.reranked = await rerank_candidates(question, result.candidates, deadline)
+    else:
+        result.reranked = fusion_order(result.candidates, RERANK_TOP_N)
+    result.context = pack_context(result.reranked)
+    return result
+
+
+async def retrieve(
+    db: AsyncSession,
+    question: str,
+    filters: QueryFilters | None,
+    *,
+    query_embedding: list[float] | None = None,
+    deadline: Deadline | None = None,
+    route: Route | None = None,
+) -> RetrievalResult:
+    """Run the retrieval stages for a question, ending with context packing.
+
+    Fusion, rerank and packing are skipped when search finds nothing.
+    """
+    deadline = deadline or Deadline(None)
+    result = await search(db, question, filters, query_embedding=query_embedding, deadline=deadline, route=route)
+    return await rank(question, result, deadline)
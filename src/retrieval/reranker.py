@@ -1,71 +1,182 @@
-"""Cohere reranking for the retrieval pipeline."""
-import asyncio
+"""Tiered reranking for the retrieval pipeline: fusion order, a local cross-encoder, or Cohere.
+
+Every result carries rerank_score (the ordering score of the tier that ranked it) and rerank_tier.
+The local and remote tiers score relevance on a 0..1 scale and copy it to relevance_score, which
+is what answer confidence is built from; fusion order (skip, fallback) has no relevance score.
+
+Cohere relevance scores are cached per (query fingerprint, chunk id): a chunk's content never
+changes under the same id (edits produce new chunk rows), so a repeat or paginated query
+only sends the chunks it has not scored before.
+"""
+import hashlib
 import logging
 import os
+import re
+from collections import OrderedDict
 
 import cohere
 
+from src.config import settings
+from src.metrics import record_cache
+from src.retrieval import cross_encoder
 from src.tracing import get_tracer, set_llm_attributes, timed_span
 
 logger = logging.getLogger(__name__)
 
-_client: cohere.ClientV2 | None = None
+_client: cohere.AsyncClientV2 | None = None
 
 RERANK_MODEL = "rerank-v3.5"
 
 
-def _get_client() -> cohere.ClientV2:
+def _get_client() -> cohere.AsyncClientV2:
     global _client
     if _client is None:
-        _client = cohere.ClientV2(api_key=os.environ.get("CO_API_KEY"))
+        _client = cohere.AsyncClientV2(api_key=os.environ.get("CO_API_KEY"))
     return _client
 
 
+def query_fingerprint(query: str) -> str:
+    """Identify a query for score caching: model plus case- and whitespace-normalized text."""
+    normalized = re.sub(r"\s+", " ", query.strip().lower())
+    return hashlib.sha256(f"{RERANK_MODEL}\x1f{normalized}".encode("utf-8")).hexdigest()
+
+
+class RerankScoreCache:
+    """Bounded LRU of relevance scores keyed by (query fingerprint, chunk id)."""
+
+    def __init__(self, max_entries: int) -> None:
+        self._max_entries = max_entries
+        self._scores: OrderedDict[tuple[str, str], float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def get_many(self, fingerprint: str, chunk_ids: list[str]) -> dict[str, float]:
+        found: dict[str, float] = {}
+        for cid in chunk_ids:
+            key = (fingerprint, cid)
+            if key in self._scores:
+                self._scores.move_to_end(key)
+                found[cid] = self._scores[key]
+        record_cache("rerank_score", len(found), len(chunk_ids) - len(found))
+        return found
+
+    def put_many(self, fingerprint: str, scores: dict[str, float]) -> None:
+        for cid, score in scores.items():
+            self._scores[(fingerprint, cid)] = score
+            self._scores.move_to_end((fingerprint, cid))
+        while len(self._scores) > self._max_entries:
+            self._scores.popitem(last=False)
+
+    def clear(self) -> None:
+        self._scores.clear()
+
+
+score_cache = RerankScoreCache(settings.rerank_cache_max_entries)
+
+
+def _margin(scores: list[float]) -> float:
+    """Gap between the best and second-best score; a lone candidate is unambiguous."""
+    if len(scores) < 2:
+        return 1.0
+    first, second = sorted(scores, reverse=True)[:2]
+    return first - second
+
+
+def _top(chunks: list[dict], scores: dict[str, float], top_n: int, tier: str) -> list[dict]:
+    scored = [{**c, "rerank_score": scores[c["chunk_id"]], "rerank_tier": tier} for c in chunks if c["chunk_id"] in scores]
+    if tier in ("local", "remote"):
+        for c in scored:
+            c["relevance_score"] = c["rerank_score"]
+    # Stable sort: ties keep fusion order.
+    scored.sort(key=lambda c: c["rerank_score"], reverse=True)
+    return scored[:top_n]
+
+
+def fusion_order(fused: list[dict], top_n: int, *, tier: str = "none") -> list[dict]:
+    """The first top_n fused candidates as they are, with fusion_score standing in for rerank_score."""
+    return [{**c, "rerank_score": c.get("fusion_score", 0.0), "rerank_tier": tier} for c in fused[:top_n]]
+
+
+def _finish(span, tier: str, result: list[dict]) -> list[dict]:
+    span.set_attribute("rerank.tier", tier)
+    span.set_attribute("rerank.output_count", len(result))
+    if result:
+        span.set_attribute("rerank.top_relevance_score", result[0]["rerank_score"])
+        result_scores = [r["rerank_score"] for r in result]
+        span.set_attribute("rerank.mean_relevance_score", sum(result_scores) / len(result_scores))
+    return result
+
+
 async def rerank(
     query: str,
     chunks: list[dict],
     top_n: int = 5,
 ) -> list[dict]:
-    """Rerank fused chunks with Cohere, return top_n with rerank_score. Falls back to first top_n on API error."""
+    """Rerank fused chunks and return top_n with rerank_score, using the cheapest tier that settles the order.
+
+    Tiers: "skip" keeps fusion order (rerank_score = fusion_score) when the fusion winner is clear;
+    "local" scores with the CPU cross-encoder when its top-2 margin is decisive; "remote" asks Cohere,
+    sending only chunks without a cached score. Falls back to fusion order (tier "fallback") on a
+    Cohere error.
+    """
     tracer = get_tracer()
-    with timed_span(tracer, "retrieval.rerank", {
+    with timed_span(tracer, "retrieval.rerank", lambda: {
         "rerank.input_count": len(chunks),
         "rerank.top_n": top_n,
     }) as span:
         if not chunks:
             span.set_attribute("rerank.output_count", 0)
             return []
-        documents = [c["content"] for c in chunks]
+
+        fusion_margin = _margin([c.get("fusion_score", 0.0) for c in chunks])
+        span.set_attribute("rerank.fusion_margin", round(fusion_margin, 4))
+        if fusion_margin >= settings.rerank_skip_fusion_margin:
+            return _finish(span, "skip", fusion_order(chunks, top_n, tier="skip"))
+
+        fingerprint = query_fingerprint(query)
+        scores = score_cache.get_many(fingerprint, [c["chunk_id"] for c in chunks])
+        uncached = [c for c in chunks if c["chunk_id"] not in scores]
+        span.set_attribute("rerank.cache_hits", len(chunks) - len(uncached))
+        span.set_attribute("rerank.cache_misses", len(uncached))
+        if not uncached:
+            return _finish(span, "remote", _top(chunks, scores, top_n, "remote"))
+
+        if cross_encoder.is_available():
+            try:
+                local = await cross_encoder.score(query, [c["content"] for c in chunks])
+            except Exception as e:
+                logger.exception("Local cross-encoder failed, using Cohere: %s", e)
+                local = None
+            if local is not None:
+                local_margin = _margin(local)
+                span.set_attribute("rerank.local_margin", round(local_margin, 4))
+                if local_margin >= settings.rerank_local_margin:
+                    local_scores = {c["chunk_id"]: score for c, score in zip(chunks, local)}
+                    return _finish(span, "local", _top(chunks, local_scores, top_n, "local"))
+
+        span.set_attribute("rerank.tier", "remote")
         try:
             client = _get_client()
-            response = await asyncio.to_thread(
-                client.rerank,
+            # Scores for every uncached chunk are needed to merge with the cached ones, so no top_n here.
+            response = await client.rerank(
                 model=RERANK_MODEL,
                 query=query,
-                documents=documents,
-                top_n=min(top_n, len(chunks)),
+                documents=[c["content"] for c in uncached],
             )
         except Exception as e:
-            logger.exception("Cohere rerank failed, falling back to RRF order: %s", e)
+            logger.exception("Cohere rerank failed, falling back to fusion order: %s", e)
             span.set_attribute("error", True)
             span.set_attribute("error.message", str(e))
             span.set_attribute("rerank.fallback", True)
-            fallback = [{**c, "rerank_score": 0.0} for c in chunks[:top_n]]
+            fallback = fusion_order(chunks, top_n, tier="fallback")
             span.set_attribute("rerank.output_count", len(fallback))
             return fallback
 
         set_llm_attributes(span, model=RERANK_MODEL)
         span.set_attribute("rerank.fallback", False)
-
-        # Map reranked results back to chunk dicts; response.results has .index and .relevance_score
-        out: list[dict] = []
-        for r in response.results:
-            chunk = chunks[r.index]
-            out.append({**chunk, "rerank_score": float(r.relevance_score)})
-        result = out[:top_n]
-        span.set_attribute("rerank.output_count", len(result))
-        if result:
-            span.set_attribute("rerank.top_relevance_score", result[0]["rerank_score"])
-            scores = [r["rerank_score"] for r in result]
-            span.set_attribute("rerank.mean_relevance_score", sum(scores) / len(scores))
-        return result
+        # response.results has .index (into uncached) and .relevance_score
+        fresh = {uncached[r.index]["chunk_id"]: float(r.relevance_score) for r in response.results}
+        score_cache.put_many(fingerprint, fresh)
+        scores.update(fresh)
+        return _finish(span, "remote", _top(chunks, scores, top_n, "remote"))
@@ -0,0 +1,141 @@
+"""Rules-based query router: classify a question and pick the cheapest retrieval plan for it.
+
+Query types and their plans:
+
+- listing ("list my Tokyo entries", "how many trips to Japan?") -> metadata_lookup: one SQL
+  query over documents, answered from the rows. No embedding, search, rerank or LLM call.
+- keyword (short where/when/which/who questions naming a known place, or quoting a phrase)
+  -> sparse_only: BM25 scoped to the named place, in BM25 order. No embedding or rerank.
+- conceptual (no question term occurs in the corpus) -> dense_only: keyword search would
+  find nothing, so only vector search and rerank run.
+- factual (everything else) -> hybrid_rrf_rerank, the full pipeline.
+
+Place, country and tag names come from the metadata of indexed chunks, so there is no
+gazetteer to maintain. Filters given in the request always win over names found in the text.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+
+from src.config import settings
+from src.retrieval.sparse import _tokenize, bm25_index
+from src.schemas import QueryFilters
+from src.tracing import get_tracer, timed_span
+
+
+@dataclass(frozen=True)
+class Plan:
+    """Which stages a query runs. name is reported as retrieval_strategy."""
+
+    name: str
+    metadata: bool = False
+    dense: bool = False
+    sparse: bool = False
+    rerank: bool = False
+    generate: bool = True
+
+
+METADATA_LOOKUP = Plan("metadata_lookup", metadata=True, generate=False)
+SPARSE_ONLY = Plan("sparse_only", sparse=True)
+DENSE_ONLY = Plan("dense_only", dense=True, rerank=True)
+HYBRID = Plan("hybrid_rrf_rerank", dense=True, sparse=True, rerank=True)
+
+PLANS = {
+    "listing": METADATA_LOOKUP,
+    "keyword": SPARSE_ONLY,
+    "conceptual": DENSE_ONLY,
+    "factual": HYBRID,
+}
+
+# Longer lookups usually carry more intent than a keyword match can serve.
+KEYWORD_MAX_TERMS = 8
+
+STOPWORDS = frozenset(
+    "a an the i me my mine we our us you your it its this that these those there here "
+    "is are was were am be been being do does did have has had can could would should will "
+    "in on at to of for from with about into during by and or not no any some all every "
+    "what where when which who whom whose how why please".split()
+)
+LISTING_WORDS = frozenset(
+    "list show give tell many count number entries entry trips trip places cities countries "
+    "journal journals notes posts logs documents tagged tag".split()
+)
+LISTING_START = re.compile(r"^\s*(?:please\s+)?(?:list|show|give|how\s+many|which|what)\b", re.IGNORECASE)
+LISTING_NOUN = re.compile(r"\b(?:entries|entry|trips|journals|notes|posts|logs|documents)\b", re.IGNORECASE)
+KEYWORD_START = frozenset({"where", "when", "which", "who"})
+QUOTED = re.compile(r"[\"“]([^\"”]{2,})[\"”]")
+
+
+@dataclass
+class Route:
+    query_type: str
+    plan: Plan
+    filters: QueryFilters | None  # request filters plus any names matched in the question
+    matched: dict[str, list[str]] = field(default_factory=dict)
+
+
+def _match_names(question: str) -> dict[str, list[str]]:
+    """Known location/country/tag values mentioned in the question, longest first per field."""
+    text = question.lower()
+    matched: dict[str, list[str]] = {}
+    for name, values in bm25_index.vocabulary.items():
+        found = [
+            values[v] for v in sorted(values, key=len, reverse=True)
+            if re.search(rf"\b{re.escape(v)}\b", text)
+        ]
+        if found:
+            matched[name] = found
+    return matched
+
+
+def _with_names(filters: QueryFilters | None, matched: dict[str, list[str]], fields: tuple[str, ...]) -> QueryFilters | None:
+    """Fill filter fields the request left empty with names matched in the question."""
+    updates = {}
+    for name in fields:
+        if name not in matched or (filters is not None and getattr(filters, name)):
+            continue
+        updates[name] = matched[name] if name == "tags" else matched[name][0]
+    if not updates:
+        return filters
+    return (filters or QueryFilters()).model_copy(update=updates)
+
+
+def _classify(question: str, matched: dict[str, list[str]]) -> str:
+    tokens = _tokenize(question)
+    terms = [t for t in tokens if t not in STOPWORDS]
+    named = {t for values in matched.values() for v in values for t in _tokenize(v)}
+
+    # Every remaining term is a listing word or a known name: nothing to search the text for.
+    if LISTING_START.match(question) and LISTING_NOUN.search(question):
+        if all(t in LISTING_WORDS or t in named for t in terms):
+            return "listing"
+
+    places = "location" in matched or "country" in matched
+    if len(terms) <= KEYWORD_MAX_TERMS and (QUOTED.search(question) or (tokens and tokens[0] in KEYWORD_START and places)):
+        return "keyword"
+
+    if bm25_index.is_built and terms and not any(bm25_index.has_term(t) for t in terms):
+        return "conceptual"
+    return "factual"
+
+
+def route_query(question: str, filters: QueryFilters | None) -> Route:
+    """Classify question and return its plan. With Settings.query_router_enabled off, every query is factual."""
+    if not settings.query_router_enabled:
+        return Route("factual", HYBRID, filters)
+    tracer = get_tracer()
+    with timed_span(tracer, "retrieval.route") as span:
+        matched = _match_names(question)
+        query_type = _classify(question, matched)
+        if query_type == "listing":
+            filters = _with_names(filters, matched, ("location", "country", "tags"))
+        elif query_type == "keyword":
+            filters = _with_names(filters, matched, ("location", "country"))
+        route = Route(query_type, PLANS[query_type], filters, matched)
+        span.set_attribute("route.query_type", query_type)
+        span.set_attribute("route.plan", route.plan.name)
+        for name, values in matched.items():
+            span.set_attribute(f"route.matched_{name}", values)
+        return route
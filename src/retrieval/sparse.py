@@ -1,8 +1,13 @@
 """BM25 sparse search over chunk content."""
+import asyncio
+import heapq
 import logging
+import math
 import re
+import threading
+from collections import Counter, defaultdict
+from collections.abc import Iterable
 
-from rank_bm25 import BM25Okapi
 from sqlalchemy import select
 
 from src.database import async_session_factory
@@ -17,69 +22,247 @@ def _tokenize(text: str) -> list[str]:
     return re.findall(r"\b\w+\b", text.lower())
 
 
+def _matches(metadata: dict, location: str | None, country: str | None, tags: list[str] | None) -> bool:
+    """Same filter semantics as dense_search: exact location/country, any-of tags."""
+    if location is not None and metadata.get("location") != location:
+        return False
+    if country is not None and metadata.get("country") != country:
+        return False
+    if tags and not set(tags) & set(metadata.get("tags") or []):
+        return False
+    return True
+
+
+# Okapi BM25 parameters (the rank_bm25 defaults this index used to be built with).
+BM25_K1 = 1.5
+BM25_B = 0.75
+VOCABULARY_FIELDS = ("location", "country", "tags")
+
+
+def _metadata_values(metadata: dict) -> list[tuple[str, str]]:
+    """(field, value) pairs a chunk contributes to the metadata vocabulary."""
+    values = [(name, metadata[name]) for name in ("location", "country") if metadata.get(name)]
+    return values + [("tags", tag) for tag in metadata.get("tags") or []]
+
+
+class _Corpus:
+    """Chunks plus the statistics BM25 scores from, kept per chunk so that adding or removing
+    one costs O(its length): postings (term -> slot -> term frequency), document lengths and
+    their total. Slots of removed chunks are reused.
+    """
+
+    def __init__(self) -> None:
+        self.chunks: list[dict | None] = []
+        self.term_freqs: list[Counter | None] = []
+        self.doc_len: list[int] = []
+        self.slot_of: dict[str, int] = {}
+        self.free: list[int] = []
+        self.postings: dict[str, dict[int, int]] = {}
+        self.total_len = 0
+        # Known metadata values per field, lowercase -> stored spelling, with per-spelling chunk counts.
+        self.vocabulary: dict[str, dict[str, str]] = {name: {} for name in VOCABULARY_FIELDS}
+        self._spellings: dict[tuple[str, str], Counter] = {}
+
+    def __len__(self) -> int:
+        return len(self.slot_of)
+
+    def add(self, chunk: dict, tokens: list[str]) -> None:
+        self.remove(chunk["chunk_id"])
+        if self.free:
+            slot = self.free.pop()
+        else:
+            slot = len(self.chunks)
+            self.chunks.append(None)
+            self.term_freqs.append(None)
+            self.doc_len.append(0)
+        term_freqs = Counter(tokens)
+        for term, count in term_freqs.items():
+            self.postings.setdefault(term, {})[slot] = count
+        self.chunks[slot], self.term_freqs[slot], self.doc_len[slot] = chunk, term_freqs, len(tokens)
+        self.slot_of[chunk["chunk_id"]] = slot
+        self.total_len += len(tokens)
+        for name, value in _metadata_values(chunk["metadata"]):
+            self._count_spelling(name, value, 1)
+
+    def remove(self, chunk_id: str) -> None:
+        slot = self.slot_of.pop(chunk_id, None)
+        if slot is None:
+            return
+        for term in self.term_freqs[slot]:
+            posting = self.postings[term]
+            del posting[slot]
+            if not posting:
+                del self.postings[term]
+        for name, value in _metadata_values(self.chunks[slot]["metadata"]):
+            self._count_spelling(name, value, -1)
+        self.total_len -= self.doc_len[slot]
+        self.chunks[slot], self.term_freqs[slot], self.doc_len[slot] = None, None, 0
+        self.free.append(slot)
+
+    def _count_spelling(self, name: str, value: str, delta: int) -> None:
+        key = (name, value.lower())
+        spellings = self._spellings.setdefault(key, Counter())
+        spellings[value] += delta
+        if spellings[value] <= 0:
+            del spellings[value]
+        if spellings:
+            self.vocabulary[name][key[1]] = value if delta > 0 else next(iter(spellings))
+        else:
+            del self._spellings[key]
+            self.vocabulary[name].pop(key[1], None)
+
+    def scores(self, query_tokens: list[str]) -> dict[int, float]:
+        """BM25 score per slot for the chunks containing at least one query token.
+
+        idf is log(1 + (N - n + 0.5) / (n + 0.5)), which stays positive for common terms
+        without needing the corpus-wide average idf that Okapi's floor uses.
+        """
+        n_docs = len(self)
+        avgdl = self.total_len / n_docs if n_docs else 0.0
+        scores: dict[int, float] = defaultdict(float)
+        for token in query_tokens:
+            posting = self.postings.get(token)
+            if not posting:
+                continue
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for slot, freq in posting.items():
+                norm = 1 - BM25_B + BM25_B * self.doc_len[slot] / avgdl if avgdl else 1.0
+                scores[slot] += idf * freq * (BM25_K1 + 1) / (freq + BM25_K1 * norm)
+        return scores
+
+
 class BM25Index:
-    """In-memory BM25 index over chunks. Build from DB, then search."""
+    """In-memory BM25 index over chunks. Build from DB, then search.
+
+    search() may run in a worker thread (see retrieval.pipeline), so it scores under a lock
+    that updates also take. A full build happens in a worker thread on a fresh corpus that is
+    swapped in; apply_delta updates the live corpus in place, in time proportional to the
+    chunks it touches.
+    """
 
     def __init__(self) -> None:
         self._built = False
-        self._chunks: list[dict] = []
-        self._corpus: list[list[str]] = []
-        self._bm25: BM25Okapi | None = None
+        self._corpus = _Corpus()
+        self._lock = threading.Lock()
+        # Serializes build_index / apply_delta: each computes the next state from the current one.
+        self._update_lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._corpus)
+
+    def _swap(self, chunks: list[dict], corpus: list[list[str]]) -> None:
+        fresh = _Corpus()
+        for chunk, tokens in zip(chunks, corpus):
+            fresh.add(chunk, tokens)
+        with self._lock:
+            self._corpus = fresh
+            self._built = True
 
     @property
     def is_built(self) -> bool:
         return self._built
 
+    def has_term(self, token: str) -> bool:
+        """Whether token occurs anywhere in the indexed corpus."""
+        return token in self._corpus.postings
+
+    @property
+    def vocabulary(self) -> dict[str, dict[str, str]]:
+        """Known metadata values per field (location, country, tags), lowercase -> stored spelling."""
+        return self._corpus.vocabulary
+
     async def build_index(self) -> None:
         """Load all chunks from PostgreSQL, tokenize content, build BM25 index in memory."""
-        async with async_session_factory() as session:
-            result = await session.execute(select(Chunk))
-            rows = result.scalars().all()
-            self._chunks = [
-                {
-                    "chunk_id": str(row.id),
-                    "content": row.content,
-                    "document_id": str(row.document_id),
-                    "metadata": dict(row.metadata_) if row.metadata_ else {},
-                }
-                for row in rows
-            ]
-            self._corpus = [_tokenize(row.content) for row in rows]
-        if self._corpus:
-            self._bm25 = BM25Okapi(self._corpus)
-        else:
-            self._bm25 = None
-        self._built = True
+        async with self._update_lock:
+            async with async_session_factory() as session:
+                result = await session.execute(select(Chunk))
+                rows = result.scalars().all()
+                chunks = [
+                    {
+                        "chunk_id": str(row.id),
+                        "content": row.content,
+                        "document_id": str(row.document_id),
+                        "chunk_index": row.chunk_index,
+                        "metadata": dict(row.metadata_) if row.metadata_ else {},
+                    }
+                    for row in rows
+                ]
+            await asyncio.to_thread(self._rebuild, chunks)
+
+    def _rebuild(self, chunks: list[dict]) -> None:
+        self._swap(chunks, [_tokenize(c["content"]) for c in chunks])
+
+    async def apply_delta(self, *, upserted: list[dict], removed_ids: Iterable[str] = ()) -> None:
+        """Replace or add the given chunk dicts and drop removed ids without reloading from PostgreSQL.
+
+        Costs O(size of the delta): only the changed chunks are tokenized, and postings and
+        length totals are adjusted per chunk. Small enough to run on the event loop.
+        """
+        if not self._built:
+            return
+        async with self._update_lock:
+            tokenized = [(chunk, _tokenize(chunk["content"])) for chunk in upserted]
+            with self._lock:
+                for chunk_id in removed_ids:
+                    self._corpus.remove(chunk_id)
+                for chunk, tokens in tokenized:
+                    self._corpus.add(chunk, tokens)
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 20,
+        *,
+        location: str | None = None,
+        country: str | None = None,
+        tags: list[str] | None = None,
+    ) -> list[dict]:
+        """Return the top_k chunks sharing a term with the query, by BM25 score.
 
-    def search(self, query: str, top_k: int = 20) -> list[dict]:
-        """Return top_k chunks by BM25 score. Same shape as dense_search (score instead of similarity_score)."""
+        Same shape and filters as dense_search (score instead of similarity_score).
+        """
         tracer = get_tracer()
-        with timed_span(tracer, "retrieval.sparse_search", {"search.top_k": top_k}) as span:
-            if not self._built or self._bm25 is None:
+        with timed_span(tracer, "retrieval.sparse_search", lambda: {
+            "search.top_k": top_k,
+            "search.has_location_filter": location is not None,
+            "search.has_country_filter": country is not None,
+            "search.has_tags_filter": tags is not None and len(tags) > 0,
+        }) as span:
+            if not self._built:
                 logger.warning("BM25 index not built — call build_index() first")
                 span.set_attribute("search.results_count", 0)
                 span.set_attribute("search.index_built", False)
                 return []
             span.set_attribute("search.index_built", True)
-            span.set_attribute("search.corpus_size", len(self._chunks))
             query_tokens = _tokenize(query)
             if not query_tokens:
                 span.set_attribute("search.results_count", 0)
                 return []
             span.set_attribute("search.query_token_count", len(query_tokens))
-            scores = self._bm25.get_scores(query_tokens)
-            indexed = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:top_k]
-            results = [
-                {
-                    "chunk_id": self._chunks[i]["chunk_id"],
-                    "content": self._chunks[i]["content"],
-                    # BM25 score — fusion layer normalizes this with dense's similarity_score
-                    "score": float(scores[i]),
-                    "document_id": self._chunks[i]["document_id"],
-                    "metadata": self._chunks[i]["metadata"],
-                }
-                for i in indexed
-            ]
+            with self._lock:
+                corpus = self._corpus
+                span.set_attribute("search.corpus_size", len(corpus))
+                scores = corpus.scores(query_tokens)
+                candidates = scores.keys()
+                if location is not None or country is not None or tags:
+                    candidates = [
+                        slot for slot in candidates
+                        if _matches(corpus.chunks[slot]["metadata"], location, country, tags)
+                    ]
+                # Ties keep insertion order (lower slot first), so results are deterministic.
+                top = heapq.nsmallest(top_k, candidates, key=lambda slot: (-scores[slot], slot))
+                results = [
+                    {
+                        "chunk_id": corpus.chunks[slot]["chunk_id"],
+                        "content": corpus.chunks[slot]["content"],
+                        # BM25 score — fusion layer normalizes this with dense's similarity_score
+                        "score": float(scores[slot]),
+                        "document_id": corpus.chunks[slot]["document_id"],
+                        "chunk_index": corpus.chunks[slot]["chunk_index"],
+                        "metadata": corpus.chunks[slot]["metadata"],
+                    }
+                    for slot in top
+                ]
             span.set_attribute("search.results_count", len(results))
             if results:
                 span.set_attribute("search.top_bm25_score", results[0]["score"])
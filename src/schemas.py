@@ -28,6 +28,30 @@ class IngestRequest(BaseModel):
     documents: list[IngestDocumentRequest]
 
 
+class UpsertDocumentRequest(IngestDocumentRequest):
+    external_id: str = Field(..., min_length=1, max_length=255)
+
+
+class UpsertRequest(BaseModel):
+    documents: list[UpsertDocumentRequest]
+
+
+class UpsertDocumentResult(BaseModel):
+    external_id: str
+    document_id: str
+    status: str
+    chunks_added: int = 0
+    chunks_removed: int = 0
+    chunks_unchanged: int = 0
+
+
+class UpsertResponse(BaseModel):
+    job_id: str
+    status: str
+    document_count: int
+    results: list[UpsertDocumentResult]
+
+
 class IngestResponse(BaseModel):
     job_id: str
     status: str
@@ -35,6 +59,14 @@ class IngestResponse(BaseModel):
     chunk_count: int = 0
 
 
+class IngestDocumentResult(BaseModel):
+    line: int
+    status: str
+    document_id: str | None = None
+    chunk_count: int = 0
+    error: str | None = None
+
+
 class HealthResponse(BaseModel):
     status: str
     version: str
@@ -46,6 +78,8 @@ class Citation(BaseModel):
     source: str
     location: str
     excerpt: str
+    # A citation can cover several adjacent chunks merged into one passage; chunk_id is the first.
+    chunk_ids: list[str] = []
 
 
 class DateRange(BaseModel):
@@ -67,10 +101,74 @@ class QueryRequest(BaseModel):
 
 class QueryResponse(BaseModel):
     answer: str
-    confidence: float
+    confidence: float | None  # None when the cited passages were never relevance-scored
     citations: list[Citation]
     query_type: str
     retrieval_strategy: str
     chunks_retrieved: int
     chunks_after_rerank: int
     trace_id: str
+
+
+class SearchRequest(BaseModel):
+    query: str = Field(..., min_length=1)
+    filters: QueryFilters | None = None
+    limit: int = Field(10, ge=1, le=50)
+    offset: int = Field(0, ge=0)
+    rerank: bool = True
+
+
+class SearchResult(BaseModel):
+    rank: int  # 1-based position across all pages
+    chunk_id: str
+    document_id: str
+    content: str
+    source: str
+    location: str
+    metadata: dict
+    score: float  # rerank_score when reranked, otherwise fusion_score
+    fusion_score: float
+    rerank_score: float | None = None
+    ranks: dict[str, int]  # retriever name -> 1-based rank in that retriever's results
+
+
+class SearchResponse(BaseModel):
+    trace_id: str
+    results: list[SearchResult]
+    offset: int
+    limit: int
+    has_more: bool
+    stages: list[str]  # stages that ran, in order
+    degraded: list[str] = []
+
+
+class BatchQueryRequest(BaseModel):
+    queries: list[QueryRequest] = Field(..., min_length=1)
+
+
+class BatchQueryError(BaseModel):
+    error: str
+    trace_id: str
+
+
+class BatchQueryResponse(BaseModel):
+    results: list[QueryResponse | BatchQueryError]  # same order as BatchQueryRequest.queries
+
+
+class RetrievedChunk(BaseModel):
+    index: int
+    chunk_id: str
+    source: str
+    location: str
+    score: float | None = None
+    chunk_ids: list[str] = []
+
+
+class QueryRetrievalEvent(BaseModel):
+    """First event of /api/v1/query/stream: what was retrieved, before any answer tokens."""
+
+    trace_id: str
+    retrieval_strategy: str
+    chunks_retrieved: int
+    chunks_after_rerank: int
+    chunks: list[RetrievedChunk]
@@ -6,27 +6,47 @@ Provides distributed tracing across the DriftLog pipeline:
 
 Exports spans to Langfuse via their OpenTelemetry-compatible OTLP endpoint.
 Each LLM call records span attributes for model name, token counts, and latency.
+
+Export is off the request path: finished spans go to a bounded queue drained by a background
+thread, and spans that don't fit are dropped and counted. Sampling is either head-based (the
+trace-id ratio decides before anything is recorded) or tail-based (every span is recorded, and
+the decision waits for the root span so errors, degraded and slow requests are always kept).
+With tracing off, timed_span skips OpenTelemetry entirely.
 """
 
 from __future__ import annotations
 
 import base64
 import logging
+import threading
 import time
+from collections import OrderedDict, deque
 from contextlib import contextmanager
-from typing import Any, Generator
+from contextvars import ContextVar
+from typing import Any, Callable, Generator
 
 from opentelemetry import trace
+from opentelemetry.context import Context
 from opentelemetry.sdk.resources import Resource
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor
+from opentelemetry.sdk.trace import ReadableSpan, Span, SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+from opentelemetry.sdk.trace.sampling import ALWAYS_ON, ParentBased, TraceIdRatioBased
 from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+from opentelemetry.trace import StatusCode
 
+from src import metrics, profiling
 from src.config import settings
 
 logger = logging.getLogger(__name__)
 
 _initialized = False
+# True once a real provider is installed; until then timed_span skips OpenTelemetry.
+_enabled = False
+_export_processor: BoundedBatchSpanProcessor | None = None
+_tail_processor: TailSamplingProcessor | None = None
+
+# Per-request {span name: total ms}, filled by timed_span while ServerTimingMiddleware is collecting.
+_stage_timings: ContextVar[dict[str, float] | None] = ContextVar("stage_timings", default=None)
 
 
 def _langfuse_otlp_traces_endpoint(host: str) -> str:
@@ -39,15 +59,187 @@ def _langfuse_otlp_traces_endpoint(host: str) -> str:
     return f"{h}/api/public/otel/v1/traces"
 
 
+class BoundedBatchSpanProcessor(SpanProcessor):
+    """Export finished spans in batches from a background thread.
+
+    The queue holds at most max_queue_size spans; when it is full, new spans are dropped and
+    counted instead of blocking the request. A batch is sent when max_batch_size spans are
+    waiting or every interval_seconds, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        exporter: SpanExporter,
+        *,
+        max_queue_size: int = 2048,
+        max_batch_size: int = 512,
+        interval_seconds: float = 5.0,
+    ) -> None:
+        self._exporter = exporter
+        self._max_queue_size = max_queue_size
+        self._max_batch_size = max_batch_size
+        self._interval = interval_seconds
+        self._queue: deque[ReadableSpan] = deque()
+        self._condition = threading.Condition()
+        self._export_lock = threading.Lock()
+        self._shutdown = False
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._run, name="span-export", daemon=True)
+        self._thread.start()
+
+    def on_start(self, span: Span, parent_context: Context | None = None) -> None:
+        pass
+
+    def on_end(self, span: ReadableSpan) -> None:
+        with self._condition:
+            if self._shutdown or len(self._queue) >= self._max_queue_size:
+                self.dropped += 1
+                return
+            self._queue.append(span)
+            if len(self._queue) >= self._max_batch_size:
+                self._condition.notify()
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def _take_batch(self) -> list[ReadableSpan]:
+        count = min(len(self._queue), self._max_batch_size)
+        return [self._queue.popleft() for _ in range(count)]
+
+    def _export(self, batch: list[ReadableSpan]) -> None:
+        if not batch:
+            return
+        with self._export_lock:
+            try:
+                result = self._exporter.export(batch)
+            except Exception:
+                logger.exception("Span export failed")
+                result = SpanExportResult.FAILURE
+        if result is SpanExportResult.SUCCESS:
+            self.exported += len(batch)
+        else:
+            self.failed += len(batch)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if not self._shutdown and len(self._queue) < self._max_batch_size:
+                    self._condition.wait(self._interval)
+                batch = self._take_batch()
+                done = self._shutdown and not self._queue
+            self._export(batch)
+            if done:
+                return
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        deadline = time.monotonic() + timeout_millis / 1000
+        while time.monotonic() < deadline:
+            with self._condition:
+                batch = self._take_batch()
+            if not batch:
+                return True
+            self._export(batch)
+        return False
+
+    def shutdown(self) -> None:
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify()
+        self._thread.join(timeout=30)
+        self._exporter.shutdown()
+
+
+class TailSamplingProcessor(SpanProcessor):
+    """Hold each trace's spans until its local root span ends, then pass the whole trace on or drop it.
+
+    A trace is kept when its trace id falls in the sampled ratio (the same test TraceIdRatioBased
+    applies), any span has ERROR status or an `error` attribute, the query degraded, or the root
+    took at least slow_ms. Profiled requests are kept too. At most max_pending_traces unfinished traces are held; beyond that the
+    oldest is discarded.
+    """
+
+    def __init__(
+        self,
+        next_processor: SpanProcessor,
+        *,
+        ratio: float,
+        slow_ms: float,
+        max_pending_traces: int = 1000,
+    ) -> None:
+        self._next = next_processor
+        self._bound = TraceIdRatioBased.get_bound_for_rate(ratio)
+        self._slow_ns = slow_ms * 1_000_000
+        self._max_pending = max_pending_traces
+        self._pending: OrderedDict[int, list[ReadableSpan]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.kept_traces = 0
+        self.sampled_out_traces = 0
+        self.evicted_traces = 0
+
+    def on_start(self, span: Span, parent_context: Context | None = None) -> None:
+        pass
+
+    @property
+    def pending_traces(self) -> int:
+        return len(self._pending)
+
+    def _keep(self, root: ReadableSpan, spans: list[ReadableSpan]) -> bool:
+        if root.context.trace_id & TraceIdRatioBased.TRACE_ID_LIMIT < self._bound:
+            return True
+        if root.end_time - root.start_time >= self._slow_ns:
+            return True
+        return any(
+            s.status.status_code is StatusCode.ERROR
+            or s.attributes.get("error")
+            or s.attributes.get("query.degraded")
+            or "profile.id" in s.attributes
+            for s in spans
+        )
+
+    def on_end(self, span: ReadableSpan) -> None:
+        trace_id = span.context.trace_id
+        with self._lock:
+            if span.parent is not None and not span.parent.is_remote:
+                self._pending.setdefault(trace_id, []).append(span)
+                if len(self._pending) > self._max_pending:
+                    self._pending.popitem(last=False)
+                    self.evicted_traces += 1
+                return
+            spans = self._pending.pop(trace_id, [])
+            spans.append(span)
+            keep = self._keep(span, spans)
+            if keep:
+                self.kept_traces += 1
+            else:
+                self.sampled_out_traces += 1
+        if keep:
+            for s in spans:
+                self._next.on_end(s)
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self._next.force_flush(timeout_millis)
+
+    def shutdown(self) -> None:
+        self._next.shutdown()
+
+
 def init_tracing() -> None:
     """Initialize OpenTelemetry with Langfuse OTLP exporter.
 
     Reads credentials from the app Settings (which loads from .env).
     """
-    global _initialized
+    global _initialized, _enabled, _export_processor, _tail_processor
     if _initialized:
         return
 
+    if not settings.tracing_enabled:
+        logger.info("Tracing disabled (TRACING_ENABLED=false)")
+        _initialized = True
+        return
+
     public_key = settings.langfuse_public_key.strip()
     secret_key = settings.langfuse_secret_key.strip()
     host = settings.langfuse_host.strip()
@@ -55,7 +247,7 @@ def init_tracing() -> None:
     if not public_key or not secret_key:
         logger.warning(
             "LANGFUSE_PUBLIC_KEY / LANGFUSE_SECRET_KEY not set — "
-            "tracing will use a no-op provider (spans are still created but not exported)"
+            "tracing is disabled (spans are not created or exported)"
         )
         _initialized = True
         return
@@ -81,16 +273,31 @@ def init_tracing() -> None:
         }
     )
 
-    provider = TracerProvider(resource=resource)
-
-    # Use BatchSpanProcessor in production, SimpleSpanProcessor in dev for immediate visibility
-    if settings.app_env == "production":
-        provider.add_span_processor(BatchSpanProcessor(exporter))
+    _export_processor = BoundedBatchSpanProcessor(
+        exporter,
+        max_queue_size=settings.tracing_max_queue_size,
+        max_batch_size=settings.tracing_max_export_batch_size,
+        interval_seconds=settings.tracing_export_interval_seconds,
+    )
+    processor: SpanProcessor = _export_processor
+    if settings.tracing_tail_sampling:
+        # Record everything; TailSamplingProcessor applies the ratio once the outcome is known.
+        sampler = ALWAYS_ON
+        processor = _tail_processor = TailSamplingProcessor(
+            _export_processor,
+            ratio=settings.tracing_sample_ratio,
+            slow_ms=settings.tracing_slow_ms,
+            max_pending_traces=settings.tracing_max_pending_traces,
+        )
     else:
-        provider.add_span_processor(SimpleSpanProcessor(exporter))
+        sampler = ParentBased(TraceIdRatioBased(settings.tracing_sample_ratio))
+
+    provider = TracerProvider(resource=resource, sampler=sampler)
+    provider.add_span_processor(processor)
 
     trace.set_tracer_provider(provider)
     _initialized = True
+    _enabled = True
     logger.info(
         "OpenTelemetry tracing initialized — exporting to %s (keys must match that region: EU vs US)",
         trace_endpoint,
@@ -102,20 +309,128 @@ def get_tracer(name: str = "driftlog") -> trace.Tracer:
     return trace.get_tracer(name)
 
 
+def tracing_stats() -> dict[str, int]:
+    """Export and sampling counters since startup; all zero when tracing is off."""
+    batch, tail = _export_processor, _tail_processor
+    return {
+        "exported_spans": batch.exported if batch else 0,
+        "dropped_spans": batch.dropped if batch else 0,
+        "failed_spans": batch.failed if batch else 0,
+        "queued_spans": batch.queued if batch else 0,
+        "kept_traces": tail.kept_traces if tail else 0,
+        "sampled_out_traces": tail.sampled_out_traces if tail else 0,
+        "evicted_traces": tail.evicted_traces if tail else 0,
+        "pending_traces": tail.pending_traces if tail else 0,
+    }
+
+
+class _UntracedSpan(trace.NonRecordingSpan):
+    """Yielded by timed_span when tracing is off; keeps only whether the block flagged an error."""
+
+    def __init__(self) -> None:
+        super().__init__(trace.INVALID_SPAN_CONTEXT)
+        self.error = False
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if key == "error" and value:
+            self.error = True
+
+
+def _record_stage(name: str, latency_ms: float, failed: bool, timings: dict[str, float] | None) -> None:
+    metrics.observe_stage(name, latency_ms / 1000, failed)
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + latency_ms
+
+
 @contextmanager
 def timed_span(
     tracer: trace.Tracer,
     name: str,
-    attributes: dict[str, Any] | None = None,
+    attributes: Callable[[], dict[str, Any]] | dict[str, Any] | None = None,
 ) -> Generator[trace.Span, None, None]:
-    """Context manager that creates a span and automatically records latency_ms on exit."""
-    with tracer.start_as_current_span(name, attributes=attributes or {}) as span:
+    """Context manager that creates a span and automatically records latency_ms on exit.
+
+    attributes may be a callable returning the dict; it is only called when the span is
+    recording, so call sites pay nothing for attributes when tracing is off or sampled out.
+
+    The latency also feeds the stage metrics and Server-Timing; a block that raises or sets the
+    `error` attribute counts as a stage error. With tracing off no OpenTelemetry span is created.
+    When nothing consumes the latency (metrics and Server-Timing off, and tracing off or the span
+    sampled out) the block isn't even timed.
+    """
+    timings = _stage_timings.get()
+    untimed = timings is None and not settings.metrics_enabled
+    if not _enabled:
+        if untimed:
+            yield trace.INVALID_SPAN
+            return
+        untraced = _UntracedSpan()
+        failed = False
+        start = time.perf_counter()
+        try:
+            yield untraced
+        except Exception:
+            failed = True
+            raise
+        finally:
+            _record_stage(name, (time.perf_counter() - start) * 1000, failed or untraced.error, timings)
+        return
+    with tracer.start_as_current_span(name) as span:
+        if not span.is_recording():
+            if untimed:
+                yield span
+                return
+        elif attributes:
+            span.set_attributes(attributes() if callable(attributes) else attributes)
+        profiling.link_span(span)
+        failed = False
         start = time.perf_counter()
         try:
             yield span
+        except Exception:
+            failed = True
+            raise
         finally:
             latency_ms = (time.perf_counter() - start) * 1000
-            span.set_attribute("latency_ms", round(latency_ms, 2))
+            if span.is_recording():
+                span.set_attribute("latency_ms", round(latency_ms, 2))
+                failed = failed or bool(span.attributes.get("error"))
+            _record_stage(name, latency_ms, failed, timings)
+
+
+def server_timing_header(timings: dict[str, float]) -> str:
+    """Format stage totals as a Server-Timing value, e.g. 'retrieval.dense_search;dur=12.3'."""
+    return ", ".join(f"{name};dur={ms:.1f}" for name, ms in timings.items())
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware adding a Server-Timing header with the request's timed_span latencies.
+
+    Only active when Settings.server_timing_enabled is set. Headers go out when the response starts,
+    so streaming responses report the stages that finished before the first byte.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not settings.server_timing_enabled:
+            await self.app(scope, receive, send)
+            return
+        timings: dict[str, float] = {}
+
+        async def send_with_timing(message) -> None:
+            if message["type"] == "http.response.start" and timings:
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing_header(timings).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _stage_timings.set(timings)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _stage_timings.reset(token)
 
 
 def set_llm_attributes(
@@ -127,8 +442,22 @@ def set_llm_attributes(
     total_tokens: int | None = None,
     max_tokens: int | None = None,
     temperature: float | None = None,
+    cache_read_input_tokens: int | None = None,
+    cache_creation_input_tokens: int | None = None,
 ) -> None:
-    """Set standard LLM span attributes following OpenTelemetry GenAI semantic conventions."""
+    """Set standard LLM span attributes following OpenTelemetry GenAI semantic conventions.
+
+    Anthropic reports prompt-cache reads and writes separately from input_tokens (uncached input only).
+    Each call also counts one provider call and its tokens in the metrics.
+    """
+    metrics.record_llm_usage(model, {
+        "input": input_tokens,
+        "output": output_tokens,
+        "cache_read": cache_read_input_tokens,
+        "cache_creation": cache_creation_input_tokens,
+    })
+    if not span.is_recording():
+        return
     span.set_attribute("gen_ai.system", "anthropic" if "claude" in model.lower() else "openai")
     span.set_attribute("gen_ai.request.model", model)
     if input_tokens is not None:
@@ -141,3 +470,7 @@ def set_llm_attributes(
         span.set_attribute("gen_ai.request.max_tokens", max_tokens)
     if temperature is not None:
         span.set_attribute("gen_ai.request.temperature", temperature)
+    if cache_read_input_tokens is not None:
+        span.set_attribute("gen_ai.usage.cache_read.input_tokens", cache_read_input_tokens)
+    if cache_creation_input_tokens is not None:
+        span.set_attribute("gen_ai.usage.cache_creation.input_tokens", cache_creation_input_tokens)